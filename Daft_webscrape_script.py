@@ -34,20 +34,87 @@
 #        We will pull these two sets of properties out separately and combine them at the end.
 
 # Import Packages
+import argparse
+import os
 import requests
 from bs4 import BeautifulSoup as bs
 import pandas as pd
 import re
-import numpy as np
+from daft_aggregates import DEFAULT_INDEX_DIR, PriceIndex
+from daft_cache import DEFAULT_CACHE_DIR, PageCache, snapshot_name
+from daft_extract import CAN_FORK, ParsePool, iter_page_listings
+from daft_fetch import PageFetcher
+from daft_incremental import IncrementalCrawl
+from daft_metrics import STAGES, RunReport, page_bytes
+from daft_normalize import normalize_listings
+from daft_parse import get_backend
+from daft_pipeline import listing_frames, merge_frames
+from daft_plan import CrawlPlanner, group_shards
+from daft_store import DEFAULT_STORE_DIR, SnapshotStore
+from daft_valuation import ValuationIndex, flag_revaluations
+
+# Every page downloaded is kept in a local page cache (see daft_cache.py). Passing --replay <snapshot> runs the
+# whole script from the pages cached for that snapshot without touching the network, which is useful when
+# re-running after a parsing fix e.g. python Daft_webscrape_script.py --replay 20210301T093000
+parser = argparse.ArgumentParser(description='Scrape property price information from Daft.ie')
+parser.add_argument('--replay', metavar='SNAPSHOT', help='re-run from a cached snapshot with no network access')
+parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='directory of the page cache')
+parser.add_argument('--incremental', action='store_true',
+                    help='stop paginating at the first page which only holds properties from the last snapshot')
+parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='directory of the Parquet snapshot store')
+parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR, help='directory of the price index aggregates')
+parser.add_argument('--csv', metavar='PATH', help='also write this run out as a csv file')
+parser.add_argument('--parser', default='auto', choices=['auto', 'selectolax', 'lxml', 'html.parser'],
+                    help='html parser backend used to extract the ads (see daft_parse.py)')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of processes the pages are parsed in (1 parses them in this process)')
+parser.add_argument('--report', metavar='PATH', help='where to write the JSON run report (Files/run_<snapshot>.json)')
+parser.add_argument('--prometheus', metavar='PATH', help='also write the run report in the Prometheus text format')
+parser.add_argument('--profile', metavar='STAGE', choices=STAGES,
+                    help='run cProfile over one stage and write its stats to Files/profile_<stage>_<snapshot>.prof')
+parser.add_argument('--trace-stages', action='store_true',
+                    help='print the start and stop of every stage (with the pid) to line up py-spy samples')
+args, _ = parser.parse_known_args()
+
+# This script walks through the scrape one step at a time. To run a scrape without the walkthrough (and without
+# running anything on import) use the daft-scrape command instead (see daft_scrape.py and daft_pipeline.py),
+# e.g. daft-scrape incremental, or daft-scrape daemon to stay resident and scrape every 3 days.
+cache = PageCache(args.cache_dir)
+backend = get_backend(args.parser)
+
+# With --workers N (N > 1) the pages are parsed in a pool of N worker processes which send back the Listings of each
+# page in order (see ParsePool in daft_extract.py). The worker processes are forked, so the pool is started here
+# before anything (pyarrow in the snapshot store, the fetcher's threads) can have started a thread. On Windows (no
+# fork) the pages are parsed in this process. Parsing in this process is the default: on one core the pool is
+# slower (the pages and Listings have to be passed between processes), check with benchmarks/bench_parse_pool.py
+# that it is faster on your machine before turning it on.
+parse_pool = ParsePool(args.workers, args.parser) if args.workers > 1 and CAN_FORK else None
+
+# Every run is appended to a Parquet snapshot store, partitioned by scrape date and county (see daft_store.py).
+# The previous snapshot, if there is one, is used to work out which properties are new, have changed price or have
+# been delisted since then (see daft_incremental.py)
+store = SnapshotStore(args.store_dir)
+snapshot = args.replay or snapshot_name()
+DELTA_CSV = os.path.join('Files', 'daft_delta_' + snapshot + '.csv')
+
+# The time spent in each stage of the run (plan, fetch, parse, extract, normalize, merge, write, index), the pages
+# and bytes which went through it, the peak memory and the rows dropped by each filter are recorded in a run report
+# (see daft_metrics.py), written to Files/run_<snapshot>.json at the end. --profile <stage> also runs cProfile over
+# just that stage e.g. python Daft_webscrape_script.py --replay 20210301T093000 --profile parse
+# For a sampling profiler (py-spy record --pid ...) --trace-stages prints when each stage starts and stops.
+report = RunReport(snapshot, profile=args.profile, verbose=args.trace_stages)
 
 ################################################################################################################
 # Section 1 - We will firstly do a simple web scrape of the first 20 ads on Daft.ie to see if there is
 #             any potential issues with the code
 ################################################################################################################
 
-# Pull the html code into a variable called req
-req = requests.get('https://www.daft.ie/property-for-sale/ireland')
-req_str = req.text
+# Pull the html code into a variable called req (when replaying we use the first page of the cached snapshot)
+if args.replay:
+    req_str = next(cache.replay(args.replay))
+else:
+    req = requests.get('https://www.daft.ie/property-for-sale/ireland')
+    req_str = req.text
 print(req_str)  # prints the html code
 
 # Create a beautiful soup object soup which will be used to parse the html code
@@ -67,9 +134,10 @@ price_span_bs = soup.findAll('span', {'class': 'TitleBlock__StyledSpan-sc-1avkva
 
 len(loc_bs)  # not all of the ads are brought into Python at the time of running this only 19 properties are included
 
-# Let us put the first 17 values into a list and then a dataframe to see if there are any issues
+# Let us put the first 17 values (or fewer if the page has fewer "normal" ads) into a list and then a dataframe to
+# see if there are any issues
 prop_info = []
-for i in range(17):
+for i in range(min(17, len(loc_bs))):
     prop_info_i = [loc_bs[i].text, bed_bath_area_bs[i].text, btype_bs[i].text, price_span_bs[i].text]
     prop_info.append(prop_info_i)
 
@@ -90,179 +158,95 @@ print(prop_info_df)
 #             each block of html code contains information on one property (price, location, bedrooms etc.)
 ################################################################################################################
 
-# Pull the html code in text format into a variable called req_str for the first 15,000 properties
-# which is close to the total number of properties for sale on Daft (feel free to update).
-req = requests.get('https://www.daft.ie/property-for-sale/ireland')
-req_str = req.text
-
-req2 = requests.get('https://www.daft.ie/property-for-sale/ireland?from=20&pageSize=20')
-req_str = req_str + req2.text
-
-for i in range(40, 15000, 20):
-    url_n = 'https://www.daft.ie/property-for-sale/ireland?pageSize=20&from=' + str(i)
-    req_n = requests.get(url_n).text
-    req_str = req_str + req_n
-
-# Create a beautiful soup object soup which will be used to parse the html code
-soup = bs(req_str, 'html.parser')
-print(type(soup))
-
-# Parse the html code (similar to previous)
-loc_bs = soup.findAll('p', {'class': 'TitleBlock__Address-sc-1avkvav-7 knPImU'})
-bed_bath_area_bs = soup.findAll('div', {'class': 'TitleBlock__CardInfo-sc-1avkvav-9 QvaxK'})
-btype_bs = soup.findAll('p', {'class': 'TitleBlock__CardInfoItem-sc-1avkvav-8 bcaKbv'})
-price_span_bs = soup.findAll('span', {'class': 'TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc'})
-print(len(loc_bs))
-print(bed_bath_area_bs)
-
-# Information on Bed/bath/area and price from the "special" or multiple
-# property ads are included.
-# For Bed/bath/area these have been brought in with a missing text value for which we will remove by
-# specifying that the length must be greater than zero.
-# Price for "special" ads has been brought in incorrectly, we can distinguish these cases
-# based off on their parent value (we use the anchor reference as the parent value).
-# To learn more about parents, siblings (and the whole family tree) in beautifulSoup there are some
-# excellent YouTube videos which I am happy to share
-
-price_lst = []
-bba_lst = []
-for i in range(len(price_span_bs)):
-    pc_txt_i = price_span_bs[i].text
-    pc_parent_txt_i = price_span_bs[i].find_parent('a')['href']
-    price_lst.append((pc_parent_txt_i, pc_txt_i))
-
-    # Creating a separator as this will make it easier to split the data into separate columns later
-    bba_txt_i = bed_bath_area_bs[i].get_text(separator='·')
-    if len(bba_txt_i) > 0:
-        bba_lst.append(bba_txt_i)
-print(len(price_lst))
-print(len(bba_lst))
-
-# Location and property/building type
-
-loc_lst = []
-btype_lst = []
-for i in range(len(loc_bs)):
-    loc_txt_i = loc_bs[i].text
-    btype_txt_i = btype_bs[i].text
-    loc_lst.append(loc_txt_i)
-    btype_lst.append(btype_txt_i)
-print(len(loc_lst))
-print(len(btype_lst))
-
-#   Location
-#   Convert the location list into a dataframe
-#   The county for each of the properties should be the information on each property after the last comma
-
-#   Going forward you may want to do more segregation on the address column. You may want to get the town associated
-#   with each property by passing in the list of all towns and villages in Ireland which you can get from the
-#   following Wikipedia page https://en.wikipedia.org/wiki/List_of_towns_and_villages_in_the_Republic_of_Ireland
-
-county_lst =['Co. Antrim',	'Co. Armagh',	'Co. Carlow',	'Co. Cavan',	'Co. Clare',	'Co. Cork',
-             'Co. Derry',	'Co. Donegal',	'Co. Down',	'Co. Dublin',	'Co. Fermanagh',	'Co. Galway',
-             'Co. Kerry',	'Co. Kildare',	'Co. Kilkenny',	'Co. Laois',	'Co. Leitrim',	'Co. Limerick',
-             'Co. Longford', 'Co. Louth',	'Co. Mayo',	'Co. Meath',	'Co. Monaghan',	'Co. Offaly',
-             'Co. Roscommon',	'Co. Sligo',	'Co. Tipperary',	'Co. Tyrone',	'Co. Waterford',
-             'Co. Westmeath',	'Co. Wexford',	'Co. Wicklow',	'Dublin 1',	'Dublin 10',	'Dublin 11',
-             'Dublin 12',	'Dublin 13', 'Dublin 14',	'Dublin 15',	'Dublin 16',	'Dublin 17',
-             'Dublin 18',	'Dublin 2',	'Dublin 20',	'Dublin 22',	'Dublin 24',	'Dublin 3',
-             'Dublin 4',	'Dublin 5',	'Dublin 6',	'Dublin 6W',	'Dublin 7',	'Dublin 8',
-             'Dublin 9']
-
-
-loc_df = pd.DataFrame(loc_lst, columns=['address'])
-loc_df['county_t'] = loc_df['address'].str.rsplit(',').str[-1]
-loc_df.loc[loc_df['county_t'].str.strip().isin(county_lst), ['county']] = loc_df['county_t']
-loc_df.drop('county_t',axis=1,inplace=True)
-loc_df['county'].fillna('', inplace=True)
-loc_df.head()
-
-loc_df.loc[loc_df['address']=='Woodlands, 1 Roebuck Drive']
-
-
-#   Price
-#   Only keep properties which have a parent address which starts with '/for-sale' as we know that these are
-#   the properties we are interested in.
-
-pc_df = pd.DataFrame(price_lst, columns=['ref', 'price'])
-pc_df = pc_df.loc[pc_df['ref'].str[:9] == '/for-sale']
-pc_df.reset_index(inplace=True)
-pc_df.drop(columns=['index', 'ref'], inplace=True)
-pc_df.head()
-
-# The price field is a character field. We want to remove all €,£, and any character fields such as "Price on
-# Application"
-# If you are ever in doubt on regex use the following website https://regex101.com/r/CMGOHz/1
-pc_df['price'] = pc_df['price'].str.strip()
-pc_df['price_n'] = pc_df['price'].replace({'\€': '',  # € symbols replaced with ''
-                                           ',': '',  # , replaced with ''
-                                           'AMV: ': '',  # AMV replaced with ''
-                                           'AMV: Price on Application': '0', # AMV PoA replaced with '0'
-                                           'Price on Application': '0', # PoA replaced with '0'
-                                           '(£.*?)[\s]': '',   # converts '£2,000 (€2,300)' to '(€2,300)'
-                                           '[\(\)]': '' } # converts (2300) to 2300
-                                          , regex=True).astype(float)
-
-pc_df.info() # check to ensure price_n is numeric
-
-
-#   Bed/Bath/Area
-#   Split the Bed/Bath/Area dataframe into each of its components, please note the 'extra' column contains
-#   auctioneer information which we are not interested in
-#   Each of the columns are given a suffix '_t' as they are temporary columns as info for many properties are in the
-#   wrong columns e.g. prop_type info could be in the "bath" column.
-
-
-bba_df = pd.DataFrame(bba_lst, columns=['bba'])
-bba_wrk = bba_df['bba'].str.split(pat='·', expand=True)
-bba_wrk.columns = ['bed_t', 'bath_t', 'area_t', 'prop_type_t', 'extra_t']
-
-# useful code for removing the trailing blanks for the char fields in the dataset
-bba_wrk = bba_wrk.apply(lambda x: x.str.strip())
-bba_wrk = bba_wrk.fillna('')
-bba_wrk.head()
-
-# Bed
-# Information on the number of bedrooms will only ever be contained in the bed column
-bba_wrk.loc[bba_wrk['bed_t'].str.contains('Bed'), ['bed']] = bba_wrk['bed_t']
-
-# Bath
-# The number of bathrooms could be contained in either 'bed_t' or bath_t
-bba_wrk.loc[bba_wrk['bed_t'].str.contains('Bath'), ['bath']] = bba_wrk['bed_t']
-bba_wrk.loc[bba_wrk['bath_t'].str.contains('Bath'), ['bath']] = bba_wrk['bath_t']
-
-# Proprty Type
-# For property type we pass a list of all property types through the dataframe to create our property type column
-prop_lst = ['Apartment', 'Bungalow', 'Detached', 'Duplex', 'End of Terrace', 'House', 'Semi-D', 'Site', 'Studio' \
-    , 'Terrace', 'Townhouse']
-bba_wrk.loc[bba_wrk['bed_t'].isin(prop_lst), ['prop_type']] = bba_wrk['bed_t']
-bba_wrk.loc[bba_wrk['bath_t'].isin(prop_lst), ['prop_type']] = bba_wrk['bath_t']
-bba_wrk.loc[bba_wrk['area_t'].isin(prop_lst), ['prop_type']] = bba_wrk['area_t']
-bba_wrk.loc[bba_wrk['prop_type_t'].isin(prop_lst), ['prop_type']] = bba_wrk['prop_type_t']
-bba_wrk.head()
-
-# Area
-# For getting the area of each property we use regex to look for either the pattern "[number] m" or
-# "[number] ac" to get the area as the area of properties will either be quoted in m^2 or in acres.
-bba_wrk.loc[(bba_wrk['bed_t'].str.contains(r'\d m'))
-            | (bba_wrk['bed_t'].str.contains(r'\d ac')), ['area']] = bba_wrk['bed_t']
-
-bba_wrk.loc[(bba_wrk['bath_t'].str.contains(r'\d m'))
-            | (bba_wrk['bath_t'].str.contains(r'\d ac')), ['area']] = bba_wrk['bath_t']
-
-bba_wrk.loc[(bba_wrk['area_t'].str.contains(r'\d m'))
-            | (bba_wrk['area_t'].str.contains(r'\d ac')), ['area']] = bba_wrk['area_t']
-
-bba_wrk.loc[(bba_wrk['prop_type_t'].str.contains(r'\d m'))
-            | (bba_wrk['prop_type_t'].str.contains(r'\d ac')), ['area']] = bba_wrk['prop_type_t']
-
-# Remove the temporary columns
-bba_df_final = bba_wrk.drop(columns=['bed_t', 'bath_t', 'area_t', 'prop_type_t', 'extra_t'])
-bba_df_final.fillna('', inplace=True)
-bba_df_final.head()
+# Rather than requesting a fixed 15,000 properties, the CrawlPlanner (see daft_plan.py) reads how many properties
+# are for sale from the first page, picks the largest page size the site allows and splits the crawl into one
+# shard per county (large counties are only split again by price band on a site which can search for just the
+# properties with no price). The number of pages of each shard is known from its count so no empty pages are
+# requested and no properties are missed past offset 15,000.
+# Rather than requesting each page one after the other we use the PageFetcher (see daft_fetch.py) which keeps
+# up to 8 requests in flight over one keep-alive session, retries failed pages and returns the pages in order.
+
+# We no longer join every page into one giant string and soup. Each page is parsed on its own as it arrives,
+# every ad (listing card) on the page is read once into a Listing record and the page is then thrown away
+# (see daft_extract.py for the parsing code). A Listing holds the address, price and bed/bath/area of a "normal"
+# ad, or the address and the price and bed/bath of each property (sub unit) of a "special" ad. As all of the
+# fields of an ad are read from inside its own card they can never be matched up with the wrong ad.
+# The pages are parsed with the fastest parser installed (selectolax, then lxml, then html.parser) and the css
+# classes we search for are kept in one place, SELECTOR_VERSIONS in daft_parse.py.
+# Each page fetched is also written to a new snapshot in the page cache as it passes through.
+# Every property is keyed by the numeric ID at the end of its link. For an incremental scrape (--incremental) we
+# stop requesting the pages of a shard as soon as a whole page only holds properties from the last snapshot at the
+# same price, as the search results are ordered newest first.
+previous = store.latest(before=snapshot)
+crawl = IncrementalCrawl(previous, stop_early=args.incremental) if previous is not None else None
+
+
+if args.replay:
+    shards = group_shards(cache.urls(args.replay), cache.replay(args.replay, raw=parse_pool is not None))
+else:
+    fetcher = PageFetcher(max_workers=8, per_host=8, retries=3, backoff=0.5)
+    report.start('plan')
+    plan = CrawlPlanner(fetcher, backend).plan()
+    report.stop('plan')
+    print(plan)
+    shards = ((shard.key, cache.record(snapshot, shard.urls, pages)) for shard, pages in plan.iter_shards(fetcher))
+
+listings = []
+for shard, pages in shards:
+    # The fetch stage is timed while we wait on each page, the parse stage while each page is parsed
+    pages = report.timed_iter('fetch', pages, size=page_bytes)
+    page_listings = parse_pool.iter_page_listings(pages) if parse_pool else iter_page_listings(pages, backend)
+    page_listings = report.timed_iter('parse', page_listings)
+    if crawl is not None:
+        page_listings = crawl.pages(page_listings, shard)
+    listings.extend(ad for page in page_listings for ad in page)
+if parse_pool is not None:
+    parse_pool.close()
+if crawl is not None and crawl.stopped_early:
+    print('Stopped %d of the shards early after %d pages, the rest of their properties are in the last snapshot'
+          % (len(crawl.stopped_shards), crawl.pages_seen))
+
+if not args.replay:
+    fetcher.close()
+    print(fetcher.stats)  # pages/sec can be compared with the serial loop using benchmarks/bench_fetch.py
+    report.info.update(bytes_downloaded=fetcher.stats.bytes, pages_downloaded=fetcher.stats.pages,
+                       retries=fetcher.stats.retries, probe_requests=plan.probes)
+    print('Pages cached as snapshot ' + snapshot)
+    cache.evict()  # remove snapshots which are past their TTL or over the cache size cap
+
+# Put the "normal" ads into a dataframe with one row per ad, and the properties of the "special" ads (Section 3)
+# into a dataframe with one row per property (see listing_frames in daft_pipeline.py, which the daft-scrape command
+# uses too). Only properties which have an anchor reference which starts with '/for-sale' are kept as we know
+# that these are the properties we are interested in.
+report.start('extract')
+ads_df, sp_df = listing_frames(listings, report)
+report.stop('extract')
+print(ads_df.shape)
+
+#   Clean up
+#   The clean up of the location, price and bed/bath/area is shared by Sections 2 and 3 (see daft_normalize.py)
+#   Location - the county for each of the properties is the Dublin postal district or county named in the address
+#              (any of 'Co. Cork', 'Co Cork', 'County Cork', 'Dublin 6W', 'dublin 6w' or a Dublin Eircode), else the
+#              district or county of the town it names, it is left blank if none of these are known. The towns are
+#              those of daft_data/towns.csv, the towns and villages of each county taken from the following
+#              Wikipedia page, and the Dublin areas, compiled into daft_data/gazetteer.csv (see daft_gazetteer.py)
+#              https://en.wikipedia.org/wiki/List_of_towns_and_villages_in_the_Republic_of_Ireland
+#              get_gazetteer().resolve(daft_df['address']) also gives the town of each property.
+#   Price    - the price field is a character field, we pull out the euro amount into price_eur. Prices such as
+#              "Price on Application" have no euro amount so are left null (rather than 0).
+#              '£2,000 (€2,300)' is converted to 2300. If you are ever in doubt on regex use the following website
+#              https://regex101.com/r/CMGOHz/1
+#   Bed/Bath/Area - each of the '·' separated pieces of text is classified as a number of bedrooms ('3 Bed'),
+#              bathrooms ('2 Bath'), an area ('145 m²' or '0.5 ac') or a property type ('Semi-D'), this
+#              information could be in any of the positions e.g. the property type could be in the "bath" position.
+#              The auctioneer information ('extra') is not kept. Numeric bed_n, bath_n and area_m2 (areas quoted in
+#              acres are converted to m²) columns are created alongside the text columns.
 
 # Create a dataframe containing all of the information on "normal" ads quoted on Daft.ie
-daft_df_1 = pd.concat([loc_df, bba_df_final, pc_df], axis=1)
+report.start('normalize')
+daft_df_1 = normalize_listings(ads_df)
+report.stop('normalize')
+daft_df_1.info()  # check to ensure price_eur, bed_n, bath_n and area_m2 are numeric
 daft_df_1.head()
 
 
@@ -273,138 +257,93 @@ daft_df_1.head()
 ################################################################################################################
 
 
-# Extract the required information using soup
-loc_bs_sp = soup.findAll("p", {'class': 'TitleBlock__Address-sc-1avkvav-7 eARcqq'})
-bed_bath_area_bs_sp = soup.findAll("div", {'class': 'SubUnit__CardInfoItem-sc-10x486s-7 AsGHw'})
-price_bs_sp = soup.findAll({"span", "p"}, {'class': 'SubUnit__Title-sc-10x486s-5 keXaVZ'})
-
-# Similar to Section 2 we get the location, price and Bed/Bath/Area (bba) lists by looping through each of the text
-# fields. The issue we face with these properties is that we have multiple properties associated with singular locations
-# so we will have to create an identifier for linking each property to the correct location
-# We know that the parent ("li")['data-testid'] of the location is equal to the "grandparent" (the second result
-# of the find_parents) of the price and bba, we will use this to join the dataframes later in the code.
-
-loc_sp_lst = []
-for i in range(len(loc_bs_sp)):
-    loc_sp_txt_i = loc_bs_sp[i].text
-    loc_next_txt_i = loc_bs_sp[i].find_parent("li")['data-testid']
-    loc_sp_lst.append((loc_next_txt_i, loc_sp_txt_i))
-
-price_sp_lst = []
-for i in range(len(price_bs_sp)):
-    pc_sp_txt_i = price_bs_sp[i].text
-    pc_parent_txt_i = price_bs_sp[i].find_parents("li")[1]['data-testid']
-    price_sp_lst.append((pc_parent_txt_i, pc_sp_txt_i))
-
-print(price_sp_lst)
-
-bba_sp_lst = []
-for i in range(len(bed_bath_area_bs_sp)):
-    if len(bed_bath_area_bs_sp[i].text) > 0:
-        bba_sp_txt_i = bed_bath_area_bs_sp[i].text
-        bba_parent_txt_i = bed_bath_area_bs_sp[i].find_parents("li")[1]['data-testid']
-        bba_sp_lst.append((bba_parent_txt_i, bba_sp_txt_i))
-
+# The "special" ads were read from each page in Section 2 (see extract_card in daft_extract.py).
+# The issue we face with these properties is that we have multiple properties associated with singular locations.
+# Each "special" Listing carries its own sub units so we create one row per property (sub unit) with the address
+# of its ad already on the row, no joining of separate location, price and bed/bath lists is required.
+# The 'data-testid' of the ad is kept as the 'join_value' and each property is keyed by the ID in its own link.
+# sp_df was built alongside ads_df in Section 2.
+print(sp_df.shape)
 
-#   Location
-#   No change from the previous code except we now have a 'join_value'
-loc_sp_df = pd.DataFrame(loc_sp_lst, columns=['join_value', 'address'])
-loc_sp_df['county_t'] = loc_sp_df['address'].str.rsplit(',').str[-1]
-loc_sp_df.loc[loc_sp_df['county_t'].str.strip().isin(county_lst), ['county']] = loc_sp_df['county_t']
-loc_sp_df.drop('county_t',axis=1,inplace=True)
-loc_sp_df['county'].fillna('', inplace=True)
-loc_sp_df.head()
-loc_sp_df.shape
 
-#   Location
-#   No change from the previous code except we now have a 'join_value'
-pc_sp_df = pd.DataFrame(price_sp_lst, columns=['join_value', 'price'])
-pc_sp_df.head()
-pc_sp_df.shape
-
-pc_sp_df['price_n'] = pc_sp_df['price'].replace({'\€': '',
-                                                 ',': '',
-                                                 'AMV: ': '',
-                                                 'AMV: Price on Application': '0',
-                                                 'Price on Application': '0',
-                                                 '(£.*?)[\s]': '',
-                                                 '[\(\)]': ''}
-                                                , regex=True).astype(float)
-
-pc_sp_df.info()
-
-
-#   Bed/Bath/Area
-#   No change from the previous code, we do not have any information on area so we will create an Area field
-#   which is blank
-
-bba_sp_df = pd.DataFrame(bba_sp_lst, columns=['join_value', 'bba'])
-bba_sp_df.head()
-bba_sp_df.shape
-
-bba_sp_wrk = bba_sp_df['bba'].str.split(pat='·', expand=True)
-bba_sp_wrk.columns = ['bed_t', 'bath_t', 'prop_type_t']
-bba_sp_wrk = bba_sp_wrk.apply(lambda x: x.str.strip())
-bba_sp_wrk = bba_sp_wrk.fillna('')
-bba_sp_wrk.head()
-
-# Bed
-bba_sp_wrk.loc[bba_sp_wrk['bed_t'].str.contains('Bed'), ['bed']] = bba_sp_wrk['bed_t']
-
-# Bath
-bba_sp_wrk.loc[bba_sp_wrk['bed_t'].str.contains('Bath'), ['bath']] = bba_sp_wrk['bed_t']
-bba_sp_wrk.loc[bba_sp_wrk['bath_t'].str.contains('Bath'), ['bath']] = bba_sp_wrk['bath_t']
-
-# Property Type
-bba_sp_wrk.loc[bba_sp_wrk['bed_t'].isin(prop_lst), ['prop_type']] = bba_sp_wrk['bed_t']
-bba_sp_wrk.loc[bba_sp_wrk['bath_t'].isin(prop_lst), ['prop_type']] = bba_sp_wrk['bath_t']
-bba_sp_wrk.loc[bba_sp_wrk['prop_type_t'].isin(prop_lst), ['prop_type']] = bba_sp_wrk['prop_type_t']
-
-# Area
-bba_sp_wrk['area'] = ''
-
-# Concatenate the bba_sp_wrk with the join_value
-bba_sp_df_final = pd.concat([bba_sp_df['join_value'], bba_sp_wrk.drop(columns=['bed_t', 'bath_t', 'prop_type_t'])]
-                            , axis=1)
-bba_sp_df_final.fillna('', inplace=True)
-bba_sp_df_final.head()
-
-
-
-# Join each of the tables based on the 'join_value'
-daft_df_2 = pd.merge(pd.merge(loc_sp_df, bba_sp_df_final, on=['join_value'], how='inner')
-                     , pc_sp_df, on=['join_value'], how='inner')
-
-# Remove any duplicates
-daft_df_2.drop_duplicates(subset=['join_value', 'address', 'county', 'price', 'bed', 'bath', 'prop_type']
-                          , inplace=True)
-
-# Drop the 'join_value' field as it is no longer required
-daft_df_2.drop(columns=['join_value'], axis=1, inplace=True)
+#   Clean up
+#   No change from the previous code, we do not have any information on area for these properties so the area
+#   columns will be blank
+report.start('normalize')
+daft_df_2 = normalize_listings(sp_df)
+report.stop('normalize')
+daft_df_2.head()
 
 # Concatenate the two tables to create your final daft table and remove any duplicate values
-# (properties which appear on Daft more than once)
-daft_df = pd.concat([daft_df_1, daft_df_2], ignore_index=True)
-daft_df.drop_duplicates(subset=['address', 'county', 'bed', 'bath', 'prop_type','area','price']
-                          , inplace=True)
+# (properties which appear on Daft more than once), each property has its own listing_id so this is a lookup
+# on one column. The 'join_value' and 'ref' fields are no longer required.
+report.start('merge')
+daft_df = merge_frames([daft_df_1, daft_df_2], report)
 daft_df.head()
 daft_df.tail()
 daft_df.shape
 
-# Write out the file as a csv on your computer
-daft_df.to_csv(r'Files\daft_df.csv', index=False, header=True)
+# Compare with the last snapshot. The delta holds one row for each new, price changed or delisted property. For an
+# incremental scrape the properties of each shard after the page it stopped at are carried forward from the last
+# snapshot, only the shards crawled in full can show a property as delisted.
+if crawl is not None:
+    daft_df, delta_df = crawl.finish(daft_df)
+    for change, n in delta_df['change'].value_counts().items():
+        report.count('delta_' + change, n)
+report.stop('merge')
+
+# Append the snapshot to the store (and write it out as a csv on your computer if asked to)
+report.start('write')
+if crawl is not None:
+    print(delta_df['change'].value_counts())
+    os.makedirs('Files', exist_ok=True)
+    delta_df.to_csv(DELTA_CSV, index=False, header=True)
+store.write(daft_df, snapshot)
+if args.csv:
+    daft_df.to_csv(args.csv, index=False, header=True)
+report.stop('write')
+report.count('rows_written', len(daft_df))
 
 
 # You can now perform analysis on your data
+# Rather than grouping every row of every snapshot each time, each snapshot is summarised once into a price index
+# (the count, sum, sum of squares and a quantile sketch of the price per county, bed, property type and snapshot,
+# see daft_aggregates.py). Any snapshots in the store which are not in the index yet (e.g. this one) are added.
+report.start('index')
+index = PriceIndex(args.index_dir)
+index.update(store)
+report.stop('index')
+
+# The run report: how long each stage took, how many pages and bytes went through it and the rows dropped
+print(report)
+report.write_json(args.report or os.path.join('Files', 'run_' + snapshot + '.json'))
+if args.prometheus:
+    report.write_prometheus(args.prometheus)
+if args.profile:
+    print(report.write_profile(os.path.join('Files', 'profile_' + args.profile + '_' + snapshot + '.prof')))
+
 # Get a pivot of the price of properties by county and the number of bedrooms
-# (please note we remove all cases which have a price = 0 as this is our "unknown" field rather than
-# properties on sale for free!!)
-pvt_data = pd.pivot_table(daft_df.loc[daft_df['price_n']>0], values='price_n',
-                          index='county', columns='bed' ,aggfunc=np.mean)
+# (please note properties with no price e.g. "Price on Application" have a null price_eur and are not included)
+pvt_data = index.pivot(snapshot, index='county', columns='bed_n', stat='mean')
 
 print(pvt_data)
 
 # Where are the 5 most expensive 3 bedroom properties in ireland according to Daft and what is the average price?
 # As expected its Dublin 4, Dublin 6, Dublin 18, Dublin 2 and Dublin 6W
-pvt_data.sort_values('3 Bed', ascending=False,inplace=True)
-pvt_data['3 Bed'].head()
\ No newline at end of file
+pvt_data.sort_values(3, ascending=False, inplace=True)
+pvt_data[3].head()
+
+# How has the price of 3 bedroom properties in Dublin 6 moved over the last 3 months?
+print(index.trend('Dublin 6', bed=3, months=3))
+
+# What is a fair price for a property, based on the 5 most similar properties for sale in the same county?
+# The ValuationIndex (see daft_valuation.py) is built once from this snapshot and can value a whole mortgage book
+# (a DataFrame with county, prop_type, bed_n, bath_n and area_m2 columns) in one call. Properties whose value in
+# the book is more than 20% away from the estimate are flagged for re-valuation.
+valuation = ValuationIndex(daft_df, k=5)
+book_df = pd.DataFrame({'county': ['Dublin 6', 'Co. Cork'], 'prop_type': ['Semi-D', 'Apartment'],
+                        'bed_n': [3, 2], 'bath_n': [2, 1], 'area_m2': [110.0, 70.0],
+                        'book_value': [650000, 180000]})
+estimates_df, comparables_df = valuation.value(book_df)
+print(comparables_df)
+print(flag_revaluations(book_df['book_value'], estimates_df))
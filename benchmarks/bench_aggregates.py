@@ -0,0 +1,128 @@
+################################################################################################################
+# Benchmark - trend queries from the PriceIndex aggregates vs re-reading and grouping the raw snapshots
+################################################################################################################
+
+# A history of snapshots (one every 3 days) is made by sampling the properties of the bundled daft_df.csv and
+# moving the prices a little from one snapshot to the next. Each snapshot is written to a SnapshotStore and
+# ingested into a PriceIndex, then "the 3 month price movement of 3 bedroom properties in Dublin 6" and the
+# county by bed pivot are answered both ways.
+#   python benchmarks/bench_aggregates.py --snapshots 60 --rows 15000
+
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_aggregates import PriceIndex  # noqa: E402
+from daft_normalize import normalize_listings  # noqa: E402
+from daft_store import SnapshotStore  # noqa: E402
+
+
+def synthetic_snapshots(n_snapshots, n_rows, seed=0):
+    """Yield (snapshot name, normalized DataFrame) for a snapshot every 3 days ending today."""
+    sample = pd.read_csv(os.path.join(REPO_DIR, 'daft_df.csv'), keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    end = datetime.datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    drift = 1.0
+    for i in range(n_snapshots):
+        when = end - datetime.timedelta(days=3 * (n_snapshots - 1 - i))
+        rows = sample.sample(n=n_rows, replace=True, random_state=seed + i).reset_index(drop=True)
+        df = normalize_listings(pd.DataFrame({
+            'listing_id': np.arange(n_rows).astype(str),
+            'address': rows['address'],
+            'price': rows['price'],
+            'bba': rows['bed'] + '·' + rows['bath'] + '·' + rows['area'] + '·' + rows['prop_type'],
+        }))
+        drift *= 1 + rng.normal(0.002, 0.005)
+        df['price_eur'] = (df['price_eur'] * drift * rng.normal(1, 0.02, n_rows)).round().astype('Int64')
+        yield when.strftime('%Y%m%dT%H%M%S'), df
+
+
+def timed(run, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return result, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snapshots', type=int, default=60)
+    parser.add_argument('--rows', type=int, default=15000)
+    parser.add_argument('--county', default='Dublin 6')
+    parser.add_argument('--bed', type=int, default=3)
+    parser.add_argument('--months', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='bench_aggregates_')
+    try:
+        store = SnapshotStore(os.path.join(work_dir, 'snapshots'))
+        index = PriceIndex(os.path.join(work_dir, 'price_index'))
+        ingest_secs = 0.0
+        for snapshot, df in synthetic_snapshots(args.snapshots, args.rows):
+            store.write(df, snapshot)
+            start = time.perf_counter()
+            index.ingest(df, snapshot)
+            ingest_secs += time.perf_counter() - start
+        print('%d snapshots of %d rows, ingest %.1f ms/snapshot, %d cells and %d sketch buckets in the index'
+              % (args.snapshots, args.rows, 1000 * ingest_secs / args.snapshots, len(index.cells),
+                 len(index.sketches)))
+
+        # Re-open the index from disk as a later run would
+        index, load_secs = timed(lambda: PriceIndex(os.path.join(work_dir, 'price_index')), repeat=1)
+        print('%-34s %9.1f ms' % ('load the index', 1000 * load_secs))
+
+        end = pd.Timestamp(index.cells['scrape_date'].max())
+        since = (end - pd.DateOffset(months=args.months)).strftime('%Y-%m-%d')
+
+        def raw_trend():
+            rows = store.read(columns=['snapshot', 'price_eur'], counties=[args.county], beds=[args.bed],
+                              since=since)
+            # The sketch's median is the lower of the two middle prices when there is an even number of them
+            return rows.dropna().groupby('snapshot')['price_eur'].agg(
+                ['count', 'mean', lambda p: p.quantile(0.5, interpolation='lower')]).set_axis(
+                ['count', 'mean', 'median'], axis=1)
+
+        def raw_pivot():
+            rows = store.read(columns=['snapshot', 'county', 'bed_n', 'price_eur'])
+            rows = rows.loc[rows['price_eur'].notna()]
+            return pd.pivot_table(rows, values='price_eur', index=['snapshot', 'county'], columns='bed_n',
+                                  aggfunc='mean', observed=True)
+
+        def index_pivot():
+            return {snapshot: index.pivot(snapshot) for snapshot in index.snapshots()}
+
+        raw, raw_secs = timed(raw_trend)
+        agg, agg_secs = timed(lambda: index.trend(args.county, bed=args.bed, months=args.months))
+        print('%-34s %9.1f ms' % ('trend, raw snapshots', 1000 * raw_secs))
+        print('%-34s %9.1f ms  (%.0fx)' % ('trend, price index', 1000 * agg_secs, raw_secs / agg_secs))
+        _, raw_secs = timed(raw_pivot, repeat=1)
+        _, agg_secs = timed(index_pivot, repeat=1)
+        print('%-34s %9.1f ms' % ('pivot of every snapshot, raw', 1000 * raw_secs))
+        print('%-34s %9.1f ms  (%.0fx)' % ('pivot of every snapshot, index', 1000 * agg_secs, raw_secs / agg_secs))
+
+        # The means must agree and the medians must be within alpha of the exact medians
+        raw = raw.astype('float64').reindex(agg.index)
+        mean_err = float(np.max(np.abs(agg['mean'] / raw['mean'] - 1)))
+        median_err = float(np.max(np.abs(agg['median'] / raw['median'] - 1)))
+        print('%d snapshots in the trend, largest relative error: mean %.2g, median %.4f (alpha %.2f)'
+              % (len(agg), mean_err, median_err, index.alpha))
+        print(agg[['scrape_date', 'count', 'mean', 'median', 'median_change']].tail())
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
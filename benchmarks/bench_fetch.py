@@ -0,0 +1,57 @@
+################################################################################################################
+# Benchmark - serial requests.get loop vs the concurrent PageFetcher
+################################################################################################################
+
+# Run from the repository root, e.g.
+#   python benchmarks/bench_fetch.py --pages 200 --latency 0.05 --workers 8
+#   python benchmarks/bench_fetch.py --pages-dir recorded_pages
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daft_fetch import PageFetcher, search_urls  # noqa: E402
+from standin_server import StandinServer, load_recorded_pages  # noqa: E402
+
+
+def serial_fetch(urls):
+    # This is the loop from Section 2 of the original script (without the string concatenation)
+    pages = []
+    for url_n in urls:
+        pages.append(requests.get(url_n).text)
+    return pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the serial requests.get loop against the concurrent PageFetcher')
+    parser.add_argument('--pages', type=int, default=200, help='number of search pages to request')
+    parser.add_argument('--pages-dir', help='directory of recorded .html search pages to serve')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds of latency added per response')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    recorded = load_recorded_pages(args.pages_dir) if args.pages_dir else []
+    with StandinServer(recorded, latency=args.latency) as server:
+        urls = search_urls(0, args.pages * 20, 20, base_url=server.base_url)
+
+        start = time.perf_counter()
+        serial_pages = serial_fetch(urls)
+        serial_secs = time.perf_counter() - start
+
+        fetcher = PageFetcher(max_workers=args.workers, per_host=args.workers)
+        pooled_pages = fetcher.fetch_all(urls)
+        fetcher.close()
+
+    assert pooled_pages == serial_pages, 'the fetcher must return the pages in the same order as the serial loop'
+    print('serial loop : %d pages in %.2fs (%.1f pages/sec)' % (len(urls), serial_secs, len(urls) / serial_secs))
+    print('PageFetcher : %d pages in %.2fs (%.1f pages/sec)'
+          % (fetcher.stats.pages, fetcher.stats.elapsed, fetcher.stats.pages_per_sec))
+
+
+if __name__ == '__main__':
+    main()
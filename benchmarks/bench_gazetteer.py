@@ -0,0 +1,101 @@
+################################################################################################################
+# Benchmark - resolving addresses with the gazetteer vs the county after the last comma
+################################################################################################################
+
+# --addresses addresses (100k by default) are sampled from daft_df.csv and varied the way real addresses vary: a
+# random house number (so that most of them are distinct), 'Co. Dublin' written 'Co Dublin' or 'County Dublin',
+# a lower case postal district ('dublin 6w'), the county left off so the address ends in its town, or a Dublin
+# Eircode in place of the district. For each of
+#   last comma  - the county after the last comma kept if it is in COUNTY_LST (how the script used to do it)
+#   gazetteer   - Gazetteer.resolve (daft_gazetteer.py), town, county, district and location in one pass
+# the throughput (addresses per second, best of --repeat runs) and the share of the addresses given a location
+# are reported, along with the time to compile gazetteer.csv and to load the compiled index from its cache.
+#   python benchmarks/bench_gazetteer.py --addresses 100000
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_gazetteer import GAZETTEER_FILE, Gazetteer  # noqa: E402
+from daft_normalize import COUNTY_LST  # noqa: E402
+
+# The Eircode routing key of each postal district
+ROUTING_KEYS = {'Dublin 6W': 'D6W'}
+ROUTING_KEYS.update({c: 'D%02d' % int(c.split()[1]) for c in COUNTY_LST if c.startswith('Dublin ') and c[-1] != 'W'})
+
+
+def last_comma(address):
+    """The county after the last comma of the address, as county_from_address did before the gazetteer."""
+    county_t = address.str.rsplit(',').str[-1].str.strip()
+    return county_t.where(county_t.isin(COUNTY_LST), '').fillna('')
+
+
+def sample_addresses(n, seed=0):
+    """n addresses sampled from daft_df.csv with the variations described above."""
+    rng = np.random.default_rng(seed)
+    source = pd.read_csv(os.path.join(REPO_DIR, 'daft_df.csv'), usecols=['address'])['address'].dropna()
+    address = source.sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    address = address.str.replace(r'^\d+[A-Za-z]? ', '', regex=True)
+    address = pd.Series(rng.integers(1, 500, n).astype(str), dtype=object) + ' ' + address
+    parts = address.str.rsplit(',', n=1)
+    head, tail = parts.str[0], parts.str[1].fillna('').str.strip()
+    variant = rng.integers(0, 10, n)
+    eircode = tail.map(ROUTING_KEYS) + ' ' + pd.Series(rng.integers(1000, 9999, n).astype(str), dtype=object)
+    tail = np.select([(variant == 0) & (tail == 'Co. Dublin'), (variant == 1) & tail.str.startswith('Co. '),
+                      (variant == 2) & tail.str.startswith('Dublin '), (variant == 3) & eircode.notna(),
+                      variant == 4],
+                     [pd.Series('Co Dublin', index=tail.index), 'County ' + tail.str[4:], tail.str.lower(),
+                      eircode, pd.Series('', index=tail.index)], default=tail)
+    return pd.Series(np.where(tail == '', head, head + ', ' + tail), dtype=object)
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--addresses', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    address = sample_addresses(args.addresses, args.seed)
+    print('%d addresses, %d distinct' % (len(address), address.nunique()))
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_gazetteer_')
+    try:
+        compile_secs, gazetteer = best_of(1, Gazetteer, GAZETTEER_FILE, cache_dir)
+        load_secs, _ = best_of(args.repeat, Gazetteer, GAZETTEER_FILE, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir)
+    print('gazetteer of %d towns: compiled in %.3fs, loaded from the cache in %.3fs'
+          % (len(gazetteer), compile_secs, load_secs))
+
+    print('%-12s %10s %14s %10s %10s' % ('', 'seconds', 'addresses/s', 'location', 'town'))
+    secs, county = best_of(args.repeat, last_comma, address)
+    print('%-12s %10.3f %14.0f %9.1f%% %10s' % ('last comma', secs, len(address) / secs,
+                                                 100 * (county != '').mean(), '-'))
+    secs, places = best_of(args.repeat, gazetteer.resolve, address)
+    print('%-12s %10.3f %14.0f %9.1f%% %9.1f%%' % ('gazetteer', secs, len(address) / secs,
+                                                    100 * (places['location'] != '').mean(),
+                                                    100 * (places['town'] != '').mean()))
+
+
+if __name__ == '__main__':
+    main()
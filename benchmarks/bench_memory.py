@@ -0,0 +1,72 @@
+################################################################################################################
+# Benchmark - peak memory of the single concatenated soup vs the streaming per page extraction
+################################################################################################################
+
+# Each approach is run in a fresh Python process so that the peak resident set size (ru_maxrss) of one does not
+# hide the other. The recorded pages are cycled through until --pages pages have been processed and are read
+# from disk one at a time so that the input itself does not dominate the measurement.
+#   python benchmarks/bench_memory.py --pages-dir recorded_pages --pages 750
+
+import argparse
+import itertools
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def iter_recorded(pages_dir, n_pages):
+    names = sorted(name for name in os.listdir(pages_dir) if name.endswith('.html'))
+    for name in itertools.islice(itertools.cycle(names), n_pages):
+        with open(os.path.join(pages_dir, name), encoding='utf-8') as f:
+            yield f.read()
+
+
+def run_concat(pages):
+    # The original approach: concatenate every page, then parse and search one soup for the whole site
+    from bench_parse import findall_extract
+
+    req_str = ''
+    for req_n in pages:
+        req_str = req_str + req_n
+    records = findall_extract(req_str)
+    return len(records[0]) + len(records[4])
+
+
+def run_stream(pages):
+    from daft_extract import iter_listings
+
+    return sum(1 for _ in iter_listings(pages))
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages-dir', required=True, help='directory of recorded .html search pages')
+    parser.add_argument('--pages', type=int, default=750)
+    parser.add_argument('--mode', choices=['concat', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        start = time.perf_counter()
+        run = run_concat if args.mode == 'concat' else run_stream
+        n_ads = run(iter_recorded(args.pages_dir, args.pages))
+        print('%-7s: %d ads in %.2fs, peak RSS %.1f MB'
+              % (args.mode, n_ads, time.perf_counter() - start, peak_rss_mb()))
+        return
+
+    for mode in ('concat', 'stream'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--pages-dir', args.pages_dir,
+                        '--pages', str(args.pages), '--mode', mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
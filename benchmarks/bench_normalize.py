@@ -0,0 +1,80 @@
+################################################################################################################
+# Benchmark - the shared normalize_listings clean up vs the original pandas chain of Section 2
+################################################################################################################
+
+# A synthetic batch is made by sampling (with replacement) the bed, bath, area, property type and price of the
+# properties in the bundled daft_df.csv and joining them back into the '·' separated text the scrape produces.
+#   python benchmarks/bench_normalize.py --rows 1000000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_normalize import PROP_LST, normalize_bba, normalize_price  # noqa: E402
+
+
+def synthetic_batch(n_rows, seed=0):
+    sample = pd.read_csv(os.path.join(REPO_DIR, 'daft_df.csv'), keep_default_na=False)
+    rows = sample.sample(n=n_rows, replace=True, random_state=seed).reset_index(drop=True)
+    bba = (rows['bed'] + '·' + rows['bath'] + '·' + rows['area'] + '·' + rows['prop_type'] + '·'
+           + 'Sherry FitzGerald')
+    return bba.rename('bba'), rows['price']
+
+
+def legacy_normalize(bba, price):
+    # The Section 2 code before daft_normalize.py
+    price_n = price.str.strip().replace({'\\€': '', ',': '', 'AMV: ': '', 'AMV: Price on Application': '0',
+                                         'Price on Application': '0', '(£.*?)[\\s]': '', '[\\(\\)]': ''},
+                                        regex=True)
+    price_n = pd.to_numeric(price_n, errors='coerce')
+
+    bba_wrk = bba.str.split(pat='·', expand=True)
+    bba_wrk.columns = ['bed_t', 'bath_t', 'area_t', 'prop_type_t', 'extra_t']
+    bba_wrk = bba_wrk.apply(lambda x: x.str.strip())
+    bba_wrk = bba_wrk.fillna('')
+    bba_wrk.loc[bba_wrk['bed_t'].str.contains('Bed'), ['bed']] = bba_wrk['bed_t']
+    bba_wrk.loc[bba_wrk['bed_t'].str.contains('Bath'), ['bath']] = bba_wrk['bed_t']
+    bba_wrk.loc[bba_wrk['bath_t'].str.contains('Bath'), ['bath']] = bba_wrk['bath_t']
+    for col in ['bed_t', 'bath_t', 'area_t', 'prop_type_t']:
+        bba_wrk.loc[bba_wrk[col].isin(PROP_LST), ['prop_type']] = bba_wrk[col]
+    for col in ['bed_t', 'bath_t', 'area_t', 'prop_type_t']:
+        bba_wrk.loc[(bba_wrk[col].str.contains(r'\d m')) | (bba_wrk[col].str.contains(r'\d ac')), ['area']] = \
+            bba_wrk[col]
+    return bba_wrk.drop(columns=['bed_t', 'bath_t', 'area_t', 'prop_type_t', 'extra_t']).fillna(''), price_n
+
+
+def new_normalize(bba, price):
+    return normalize_bba(bba), normalize_price(price)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    bba, price = synthetic_batch(args.rows)
+    results = {}
+    for name, run in [('original pandas chain', legacy_normalize), ('normalize_bba/price', new_normalize)]:
+        start = time.perf_counter()
+        results[name] = run(bba, price)
+        secs = time.perf_counter() - start
+        print('%-22s %7.2fs  %10.0f rows/sec' % (name, secs, args.rows / secs))
+
+    # The text columns must agree with the original code
+    old_bba, _ = results['original pandas chain']
+    new_bba, _ = results['normalize_bba/price']
+    for col in ['bed', 'bath', 'prop_type', 'area']:
+        mismatches = int(np.sum(old_bba[col].to_numpy() != new_bba[col].to_numpy()))
+        if mismatches:
+            print('%s differs from the original on %d rows' % (col, mismatches))
+
+
+if __name__ == '__main__':
+    main()
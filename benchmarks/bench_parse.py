@@ -0,0 +1,93 @@
+################################################################################################################
+# Benchmark - per page parse + extraction time of each parser backend vs html.parser + findAll
+################################################################################################################
+
+# The baseline is the original approach: a full html.parser soup of the page searched with findAll and lined up
+# by position/find_parents. Every backend must give the same Listings and the same addresses as the baseline,
+# the benchmark stops if one does not.
+#   python benchmarks/bench_parse.py --pages-dir recorded_pages
+#   python benchmarks/bench_parse.py --snapshot 20210301T093000      (pages from the page cache)
+
+import argparse
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup as bs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daft_cache import DEFAULT_CACHE_DIR, PageCache  # noqa: E402
+from daft_extract import extract_page  # noqa: E402
+from daft_parse import get_backend  # noqa: E402
+from standin_server import load_recorded_pages  # noqa: E402
+
+
+def findall_extract(html):
+    # The Section 2/3 code as it was before the parser backends, kept here as the baseline
+    soup = bs(html, 'html.parser')
+    loc_bs = soup.find_all('p', {'class': 'TitleBlock__Address-sc-1avkvav-7 knPImU'})
+    bed_bath_area_bs = soup.find_all('div', {'class': 'TitleBlock__CardInfo-sc-1avkvav-9 QvaxK'})
+    btype_bs = soup.find_all('p', {'class': 'TitleBlock__CardInfoItem-sc-1avkvav-8 bcaKbv'})
+    price_span_bs = soup.find_all('span', {'class': 'TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc'})
+    price_lst = [(pc.find_parent('a')['href'], pc.text) for pc in price_span_bs]
+    bba_lst = [t for t in (bed_bath_area_bs[i].get_text(separator='·') for i in range(len(price_span_bs)))
+               if len(t) > 0]
+    loc_lst = [loc.text for loc in loc_bs]
+    btype_lst = [btype_bs[i].text for i in range(len(loc_bs))]
+
+    loc_bs_sp = soup.find_all('p', {'class': 'TitleBlock__Address-sc-1avkvav-7 eARcqq'})
+    bed_bath_area_bs_sp = soup.find_all('div', {'class': 'SubUnit__CardInfoItem-sc-10x486s-7 AsGHw'})
+    price_bs_sp = soup.find_all({'span', 'p'}, {'class': 'SubUnit__Title-sc-10x486s-5 keXaVZ'})
+    loc_sp_lst = [(loc.find_parent('li')['data-testid'], loc.text) for loc in loc_bs_sp]
+    price_sp_lst = [(pc.find_parents('li')[1]['data-testid'], pc.text) for pc in price_bs_sp]
+    bba_sp_lst = [(bba.find_parents('li')[1]['data-testid'], bba.text)
+                  for bba in bed_bath_area_bs_sp if len(bba.text) > 0]
+    return loc_lst, btype_lst, bba_lst, price_lst, loc_sp_lst, price_sp_lst, bba_sp_lst
+
+
+def time_per_page(extract, pages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract(html) for html in pages]
+        best = min(best, time.perf_counter() - start)
+    return best / len(pages), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages-dir', help='directory of recorded .html search pages')
+    parser.add_argument('--snapshot', help='use the pages of this page cache snapshot')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        pages = list(PageCache(args.cache_dir).replay(args.snapshot))
+    elif args.pages_dir:
+        pages = load_recorded_pages(args.pages_dir)
+    else:
+        parser.error('one of --pages-dir or --snapshot is required')
+
+    base_secs, baseline = time_per_page(findall_extract, pages, args.repeat)
+    print('%-24s %8.2f ms/page' % ('html.parser + findAll', base_secs * 1000))
+    expected_addresses = [page[0] + [address for _, address in page[4]] for page in baseline]
+    expected = None
+    for name in ('html.parser', 'lxml', 'selectolax'):
+        try:
+            backend = get_backend(name)
+        except ImportError as e:
+            print('%-24s skipped (%s)' % (name, e))
+            continue
+        secs, results = time_per_page(lambda html: extract_page(html, backend), pages, args.repeat)
+        addresses = [[ad.address for ad in page if not ad.special] + [ad.address for ad in page if ad.special]
+                     for page in results]
+        expected = expected or results
+        if results != expected or addresses != expected_addresses:
+            raise SystemExit('the %s backend did not give the same listings as the other parsers' % name)
+        print('%-24s %8.2f ms/page  %5.1fx' % (name, secs * 1000, base_secs / secs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+################################################################################################################
+# Benchmark - pages/sec of the ParsePool with 1, 2, 4 and 8 worker processes vs parsing in the one process
+################################################################################################################
+
+# The recorded pages are repeated up to --pages (a full scrape is ~750 pages) and handed to the pool as raw bytes.
+# Every run must give exactly the same Listings, in the same order, as parsing in the one process.
+#   python benchmarks/bench_parse_pool.py --pages-dir recorded_pages --pages 750
+#   python benchmarks/bench_parse_pool.py --snapshot 20210301T093000 --workers 1 2 4 8
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daft_cache import DEFAULT_CACHE_DIR, PageCache  # noqa: E402
+from daft_extract import ParsePool, iter_page_listings  # noqa: E402
+from daft_parse import get_backend  # noqa: E402
+from standin_server import load_recorded_pages  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages-dir', help='directory of recorded .html search pages')
+    parser.add_argument('--snapshot', help='use the pages of this page cache snapshot')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--pages', type=int, default=750, help='number of pages to parse (recorded pages repeat)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--parser', default='auto', choices=['auto', 'selectolax', 'lxml', 'html.parser'])
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        recorded = list(PageCache(args.cache_dir).replay(args.snapshot, raw=True))
+    elif args.pages_dir:
+        recorded = [html.encode('utf-8') for html in load_recorded_pages(args.pages_dir)]
+    else:
+        parser.error('one of --pages-dir or --snapshot is required')
+    pages = list(itertools.islice(itertools.cycle(recorded), args.pages))
+    print('%d pages (%.1f MB), %s parser, %d cores available'
+          % (len(pages), sum(map(len, pages)) / 1e6, get_backend(args.parser).name, os.cpu_count()))
+
+    start = time.perf_counter()
+    expected = list(iter_page_listings(pages, get_backend(args.parser)))
+    base_secs = time.perf_counter() - start
+    print('%-16s %7.2fs  %8.1f pages/sec' % ('in process', base_secs, len(pages) / base_secs))
+
+    for workers in args.workers:
+        with ParsePool(workers, backend=args.parser) as pool:
+            start = time.perf_counter()
+            results = list(pool.iter_page_listings(pages))
+            secs = time.perf_counter() - start
+        if results != expected:
+            raise SystemExit('%d workers did not give the same listings as parsing in process' % workers)
+        print('%-16s %7.2fs  %8.1f pages/sec  %5.2fx' % ('%d workers' % workers, secs, len(pages) / secs,
+                                                         base_secs / secs))
+
+
+if __name__ == '__main__':
+    main()
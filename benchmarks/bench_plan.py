@@ -0,0 +1,118 @@
+################################################################################################################
+# Benchmark - requests made and properties found by the fixed offset range vs the CrawlPlanner
+################################################################################################################
+
+# A synthetic site stands in for Daft.ie: --listings properties made from the bundled daft_df.csv (the county and
+# price of each row), searchable by location and price band, with the result count on each page and a largest
+# page size of --max-page-size. The original range(0, 15000, 20) crawl and a planned crawl are both run over it for
+# each number of listings, and the requests each makes and the properties each finds are compared. The site also
+# answers UNPRICED_PARAM searches, so a plan with the counties split into price bands (unpriced_search=True) is
+# run as well.
+#   python benchmarks/bench_plan.py --listings 8000 13000 18000
+
+import argparse
+import collections
+import os
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_extract import extract_page  # noqa: E402
+from daft_fetch import search_urls  # noqa: E402
+from daft_parse import get_backend  # noqa: E402
+from daft_plan import LOCATIONS, NATIONAL, SEARCH_URL, UNPRICED_PARAM, CrawlPlanner  # noqa: E402
+
+CARD = ('<li data-testid="result-{id}"><a href="/for-sale/property-{id}/{id}">'
+        '<span class="TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc">{price}</span>'
+        '<p class="TitleBlock__Address-sc-1avkvav-7 knPImU">{address}</p>'
+        '<div class="TitleBlock__CardInfo-sc-1avkvav-9 QvaxK"><p>3 Bed</p><p>Semi-D</p></div></a></li>')
+
+
+class SyntheticSite:
+    """The search pages of a synthetic Daft.ie, answered without any network."""
+
+    def __init__(self, n_listings, max_page_size=50, seed=0):
+        rows = pd.read_csv(os.path.join(REPO_DIR, 'daft_df.csv'), keep_default_na=False)
+        rows = rows.sample(n=n_listings, replace=True, random_state=seed).reset_index(drop=True)
+        county = rows['county'].str.strip()
+        location = county.str.replace('Co. ', '', regex=False).str.lower().str.replace(r'^dublin.*', 'dublin',
+                                                                                        regex=True)
+        # Every property on the site is in a county, those we could not place go to Dublin
+        self.listings = pd.DataFrame({
+            'id': range(1000000, 1000000 + n_listings),
+            'location': location.where(location.isin(LOCATIONS), 'dublin'),
+            'price_eur': pd.to_numeric(rows['price_n'], errors='coerce').where(lambda p: p > 0),
+            'price': rows['price'],
+            'address': rows['address'],
+        })
+        self.max_page_size = max_page_size
+        self.requests = 0
+        # The number of times each url was requested
+        self.fetched = collections.Counter()
+
+    def page(self, url):
+        self.requests += 1
+        self.fetched[url] += 1
+        parts = urlsplit(url)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        unpriced = query.pop(UNPRICED_PARAM, None) == 'true'
+        query = {k: int(v) for k, v in query.items()}
+        location = parts.path.rstrip('/').rsplit('/', 1)[-1]
+        found = self.listings
+        if location != NATIONAL:
+            found = found.loc[found['location'] == location]
+        if 'salePrice_from' in query:
+            found = found.loc[found['price_eur'] >= query['salePrice_from']]
+        if 'salePrice_to' in query:
+            found = found.loc[found['price_eur'] <= query['salePrice_to']]
+        if unpriced:
+            found = found.loc[found['price_eur'].isna()]
+        page_size = min(query.get('pageSize', 20), self.max_page_size)
+        offset = query.get('from', 0)
+        cards = ''.join(CARD.format(**row) for row in found.iloc[offset:offset + page_size].to_dict('records'))
+        return ('<html><head><script>{"paging":{"totalResults":%d,"pageSize":%d}}</script></head><body>'
+                '<h1 data-testid="search-h1">%s Properties for Sale</h1><ul>%s</ul></body></html>'
+                % (len(found), page_size, format(len(found), ','), cards))
+
+    def iter_pages(self, urls):
+        for url in urls:
+            yield self.page(url)
+
+
+def found_ids(pages, backend):
+    return {listing.listing_id for html in pages for listing in extract_page(html, backend)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listings', type=int, nargs='+', default=[8000, 13000, 18000])
+    parser.add_argument('--max-page-size', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    backend = get_backend()
+    print('%-9s %-22s %9s %9s %8s' % ('listings', 'crawl', 'requests', 'found', 'missed'))
+    for n_listings in args.listings:
+        site = SyntheticSite(n_listings, args.max_page_size)
+        expected = {'result-%d' % i for i in site.listings['id']}
+
+        ids = found_ids(site.iter_pages(search_urls(0, 15000, 20, base_url=SEARCH_URL + NATIONAL)), backend)
+        print('%-9d %-22s %9d %9d %8d' % (n_listings, 'range(0, 15000, 20)', site.requests, len(ids),
+                                          len(expected - ids)))
+
+        for name, unpriced_search in [('CrawlPlanner', False), ('CrawlPlanner banded', True)]:
+            site.requests = 0
+            plan = CrawlPlanner(site, backend, unpriced_search=unpriced_search).plan()
+            ids = set()
+            for shard, pages in plan.iter_shards(site):
+                ids |= found_ids(pages, backend)
+            print('%-9d %-22s %9d %9d %8d   %d shards, pageSize=%d, %d probes'
+                  % (n_listings, name, site.requests, len(ids), len(expected - ids), len(plan.shards),
+                     plan.page_size, plan.probes))
+
+
+if __name__ == '__main__':
+    main()
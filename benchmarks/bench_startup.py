@@ -0,0 +1,108 @@
+################################################################################################################
+# Benchmark - cold start and per run overhead: the module level script vs the daft-scrape CLI and daemon
+################################################################################################################
+
+# A snapshot of a SyntheticCorpus (see synthetic_corpus.py) is recorded into a page cache in a temporary
+# directory and replayed (no network) by:
+#   script         - python Daft_webscrape_script.py --replay, a fresh process per run as a cron job would
+#   cli replay     - python daft_scrape.py replay, a fresh process per run
+#   resident       - Scraper.run('replay') again and again in one process, as the daemon runs
+# The cold start of each entry point (python -c pass, daft_scrape.py --help and status, which import no heavy
+# packages, and importing daft_pipeline, which imports them all) is timed as well. The per run overhead is the
+# time of a run in a fresh process less the time of a run in the resident Scraper. Against the live site the
+# resident Scraper also saves the TLS handshakes, which a replay does not show.
+#   python benchmarks/bench_startup.py --listings 2000 --runs 5
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_cache import PageCache  # noqa: E402
+from daft_fetch import search_urls  # noqa: E402
+from synthetic_corpus import SyntheticCorpus  # noqa: E402
+
+SNAPSHOT = '20210301T090000'
+
+
+def timed_process(cmd, cwd, runs):
+    """The median wall time of running cmd runs times, each in a fresh process."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listings', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help='parse worker processes (1 parses in process)')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        corpus = SyntheticCorpus(args.listings)
+        cache = PageCache(os.path.join(work_dir, 'page_cache'))
+        urls = search_urls(0, corpus.n_pages * corpus.page_size, corpus.page_size)
+        for _ in cache.record(SNAPSHOT, urls, corpus.iter_pages()):
+            pass
+
+        python = sys.executable
+        cli = os.path.join(REPO_DIR, 'daft_scrape.py')
+        script = os.path.join(REPO_DIR, 'Daft_webscrape_script.py')
+        dirs = ['--cache-dir', 'page_cache', '--workers', str(args.workers)]
+        print('%d listings in %d cached pages, median of %d runs' % (args.listings, corpus.n_pages, args.runs))
+
+        print('cold start')
+        for name, cmd in [('python -c pass', [python, '-c', 'pass']),
+                          ('daft_scrape.py --help', [python, cli, '--help']),
+                          ('daft_scrape.py status', [python, cli, 'status'] + dirs[:2]),
+                          ('import daft_pipeline', [python, '-c', 'import sys; sys.path.insert(0, %r); '
+                                                                  'import daft_pipeline' % REPO_DIR])]:
+            print('  %-32s %8.3fs' % (name, timed_process(cmd, work_dir, args.runs)))
+
+        print('one replay run')
+        script_secs = timed_process([python, script, '--replay', SNAPSHOT] + dirs, work_dir, args.runs)
+        cli_secs = timed_process([python, cli, 'replay', SNAPSHOT] + dirs, work_dir, args.runs)
+
+        # The resident Scraper: the first run pays for the imports and warm up (pandas and numpy are already
+        # imported here by the corpus), the following ones do not
+        start = time.perf_counter()
+        from daft_pipeline import Scraper
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            with Scraper(cache_dir='page_cache', workers=args.workers) as scraper:
+                scraper.run('replay', snapshot=SNAPSHOT)
+                first_secs = time.perf_counter() - start
+                times = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    scraper.run('replay', snapshot=SNAPSHOT)
+                    times.append(time.perf_counter() - start)
+        finally:
+            os.chdir(cwd)
+        resident_secs = statistics.median(times)
+
+        print('  %-32s %8.3fs  overhead %.3fs/run' % ('script (fresh process)', script_secs,
+                                                       script_secs - resident_secs))
+        print('  %-32s %8.3fs  overhead %.3fs/run'
+              % ('cli replay (fresh process)', cli_secs, cli_secs - resident_secs))
+        print('  %-32s %8.3fs' % ('resident Scraper, first run', first_secs))
+        print('  %-32s %8.3fs' % ('resident Scraper, warm run', resident_secs))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
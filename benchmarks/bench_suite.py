@@ -0,0 +1,264 @@
+################################################################################################################
+# Benchmark suite - throughput, latency percentiles and memory of each stage, with a regression check
+################################################################################################################
+
+# Every stage of the scrape is run over a SyntheticCorpus (see synthetic_corpus.py) of each size in --listings:
+#   fetch      - the pages served by the local StandinServer, fetched with the PageFetcher (per page)
+#   parse      - backend.parse of each page, its listing cards found and the tree released (per page)
+#   extract    - reading the Listings out of the cards of each parsed page, the parse not included (per page)
+#   normalize  - the Section 2/3 DataFrames of all of the Listings through normalize_listings (per run)
+#   aggregate  - ingesting the normalized rows into a PriceIndex (per run)
+#   query      - PriceIndex.trend of each county over 6 ingested snapshots (per query)
+# Each stage runs in a fresh Python process (the corpus is generated before the clock starts) so that the peak
+# resident set size of one stage does not hide another. The memory reported is the growth of the peak RSS over
+# the peak after the stage's setup (0 when the stage never needs more than its setup did). Stages are run
+# --repeat times, the throughput is that of the fastest run and the latency percentiles are of every item (page,
+# run or query) of every run.
+#   python benchmarks/bench_suite.py --listings 20 2000 20000 --save baseline.json
+#   python benchmarks/bench_suite.py --listings 20 2000 20000 --compare baseline.json --threshold 0.15
+# With --compare the suite exits with an error if any stage is more than --threshold slower (throughput or p50)
+# or uses more than --threshold more memory than in the baseline, e.g. as a check before each release.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_aggregates import PriceIndex  # noqa: E402
+from daft_extract import extract_card, extract_page  # noqa: E402
+from daft_fetch import PageFetcher, search_urls  # noqa: E402
+from daft_metrics import peak_memory_bytes  # noqa: E402
+from daft_normalize import normalize_listings  # noqa: E402
+from daft_parse import get_backend, get_selectors  # noqa: E402
+from daft_pipeline import listing_frames  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from synthetic_corpus import SyntheticCorpus  # noqa: E402
+
+STAGES = ['fetch', 'parse', 'extract', 'normalize', 'aggregate', 'query']
+
+# Memory growth below this is noise (allocator arenas etc.) and is not counted as a regression
+MEMORY_SLACK_MB = 8.0
+
+
+def listings_frames(listings):
+    """The normalized Section 2 ("normal") and Section 3 ("special") DataFrames, as the script builds them."""
+    return pd.concat([normalize_listings(df) for df in listing_frames(listings)], ignore_index=True)
+
+
+# Each stage is setup(corpus, args) -> state, which is not timed, and run(state) -> (items, [seconds per item])
+# for one timed run
+
+def setup_fetch(corpus, args):
+    # The pages are rendered up front so the server's cost per request is only the send
+    server = StandinServer([page for page in corpus.iter_pages()], latency=args.latency).start()
+    urls = search_urls(0, corpus.n_pages * corpus.page_size, corpus.page_size, base_url=server.base_url)
+    return server, urls
+
+
+def run_fetch(state):
+    server, urls = state
+    fetcher = PageFetcher(max_workers=8, per_host=8)
+    times = []
+    last = time.perf_counter()
+    # The latency of a page is the time the caller waits for it, with 8 requests in flight
+    for _ in fetcher.iter_pages(urls):
+        now = time.perf_counter()
+        times.append(now - last)
+        last = now
+    fetcher.close()
+    return len(times), times
+
+
+def setup_pages(corpus, args):
+    return corpus.pages(), get_backend(args.parser)
+
+
+def run_parse(state):
+    pages, backend = state
+    times = []
+    for html in pages:
+        start = time.perf_counter()
+        root = backend.parse(html)
+        backend.cards(root)
+        backend.release(root)
+        times.append(time.perf_counter() - start)
+    return len(pages), times
+
+
+def run_extract(state):
+    pages, backend = state
+    sel = get_selectors()
+    times = []
+    for html in pages:
+        root = backend.parse(html)
+        start = time.perf_counter()
+        for card in backend.cards(root):
+            extract_card(backend, card, sel)
+        times.append(time.perf_counter() - start)
+        backend.release(root)
+    return len(pages), times
+
+
+def setup_listings(corpus, args):
+    backend = get_backend(args.parser)
+    return [ad for html in corpus.iter_pages() for ad in extract_page(html, backend)]
+
+
+def run_normalize(listings):
+    start = time.perf_counter()
+    df = listings_frames(listings)
+    return len(df), [time.perf_counter() - start]
+
+
+def setup_aggregate(corpus, args):
+    return listings_frames(setup_listings(corpus, args)), tempfile.mkdtemp(prefix='bench_suite_')
+
+
+def run_aggregate(state):
+    df, work_dir = state
+    index = PriceIndex(os.path.join(work_dir, 'price_index'))
+    start = time.perf_counter()
+    index.ingest(df, '20210301T090000')
+    secs = time.perf_counter() - start
+    shutil.rmtree(os.path.join(work_dir, 'price_index'))
+    return len(df), [secs]
+
+
+def setup_query(corpus, args):
+    df, work_dir = setup_aggregate(corpus, args)
+    index = PriceIndex(os.path.join(work_dir, 'price_index'))
+    for day in range(1, 19, 3):
+        index.ingest(df, '202103%02dT090000' % day)
+    counties = sorted(c for c in df['county'].dropna().unique() if c)
+    return index, counties
+
+
+def run_query(state):
+    index, counties = state
+    times = []
+    for county in counties:
+        start = time.perf_counter()
+        index.trend(county, bed=3, months=3)
+        times.append(time.perf_counter() - start)
+    return len(counties), times
+
+
+STAGE_FUNCTIONS = {
+    'fetch': (setup_fetch, run_fetch),
+    'parse': (setup_pages, run_parse),
+    'extract': (setup_pages, run_extract),
+    'normalize': (setup_listings, run_normalize),
+    'aggregate': (setup_aggregate, run_aggregate),
+    'query': (setup_query, run_query),
+}
+
+
+def run_stage(stage, args):
+    """Run one stage in this process, returns its result record."""
+    corpus = SyntheticCorpus(args.listings[0], special_share=args.special_share, seed=args.seed)
+    setup, run = STAGE_FUNCTIONS[stage]
+    state = setup(corpus, args)
+    base_peak = peak_memory_bytes()
+
+    best = None
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        items, item_times = run(state)
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+        times.extend(item_times)
+
+    if stage == 'fetch':
+        state[0].stop()
+    elif stage == 'aggregate':
+        shutil.rmtree(state[1])
+    elif stage == 'query':
+        shutil.rmtree(os.path.dirname(state[0].root))
+    p50, p90, p99 = np.percentile(np.array(times) * 1000, [50, 90, 99])
+    return {'listings': corpus.n_listings, 'stage': stage, 'items': items, 'seconds': best,
+            'items_per_s': items / best if best > 0 else 0.0,
+            'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99,
+            'memory_mb': (peak_memory_bytes() - base_peak) / 2 ** 20}
+
+
+def run_in_subprocess(stage, n_listings, args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--stage', stage, '--listings', str(n_listings),
+           '--repeat', str(args.repeat), '--special-share', str(args.special_share), '--seed', str(args.seed),
+           '--parser', args.parser, '--latency', str(args.latency)]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """The list of regressions of results against baseline (both lists of result records)."""
+    previous = {(r['listings'], r['stage']): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get((r['listings'], r['stage']))
+        if old is None:
+            continue
+        name = '%s at %d listings' % (r['stage'], r['listings'])
+        if r['items_per_s'] < old['items_per_s'] * (1 - threshold):
+            regressions.append('%s: throughput %.1f/s, was %.1f/s' % (name, r['items_per_s'], old['items_per_s']))
+        if r['p50_ms'] > old['p50_ms'] * (1 + threshold):
+            regressions.append('%s: p50 %.3f ms, was %.3f ms' % (name, r['p50_ms'], old['p50_ms']))
+        if r['memory_mb'] > max(old['memory_mb'] * (1 + threshold), old['memory_mb'] + MEMORY_SLACK_MB):
+            regressions.append('%s: memory %.1f MB, was %.1f MB' % (name, r['memory_mb'], old['memory_mb']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listings', type=int, nargs='+', default=[20, 2000, 20000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--special-share', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--parser', default='auto', choices=['auto', 'selectolax', 'lxml', 'html.parser'])
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of latency the stand-in server adds')
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH (e.g. as the next baseline)')
+    parser.add_argument('--compare', metavar='PATH', help='a baseline written with --save to check against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='the slow down counted as a regression')
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, args)))
+        return
+
+    print('%-9s %-10s %8s %12s %10s %10s %10s %10s' % ('listings', 'stage', 'items', 'items/s', 'p50 ms', 'p90 ms',
+                                                       'p99 ms', 'memory MB'))
+    results = []
+    for n_listings in args.listings:
+        for stage in args.stages:
+            r = run_in_subprocess(stage, n_listings, args)
+            results.append(r)
+            print('%-9d %-10s %8d %12.1f %10.3f %10.3f %10.3f %10.1f'
+                  % (r['listings'], r['stage'], r['items'], r['items_per_s'], r['p50_ms'], r['p90_ms'],
+                     r['p99_ms'], r['memory_mb']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            raise SystemExit('%d regressions against %s:\n  %s' % (len(regressions), args.compare,
+                                                                   '\n  '.join(regressions)))
+        print('no regressions against %s (threshold %.0f%%)' % (args.compare, 100 * args.threshold))
+
+
+if __name__ == '__main__':
+    main()
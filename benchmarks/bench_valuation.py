@@ -0,0 +1,101 @@
+################################################################################################################
+# Benchmark - valuing a book of properties with the blocked ValuationIndex vs brute force over every listing
+################################################################################################################
+
+# The listings are the properties of the bundled daft_df.csv and the book is a sample of them (with replacement)
+# with their areas moved by up to +/-10%. Brute force compares each book property with all 15,000 listings (and
+# throws away those in other counties), it is only run over the first --brute-rows of the book.
+#   python benchmarks/bench_valuation.py --book 50000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from daft_normalize import normalize_listings  # noqa: E402
+from daft_valuation import ValuationIndex, _features, _text, distances  # noqa: E402
+
+
+def load_listings():
+    rows = pd.read_csv(os.path.join(REPO_DIR, 'daft_df.csv'), keep_default_na=False)
+    return normalize_listings(pd.DataFrame({
+        'listing_id': np.arange(len(rows)).astype(str),
+        'address': rows['address'],
+        'price': rows['price'],
+        'bba': rows['bed'] + '·' + rows['bath'] + '·' + rows['area'] + '·' + rows['prop_type'],
+    }))
+
+
+def synthetic_book(listings, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    book = listings.sample(n=n_rows, replace=True, random_state=seed).reset_index(drop=True)
+    book['area_m2'] = book['area_m2'] * rng.uniform(0.9, 1.1, n_rows)
+    return book
+
+
+def brute_force(index, book, k):
+    """The median price of the k nearest listings in the same county, comparing with every listing."""
+    listings = index.listings
+    counties = _text(listings['county'])
+    types = index.prop_types.get_indexer(_text(listings['prop_type']))
+    features = _features(listings)
+    prices = listings['price_eur'].astype('float64').to_numpy()
+    book_counties = _text(book['county'])
+    book_types = index.prop_types.get_indexer(_text(book['prop_type']))
+    book_features = _features(book)
+    estimates = np.full(len(book), np.nan)
+    for start in range(0, len(book), 256):
+        part = slice(start, start + 256)
+        d2 = distances(book_features[part], book_types[part], features, types)
+        d2[book_counties[part, None] != counties[None, :]] = np.inf
+        d2[:, counties == ''] = np.inf
+        nearest = np.argsort(d2, axis=1, kind='stable')[:, :k]
+        found = np.take_along_axis(d2, nearest, axis=1)
+        found_prices = np.where(np.isfinite(found), prices[nearest], np.nan)
+        has_any = np.isfinite(found).any(axis=1)
+        estimates[part][has_any] = np.nanmedian(found_prices[has_any], axis=1)
+    return estimates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--book', type=int, default=50000)
+    parser.add_argument('--brute-rows', type=int, default=2000)
+    parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    listings = load_listings()
+    book = synthetic_book(listings, args.book)
+
+    start = time.perf_counter()
+    index = ValuationIndex(listings, k=args.k)
+    build_secs = time.perf_counter() - start
+    print('%d listings in %d county blocks, index built in %.1f ms'
+          % (len(index.listings), len(index.blocks), 1000 * build_secs))
+
+    start = time.perf_counter()
+    estimates, comparables = index.value(book)
+    secs = time.perf_counter() - start
+    print('%-12s %7.2fs  %10.0f properties/sec  (%d properties, %d comparables)'
+          % ('blocked', secs, args.book / secs, args.book, len(comparables)))
+
+    subset = book.iloc[:args.brute_rows]
+    start = time.perf_counter()
+    brute = brute_force(index, subset, args.k)
+    secs = time.perf_counter() - start
+    print('%-12s %7.2fs  %10.0f properties/sec  (%d properties)'
+          % ('brute force', secs, len(subset) / secs, len(subset)))
+
+    blocked = estimates['estimate'].to_numpy()[:args.brute_rows]
+    same = np.isclose(blocked, brute, equal_nan=True).mean()
+    print('estimates equal to brute force: %.1f%%' % (100 * same))
+
+
+if __name__ == '__main__':
+    main()
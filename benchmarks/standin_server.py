@@ -0,0 +1,124 @@
+################################################################################################################
+# Stand-in server - a local HTTP server which serves recorded Daft.ie search pages
+################################################################################################################
+
+# We do not want to hit the live site every time we compare two versions of the scraper.
+# This server answers '/property-for-sale/ireland?pageSize=20&from=N' style requests from a list of recorded
+# pages (page N // pageSize of the list) and can add an artificial latency to each response so that the
+# network-bound behaviour of the fetcher is still visible when running against localhost.
+# Given a site instead (an object with a page(url) method, e.g. the SyntheticSite of bench_plan.py) every request
+# is answered by site.page, so searches by location and price band can be served too.
+# errors makes chosen pages fail first ({page number: [503, 503]} answers the first two requests for that page
+# with a 503 before serving it), and the most requests ever in flight at once is recorded, for testing the
+# fetcher's retries and per-host limit.
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PLACEHOLDER_PAGE = '<html><body><ul data-testid="results"></ul></body></html>'
+
+
+def load_recorded_pages(pages_dir):
+    """Read every .html file in pages_dir (sorted by file name) into a list of page texts."""
+    pages = []
+    for name in sorted(os.listdir(pages_dir)):
+        if name.endswith('.html'):
+            with open(os.path.join(pages_dir, name), encoding='utf-8') as f:
+                pages.append(f.read())
+    return pages
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+
+class StandinServer:
+    """
+    Serve the recorded pages on 127.0.0.1 from a background thread.
+
+    with StandinServer(pages, latency=0.05) as server:
+        urls = search_urls(0, 200, 20, base_url=server.base_url)
+    with StandinServer(site=SyntheticSite(5000)) as server:
+        plan = CrawlPlanner(PageFetcher(), base_url=server.search_url).plan()
+    """
+
+    def __init__(self, pages=None, latency=0.0, port=0, site=None, errors=None):
+        self.pages = pages or [PLACEHOLDER_PAGE]
+        self.site = site
+        self.latency = latency
+        self.errors = {page_no: list(statuses) for page_no, statuses in (errors or {}).items()}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so that the client can keep its pooled connections alive between requests
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status = 200
+                if server.site is not None:
+                    body = server.site.page(self.path).encode('utf-8')
+                else:
+                    query = parse_qs(urlsplit(self.path).query)
+                    page_size = int(query.get('pageSize', ['20'])[0])
+                    offset = int(query.get('from', ['0'])[0])
+                    body = server.page_for(offset // page_size).encode('utf-8')
+                    with server._lock:
+                        if server.errors.get(offset // page_size):
+                            status = server.errors[offset // page_size].pop(0)
+                            body = b''
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.in_flight -= 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = _Server(('127.0.0.1', port), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def page_for(self, page_no):
+        # Cycle through the recorded pages if more pages are requested than were recorded
+        return self.pages[page_no % len(self.pages)]
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d/property-for-sale/ireland' % (host, port)
+
+    @property
+    def search_url(self):
+        """The base_url of daft_plan.search_url (a location is appended to it)."""
+        return self.base_url[:-len('ireland')]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,165 @@
+################################################################################################################
+# Synthetic corpus - Daft.ie-like search result pages generated from the bundled daft_df.csv
+################################################################################################################
+
+# The benchmarks need search pages to parse, but recorded pages cannot be shipped with the repo and the live site
+# should not be hit every time two versions of the scraper are compared. SyntheticCorpus makes any number of
+# listings (20 to 100k and beyond) by sampling the address, bed, bath, area, property type and price of the
+# properties in daft_df.csv, so the mix of counties, missing areas, "Price on Application" etc. follows the shape
+# of a real scrape. The pages use the same TitleBlock__* and SubUnit__* markup (SELECTOR_VERSIONS['2021-03'] in
+# daft_parse.py) as the site: special_share of the ads are "special" (multiple property) ads with 2 to 6 sub
+# units, each page starts with an embedded search data script holding the result count and the page's listings,
+# as the real pages do. The same seed always gives the same pages.
+#   corpus = SyntheticCorpus(20000, special_share=0.05)
+#   for html in corpus.iter_pages(): ...
+#   corpus[3]                                    # the html of page 3, a corpus is a sequence of pages
+#   python benchmarks/synthetic_corpus.py --listings 100000 --out recorded_pages   (for --pages-dir)
+
+import argparse
+import html
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGENTS = ['Sherry FitzGerald', 'DNG', 'REA', 'Savills', 'Lisney', 'Hooke & MacDonald', 'Murphy Mulhall',
+          'Quillsen', 'Property Partners', 'Private Seller']
+
+PAGE_TEMPLATE = ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title}</title>'
+                 '<script id="__NEXT_DATA__" type="application/json">{data}</script></head><body>'
+                 '<nav class="Header__Nav"><a href="/">Daft.ie</a><a href="/property-for-sale/ireland">Buy</a>'
+                 '<a href="/property-for-rent/ireland">Rent</a></nav><main>'
+                 '<h1 data-testid="search-h1">{count} Properties for Sale in Ireland</h1>'
+                 '<ul data-testid="results">{cards}</ul></main></body></html>')
+
+NORMAL_CARD = ('<li data-testid="result-{id}"><a href="{href}"><div class="Card">'
+               '<div class="TitleBlock__Price"><span class="TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc">{price}'
+               '</span></div><p data-testid="address" class="TitleBlock__Address-sc-1avkvav-7 knPImU">{address}</p>'
+               '<div class="TitleBlock__CardInfo-sc-1avkvav-9 QvaxK">{info}</div></div></a></li>')
+INFO_ITEM = '<p class="TitleBlock__CardInfoItem-sc-1avkvav-8 bcaKbv">{}</p>'
+
+SPECIAL_CARD = ('<li data-testid="result-{id}"><a href="{href}">'
+                '<div class="TitleBlock__Price"><span class="TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc">{price}'
+                '</span></div><p data-testid="address" class="TitleBlock__Address-sc-1avkvav-7 eARcqq">{address}</p>'
+                '<div class="TitleBlock__CardInfo-sc-1avkvav-9 QvaxK"></div></a><ul>{units}</ul></li>')
+SUB_UNIT = ('<li data-testid="sub-unit-{n}"><a href="{href}"><p class="SubUnit__Title-sc-10x486s-5 keXaVZ">{price}'
+            '</p><div class="SubUnit__CardInfoItem-sc-10x486s-7 AsGHw">{info}</div></a></li>')
+
+
+def _slug(text):
+    return '-'.join(''.join(c if c.isalnum() else ' ' for c in text.lower()).split())
+
+
+class SyntheticCorpus:
+    """
+    n_listings ads (cards) of search results, page_size to a page, made from the properties of daft_df.csv.
+    A "special" ad counts as one listing whatever its number of sub units.
+    """
+
+    def __init__(self, n_listings, page_size=20, special_share=0.05, seed=0, source=None):
+        self.n_listings = n_listings
+        self.page_size = page_size
+        rng = np.random.default_rng(seed)
+        sample = pd.read_csv(source or os.path.join(REPO_DIR, 'daft_df.csv'), keep_default_na=False)
+        self.special = rng.random(n_listings) < special_share
+        self.n_units = np.where(self.special, rng.integers(2, 7, n_listings), 0)
+        # One row of daft_df.csv for each normal ad and for each sub unit of a special ad
+        n_rows = int(np.count_nonzero(~self.special) + self.n_units.sum())
+        rows = sample.sample(n=n_rows, replace=True, random_state=seed).reset_index(drop=True)
+        self.rows = {col: rows[col].str.strip().tolist() for col in ['address', 'bed', 'bath', 'prop_type', 'area',
+                                                                     'price']}
+        self.agents = rng.integers(0, len(AGENTS), n_rows)
+        self.first_row = np.r_[0, np.cumsum(np.where(self.special, self.n_units, 1))[:-1]]
+
+    @property
+    def n_properties(self):
+        """The number of properties the listings hold (each sub unit of a special ad is one property)."""
+        return int(np.count_nonzero(~self.special) + self.n_units.sum())
+
+    @property
+    def n_pages(self):
+        return -(-self.n_listings // self.page_size)
+
+    def __len__(self):
+        return self.n_pages
+
+    def __getitem__(self, page_no):
+        if not 0 <= page_no < self.n_pages:
+            raise IndexError(page_no)
+        return self.page(page_no)
+
+    def _card(self, i):
+        row = int(self.first_row[i])
+        listing_id = 1000000 + i
+        if not self.special[i]:
+            address = self.rows['address'][row]
+            info = [self.rows[col][row] for col in ['bed', 'bath', 'area', 'prop_type']] + [AGENTS[self.agents[row]]]
+            return NORMAL_CARD.format(
+                id=listing_id, href='/for-sale/%s/%d' % (_slug(address)[:60], listing_id),
+                price=html.escape(self.rows['price'][row]), address=html.escape(address),
+                info=''.join(INFO_ITEM.format(html.escape(item)) for item in info if item))
+
+        # A development: its name and the town of its first sub unit's address
+        town = self.rows['address'][row].split(',', 1)[-1].strip()
+        address = 'The %s, %s' % (['Meadows', 'Orchard', 'Paddocks', 'Grove', 'Park'][i % 5], town)
+        units = []
+        for n in range(int(self.n_units[i])):
+            info = ' · '.join(self.rows[col][row + n] for col in ['bed', 'bath', 'prop_type']
+                              if self.rows[col][row + n])
+            units.append(SUB_UNIT.format(n=n, href='/for-sale/unit-%d/%d%02d' % (n, listing_id, n),
+                                         price=html.escape(self.rows['price'][row + n]), info=html.escape(info)))
+        return SPECIAL_CARD.format(id=listing_id, href='/new-homes-for-sale/%s/%d' % (_slug(address), listing_id),
+                                   price='From ' + html.escape(self.rows['price'][row]),
+                                   address=html.escape(address), units=''.join(units))
+
+    def page(self, page_no):
+        """The html of one search page (page_no counts from 0)."""
+        first = page_no * self.page_size
+        ids = range(first, min(first + self.page_size, self.n_listings))
+        # The embedded search data repeats the listings of the page, as Daft.ie's own pages do
+        data = {'props': {'pageProps': {
+            'paging': {'totalResults': self.n_listings, 'pageSize': self.page_size, 'from': first},
+            'listings': [{'id': 1000000 + i, 'seoFriendlyPath': self.rows['address'][int(self.first_row[i])],
+                          'price': self.rows['price'][int(self.first_row[i])]} for i in ids]}}}
+        return PAGE_TEMPLATE.format(title='Property for Sale in Ireland | Daft.ie',
+                                    data=json.dumps(data).replace('</', '<\\/'),
+                                    count=format(self.n_listings, ','),
+                                    cards=''.join(self._card(i) for i in ids))
+
+    def iter_pages(self):
+        for page_no in range(self.n_pages):
+            yield self.page(page_no)
+
+    def pages(self):
+        return list(self.iter_pages())
+
+    def write(self, pages_dir):
+        """Write each page to pages_dir/page_00000.html etc., as read by load_recorded_pages."""
+        os.makedirs(pages_dir, exist_ok=True)
+        width = max(5, len(str(self.n_pages)))
+        for page_no, page in enumerate(self.iter_pages()):
+            with open(os.path.join(pages_dir, 'page_%0*d.html' % (width, page_no)), 'w', encoding='utf-8') as f:
+                f.write(page)
+        return self.n_pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic corpus of Daft.ie-like search pages')
+    parser.add_argument('--listings', type=int, default=15000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--special-share', type=float, default=0.05, help='share of the ads which are "special"')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='directory to write the pages to')
+    args = parser.parse_args(argv)
+
+    corpus = SyntheticCorpus(args.listings, args.page_size, args.special_share, args.seed)
+    n_pages = corpus.write(args.out)
+    print('%d pages, %d listings, %d properties written to %s'
+          % (n_pages, corpus.n_listings, corpus.n_properties, args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+################################################################################################################
+# Aggregates - an incrementally maintained price index by county, bedrooms, property type and snapshot
+################################################################################################################
+
+# The analysis at the end of the script builds a pivot_table of the mean price by county and bed from the raw
+# rows. Once every snapshot is kept (see daft_store.py) answering "how has the price of 3 bedroom properties in
+# Dublin 6 moved over the last 3 months" that way means re-reading and re-grouping every row of every snapshot,
+# which gets slower with every run.
+# Instead each snapshot is summarised once, when it is ingested, into one cell per
+# (snapshot, county, bed_n, prop_type) holding:
+#   count, sum, sumsq - the number of properties with a euro price, the sum of their prices and of the squared
+#                       prices, from which the mean and standard deviation of any group of cells can be worked out
+#   a quantile sketch - the number of prices falling in each of a set of logarithmic price buckets. Each bucket
+#                       is at most 2 * alpha wide relative to its prices, so a median (or any quantile) read back
+#                       from the buckets is within alpha (1% by default) of the true value. Sketches of different
+#                       cells are merged by adding up the counts of the same buckets.
+# A few thousand cells and buckets per snapshot take the place of the raw rows, so a trend query over months of
+# snapshots is a filter and a groupby over a small table and takes milliseconds.
+#   index = PriceIndex('price_index')
+#   index.update(store)                                   # summarise any snapshots not yet in the index
+#   index.trend('Dublin 6', bed=3, months=3)              # mean/median per snapshot and the change since the first
+#   index.pivot()                                         # mean price by county and bed for the latest snapshot
+
+import datetime
+import glob
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from daft_store import snapshot_date
+
+DEFAULT_INDEX_DIR = 'price_index'
+DEFAULT_ALPHA = 0.01
+
+CELL_KEYS = ['snapshot', 'scrape_date', 'county', 'bed_n', 'prop_type']
+STAT_COLUMNS = ['count', 'sum', 'sumsq']
+
+# The numeric columns of an index with no snapshots in it yet
+EMPTY_DTYPES = {'count': 'int64', 'sum': 'float64', 'sumsq': 'float64', 'bucket': 'int32', 'n': 'int64'}
+
+# The columns the index needs from a snapshot
+SOURCE_COLUMNS = ['county', 'bed_n', 'prop_type', 'price_eur']
+
+
+def _cell_frame(df, snapshot, scrape_date):
+    """The cell keys and euro price of every priced property of one snapshot."""
+    rows = df.loc[df['price_eur'].notna(), ['county', 'bed_n', 'prop_type', 'price_eur']]
+    return pd.DataFrame({
+        'snapshot': snapshot,
+        'scrape_date': scrape_date,
+        'county': rows['county'].astype(object).fillna('').astype(str).to_numpy(),
+        'bed_n': rows['bed_n'].astype('Int16').to_numpy(),
+        'prop_type': rows['prop_type'].astype(object).fillna('').astype(str).to_numpy(),
+        'price': rows['price_eur'].astype('float64').to_numpy(),
+    })
+
+
+def _typed(frame):
+    # The text keys are held as plain Python strings (numpy object arrays), taking a few rows out of those is far
+    # quicker than out of the default arrow backed strings
+    for col in ['snapshot', 'scrape_date', 'county', 'prop_type']:
+        frame[col] = frame[col].astype(object)
+    frame['bed_n'] = frame['bed_n'].astype('Int16')
+    return frame
+
+
+class PriceIndex:
+    """
+    index = PriceIndex('price_index')
+    index.ingest(daft_df, snapshot='20210301T093000')
+    index.trend('Dublin 6', bed=3, months=3)
+    """
+
+    def __init__(self, root=DEFAULT_INDEX_DIR, alpha=DEFAULT_ALPHA):
+        self.root = root
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.cells = self._load('cells', CELL_KEYS + STAT_COLUMNS)
+        self.sketches = self._load('sketches', CELL_KEYS + ['bucket', 'n'])
+        self._positions = {}
+        self._snapshots = set(self.cells['snapshot'])
+
+    def _path(self, kind, snapshot):
+        return os.path.join(self.root, kind, snapshot + '.parquet')
+
+    def _load(self, kind, columns):
+        # One file per snapshot under root/cells and root/sketches, each directory is read in one go
+        if not glob.glob(os.path.join(self.root, kind, '*.parquet')):
+            empty = pd.DataFrame(columns=columns)
+            return _typed(empty.astype({c: t for c, t in EMPTY_DTYPES.items() if c in columns}))
+        return _typed(pd.read_parquet(os.path.join(self.root, kind)))
+
+    def bucket(self, price):
+        """The sketch bucket of each price (prices below 1 euro share the bucket of 1 euro)."""
+        return np.ceil(np.log(np.maximum(price, 1.0)) / self._log_gamma).astype('int32')
+
+    def bucket_value(self, bucket):
+        """The value a bucket stands for, within alpha of every price in the bucket."""
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def snapshots(self):
+        """The snapshot names in the index, oldest first."""
+        return sorted(self._snapshots)
+
+    def ingest(self, df, snapshot, scrape_date=None):
+        """
+        Summarise one snapshot (a normalized daft_df, or the SOURCE_COLUMNS of it) into the index.
+        Ingesting a snapshot which is already in the index replaces it. Returns the number of cells.
+        """
+        rows = _cell_frame(df, snapshot, scrape_date or snapshot_date(snapshot))
+        cells = rows.assign(sumsq=rows['price'] ** 2).groupby(CELL_KEYS, dropna=False, sort=False).agg(
+            count=('price', 'size'), sum=('price', 'sum'), sumsq=('sumsq', 'sum')).reset_index()
+        sketches = rows.assign(bucket=self.bucket(rows['price'].to_numpy())).groupby(
+            CELL_KEYS + ['bucket'], dropna=False, sort=False).size().rename('n').reset_index()
+
+        for kind, frame in [('cells', cells), ('sketches', sketches)]:
+            os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+            frame.to_parquet(self._path(kind, snapshot), index=False)
+        for kind, rows in [('cells', cells), ('sketches', sketches)]:
+            frame = getattr(self, kind)
+            # Drop the rows of the snapshot if it is being replaced, the new rows are otherwise simply appended
+            if snapshot in self._snapshots:
+                frame = frame.loc[frame['snapshot'] != snapshot]
+            rows = _typed(rows)
+            setattr(self, kind, pd.concat([frame, rows], ignore_index=True) if len(frame) else rows)
+        self._positions = {}
+        self._snapshots.add(snapshot)
+        return len(cells)
+
+    def ingested_times(self):
+        """{snapshot: the time (as os.path.getmtime) it was last ingested} of every snapshot in the index."""
+        cells_dir = os.path.join(self.root, 'cells')
+        if not os.path.isdir(cells_dir):
+            return {}
+        return {entry.name[:-len('.parquet')]: entry.stat().st_mtime for entry in os.scandir(cells_dir)
+                if entry.name.endswith('.parquet') and entry.name[:-len('.parquet')] in self._snapshots}
+
+    def update(self, store):
+        """
+        Ingest every snapshot of a SnapshotStore which is not in the index yet, or which was written to the store
+        again since it was ingested (e.g. a --replay after a fix to the parser), returns their names.
+        """
+        # The store's files and the index's files are each listed once, not once per snapshot
+        stored = store.modified_times()
+        ingested = self.ingested_times()
+        missing = [s for s in sorted(stored) if s not in ingested or stored[s] > ingested[s]]
+        for snapshot in missing:
+            df = store.read(columns=SOURCE_COLUMNS + ['scrape_date'], snapshots=[snapshot],
+                            since=snapshot_date(snapshot))
+            scrape_date = df['scrape_date'].iloc[0] if len(df) else None
+            self.ingest(df, snapshot, scrape_date)
+        return missing
+
+    def _lookup(self, kind, column):
+        """{value: row positions} of one column of self.cells or self.sketches (kind), built once per ingest."""
+        if (kind, column) not in self._positions:
+            self._positions[kind, column] = getattr(self, kind).groupby(column, sort=False).indices
+        return self._positions[kind, column]
+
+    def _rows(self, kind, counties, beds, prop_types, since, until, snapshots):
+        """The rows of self.cells or self.sketches (kind) which match every filter given."""
+        frame = getattr(self, kind)
+        # Rather than comparing every row of the index, a county (or a snapshot) is looked up in a mapping of its
+        # row positions and only those rows are filtered
+        for column, values in [('county', counties), ('snapshot', snapshots)]:
+            if values is not None:
+                positions = self._lookup(kind, column)
+                found = [positions[v] for v in values if v in positions]
+                frame = frame.take(np.sort(np.concatenate(found)) if found else [])
+                break
+
+        mask = pd.Series(True, index=frame.index)
+        if snapshots is not None:
+            mask &= frame['snapshot'].isin(list(snapshots))
+        if counties is not None:
+            mask &= frame['county'].isin(list(counties))
+        if beds is not None:
+            mask &= frame['bed_n'].isin(list(beds)).fillna(False)
+        if prop_types is not None:
+            mask &= frame['prop_type'].isin(list(prop_types))
+        if since is not None:
+            mask &= frame['scrape_date'] >= str(since)
+        if until is not None:
+            mask &= frame['scrape_date'] <= str(until)
+        return frame.loc[mask]
+
+    def _quantiles(self, sketches, by, quantiles):
+        """{q: the q quantile of each group} of the merged sketches."""
+        merged = sketches.groupby(by + ['bucket'], dropna=False)['n'].sum()
+        groups = merged.groupby(level=by, dropna=False, sort=False)
+        cumulative = groups.cumsum().to_numpy()
+        total = groups.transform('sum').to_numpy()
+        ids = groups.ngroup().to_numpy()
+        starts = np.r_[True, ids[1:] != ids[:-1]]
+        index = merged.index.droplevel('bucket')
+        buckets = merged.index.get_level_values('bucket').to_numpy().astype('float64')
+        found = {}
+        for q in quantiles:
+            # The first bucket (they are in order within each group) to reach the rank q * (count - 1), counting
+            # from 0, which is the rank pandas' quantile uses with interpolation='lower'
+            reached = cumulative > q * (total - 1)
+            first = reached & (starts | ~np.r_[False, reached[:-1]])
+            found[q] = pd.Series(self.bucket_value(buckets[first]), index=index[first])
+        return found
+
+    def summary(self, by=('snapshot',), counties=None, beds=None, prop_types=None, since=None, until=None,
+                snapshots=None, quantiles=(0.5,)):
+        """
+        The count, mean, std and quantiles (named 'median' for 0.5, 'q<q>' otherwise) of the euro price of the
+        cells which match every filter given (None means no filter), grouped by the cell keys in by.
+        """
+        by = list(by)
+        filters = (counties, beds, prop_types, since, until, snapshots)
+        cells = self._rows('cells', *filters)
+        out = cells.groupby(by, dropna=False)[STAT_COLUMNS].sum().astype('float64')
+        out['count'] = out['count'].astype('int64')
+        out['mean'] = out['sum'] / out['count']
+        variance = (out['sumsq'] - out['sum'] ** 2 / out['count']) / (out['count'] - 1)
+        out['std'] = np.sqrt(variance.clip(lower=0)).where(out['count'] > 1)
+        sketches = self._rows('sketches', *filters)
+        for q, values in self._quantiles(sketches, by, quantiles).items():
+            out['median' if q == 0.5 else 'q%g' % q] = values.reindex(out.index)
+        return out.drop(columns=['sum', 'sumsq'])
+
+    def trend(self, county, bed=None, prop_type=None, months=3, end=None):
+        """
+        The count, mean and median price per snapshot of one county (and bed and property type, if given) over
+        the months up to end (the latest scrape date by default), with the change of the mean and median since
+        the first snapshot as a fraction e.g. 0.05 for a 5% rise.
+        """
+        scrape_dates = self._lookup('cells', 'scrape_date')
+        # An empty index has no latest scrape date, the (empty) trend up to today is returned
+        end = pd.Timestamp(end or (max(scrape_dates) if scrape_dates else datetime.date.today()))
+        since = (end - pd.DateOffset(months=months)).strftime('%Y-%m-%d')
+        out = self.summary(by=['snapshot', 'scrape_date'], counties=[county],
+                           beds=None if bed is None else [bed],
+                           prop_types=None if prop_type is None else [prop_type],
+                           since=since, until=end.strftime('%Y-%m-%d'))
+        out = out.reset_index(level='scrape_date')
+        if len(out):
+            out['mean_change'] = out['mean'] / out['mean'].iloc[0] - 1
+            out['median_change'] = out['median'] / out['median'].iloc[0] - 1
+        return out
+
+    def pivot(self, snapshot=None, index='county', columns='bed_n', stat='mean'):
+        """
+        A county by bed (by default) table of the mean (or 'median', 'count', 'std') price of one snapshot (the
+        latest by default), empty if the index is empty.
+        """
+        snapshots = self.snapshots()
+        if not snapshots:
+            return pd.DataFrame()
+        snapshot = snapshot or snapshots[-1]
+        out = self.summary(by=[index, columns], snapshots=[snapshot], quantiles=(0.5,) if stat == 'median' else ())
+        return out[stat].unstack(columns)
@@ -0,0 +1,163 @@
+################################################################################################################
+# Cache - compressed, content addressed on-disk cache of the raw search pages with an offline replay mode
+################################################################################################################
+
+# Every run of the script used to download every search page again, so re-running after a parsing fix meant a
+# full scrape. The PageCache keeps the raw html of each run (a "snapshot") on disk so that the whole
+# Section 2/3 pipeline can be replayed from the cache with no network at all.
+
+# Layout of the cache directory:
+#   objects/ab/abcdef....html.gz      - gzipped page html, named by the sha256 of the html (content addressed, so a
+#                                       page which has not changed between two snapshots is only stored once)
+#   snapshots/<snapshot>.jsonl        - one line per page in the order it was fetched: {"url", "sha256", "fetched"}
+# A snapshot is named by its scrape timestamp (e.g. 20210301T093000) so a page is keyed by (scrape timestamp, url).
+
+# Eviction: snapshots older than ttl_days are removed, then the oldest snapshots are removed until the objects
+# fit in max_bytes. Objects which are no longer referenced by any snapshot are deleted.
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_CACHE_DIR = 'page_cache'
+
+
+def snapshot_name(when=None):
+    """The snapshot name for a scrape started at when (default now), e.g. 20210301T093000."""
+    return (when or datetime.datetime.now()).strftime('%Y%m%dT%H%M%S')
+
+
+class PageCache:
+    """
+    cache = PageCache('page_cache')
+    snapshot = snapshot_name()
+    pages = cache.record(snapshot, urls, fetcher.iter_pages(urls))   # fetch and store
+    pages = cache.replay(snapshot)                                   # no network
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl_days=30, max_bytes=2 * 1024 ** 3, compresslevel=6):
+        self.cache_dir = cache_dir
+        self.ttl_days = ttl_days
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self._objects_dir = os.path.join(cache_dir, 'objects')
+        self._snapshots_dir = os.path.join(cache_dir, 'snapshots')
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._snapshots_dir, exist_ok=True)
+
+    # Objects -------------------------------------------------------------------------------------------------
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_dir, digest[:2], digest + '.html.gz')
+
+    def _write_object(self, html):
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=self.compresslevel))
+            os.replace(tmp_path, path)
+        return digest
+
+    def _read_object(self, digest, raw=False):
+        with open(self._object_path(digest), 'rb') as f:
+            data = gzip.decompress(f.read())
+        return data if raw else data.decode('utf-8')
+
+    # Snapshots -----------------------------------------------------------------------------------------------
+
+    def _manifest_path(self, snapshot):
+        return os.path.join(self._snapshots_dir, snapshot + '.jsonl')
+
+    def _manifest(self, snapshot):
+        path = self._manifest_path(snapshot)
+        if not os.path.exists(path):
+            raise KeyError('snapshot %r is not in the cache %r' % (snapshot, self.cache_dir))
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def snapshots(self):
+        """The names of every snapshot in the cache, oldest first."""
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(self._snapshots_dir) if name.endswith('.jsonl'))
+
+    def latest_snapshot(self):
+        snapshots = self.snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def put(self, snapshot, url, html):
+        """Store the html fetched from url as part of snapshot."""
+        digest = self._write_object(html)
+        with open(self._manifest_path(snapshot), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'url': url, 'sha256': digest, 'fetched': time.time()}) + '\n')
+
+    def get(self, snapshot, url):
+        """The html stored for url in snapshot, or None if it was not stored."""
+        for entry in self._manifest(snapshot):
+            if entry['url'] == url:
+                return self._read_object(entry['sha256'])
+        return None
+
+    def urls(self, snapshot):
+        return [entry['url'] for entry in self._manifest(snapshot)]
+
+    def record(self, snapshot, urls, pages):
+        """Pass the pages (in the same order as urls) straight through while storing each one in snapshot."""
+        for url, html in zip(urls, pages):
+            self.put(snapshot, url, html)
+            yield html
+
+    def replay(self, snapshot, raw=False):
+        """
+        Yield the html of every page in snapshot in the order it was originally fetched, no network is used.
+        raw=True yields the utf-8 bytes of each page rather than text (e.g. to hand to a ParsePool).
+        """
+        for entry in self._manifest(snapshot):
+            yield self._read_object(entry['sha256'], raw)
+
+    # Eviction ------------------------------------------------------------------------------------------------
+
+    def _remove_snapshot(self, snapshot):
+        os.remove(self._manifest_path(snapshot))
+
+    def _object_sizes(self):
+        sizes = {}
+        for sub_dir in os.listdir(self._objects_dir):
+            for name in os.listdir(os.path.join(self._objects_dir, sub_dir)):
+                if name.endswith('.html.gz'):
+                    sizes[name[:-len('.html.gz')]] = os.path.getsize(os.path.join(self._objects_dir, sub_dir, name))
+        return sizes
+
+    def evict(self, now=None):
+        """Apply the TTL and size cap, returns the list of snapshots which were removed."""
+        now = now or time.time()
+        removed = []
+        for snapshot in self.snapshots():
+            if now - os.path.getmtime(self._manifest_path(snapshot)) > self.ttl_days * 86400:
+                self._remove_snapshot(snapshot)
+                removed.append(snapshot)
+
+        sizes = self._object_sizes()
+        refs = {snapshot: {entry['sha256'] for entry in self._manifest(snapshot)} for snapshot in self.snapshots()}
+
+        def live_bytes():
+            live = set().union(*refs.values()) if refs else set()
+            return sum(sizes[digest] for digest in live if digest in sizes)
+
+        # Never remove the most recent snapshot to get under the size cap
+        while len(refs) > 1 and live_bytes() > self.max_bytes:
+            oldest = min(refs)
+            self._remove_snapshot(oldest)
+            removed.append(oldest)
+            del refs[oldest]
+
+        live = set().union(*refs.values()) if refs else set()
+        for digest in sizes:
+            if digest not in live:
+                os.remove(self._object_path(digest))
+        return removed
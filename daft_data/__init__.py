@@ -0,0 +1,3 @@
+# Data files shipped with the scraper (package data, so they are installed alongside the modules):
+#   towns.csv     - the towns and villages of each county and the areas of each Dublin postal district
+#   gazetteer.csv - the compiled input of the Gazetteer, built from towns.csv (see daft_gazetteer.py)
@@ -0,0 +1,202 @@
+################################################################################################################
+# Extract - streaming, one listing card at a time extraction of the "normal" and "special" ads
+################################################################################################################
+
+# Previously every page was added to one string (req_str = req_str + req_n) and the whole site was parsed into a
+# single BeautifulSoup tree which stayed in memory while all of the findAll calls ran.
+# Here each page is parsed on its own, the text we need is pulled out into small records and the page's html and
+# parsed tree are thrown away before the next page is looked at. Peak memory therefore depends on the size of one
+# page rather than the size of the whole site.
+
+# Every ad on a search page is a listing card (li[data-testid]). Rather than searching the whole page for each
+# field and lining the lists up by position (loc_bs[i], price_span_bs[i] ...) or walking back up the tree with
+# find_parents to work out which ad a price belongs to, we visit each card once and read its fields from inside it.
+# A field can therefore never be paired with the wrong ad, even when a card is missing one of its fields.
+
+# The html is parsed with one of the backends in daft_parse.py (the fastest installed one by default) and the
+# css selectors come from the versioned SELECTOR_VERSIONS mapping in the same module.
+
+# Parsing is CPU bound and on its own runs on one core. A ParsePool spreads the pages over worker processes: the
+# raw html of each page goes to a worker, the worker parses it and sends back only the page's Listing records
+# (tuples of strings), never the parsed tree. The pages come back in the order they went in.
+
+import collections
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from daft_parse import DEFAULT_SELECTOR_VERSION, get_backend, get_selectors
+
+# listing_id - the 'data-testid' of the card e.g. 'result-3028614'
+# href       - the link to the ad e.g. '/for-sale/...'
+# address    - the address of the ad
+# price      - the price text of a "normal" ad ('' for a "special" ad, the prices are on its sub units)
+# bba        - the bed/bath/area/property type text separated by '·' ('' for a "special" ad)
+# special    - True for a "special" or "multiple property" ad
+# sub_units  - one SubUnit for each property of a "special" ad
+Listing = collections.namedtuple('Listing',
+                                 ['listing_id', 'href', 'address', 'price', 'bba', 'special', 'sub_units'])
+SubUnit = collections.namedtuple('SubUnit', ['href', 'price', 'bba'])
+
+
+def _text(backend, node, separator=''):
+    return backend.text(node, separator=separator) if node is not None else ''
+
+
+def _href(backend, node, sel):
+    link = backend.first(node, sel['link'])
+    return (backend.attr(link, 'href') or '') if link is not None else ''
+
+
+def extract_card(backend, card, sel):
+    """Read one listing card into a Listing, or None if the card is not a property ad."""
+    listing_id = backend.attr(card, 'data-testid')
+    href = _href(backend, card, sel)
+
+    # Section 2 - "normal" ads have the price, address and bed/bath/area in the one block
+    address = backend.first(card, sel['address'])
+    if address is not None:
+        return Listing(listing_id, href, _text(backend, address),
+                       _text(backend, backend.first(card, sel['price'])).strip(),
+                       _text(backend, backend.first(card, sel['bed_bath_area']), separator='·'),
+                       False, ())
+
+    # Section 3 - "special" ads have one address and a sub unit (with its own price and bed/bath) per property
+    address = backend.first(card, sel['address_sp'])
+    if address is not None:
+        sub_units = []
+        for unit in backend.select(card, sel['sub_unit']):
+            price = backend.first(unit, sel['price_sp'])
+            if price is None:
+                continue
+            sub_units.append(SubUnit(_href(backend, unit, sel), _text(backend, price).strip(),
+                                     _text(backend, backend.first(unit, sel['bed_bath_area_sp']))))
+        return Listing(listing_id, href, _text(backend, address), '', '', True, tuple(sub_units))
+    return None
+
+
+def extract_page(html, backend=None, selector_version=DEFAULT_SELECTOR_VERSION):
+    """Parse one page of html and return the list of its Listings, the parsed tree is discarded before returning."""
+    backend = backend or get_backend()
+    sel = get_selectors(selector_version)
+    root = backend.parse(html)
+    listings = []
+    for card in backend.cards(root):
+        listing = extract_card(backend, card, sel)
+        if listing is not None:
+            listings.append(listing)
+    backend.release(root)
+    return listings
+
+
+def iter_page_listings(pages, backend=None, selector_version=DEFAULT_SELECTOR_VERSION):
+    """
+    Yield the list of Listings of each page in pages, in page order.
+
+    pages can be any iterable of html text, e.g. PageFetcher.iter_pages(urls), in which case only a handful of
+    pages are ever held in memory at once.
+    """
+    backend = backend or get_backend()
+    for html in pages:
+        yield extract_page(html, backend, selector_version)
+
+
+def iter_listings(pages, backend=None, selector_version=DEFAULT_SELECTOR_VERSION):
+    """Yield every Listing from pages (see iter_page_listings), in page order."""
+    for listings in iter_page_listings(pages, backend, selector_version):
+        for listing in listings:
+            yield listing
+
+
+def collect_listings(pages, backend=None, selector_version=DEFAULT_SELECTOR_VERSION):
+    """Run the stream and return every Listing of the scrape."""
+    return list(iter_listings(pages, backend, selector_version))
+
+
+# The parser backend of a ParsePool worker process, created once by _init_worker when the process starts
+_worker_backend = None
+_worker_selector_version = None
+
+
+def _init_worker(backend_name, selector_version):
+    global _worker_backend, _worker_selector_version
+    _worker_backend = get_backend(backend_name)
+    _worker_selector_version = selector_version
+
+
+def _extract_in_worker(pages):
+    return [extract_page(html, _worker_backend, _worker_selector_version) for html in pages]
+
+
+# Forked workers start straight away and do not re-import the calling script (which spawned workers would do,
+# re-running Daft_webscrape_script.py from the top). Where fork is not available (Windows) the caller's code must
+# be under an if __name__ == '__main__': guard.
+CAN_FORK = 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _default_context():
+    return multiprocessing.get_context('fork' if CAN_FORK else 'spawn')
+
+
+class ParsePool:
+    """
+    Extract the Listings of pages in worker processes.
+
+    with ParsePool(workers=4) as pool:
+        for listings in pool.iter_page_listings(pages):
+            ...
+    """
+
+    def __init__(self, workers=None, backend='auto', selector_version=DEFAULT_SELECTOR_VERSION, chunk_pages=4,
+                 mp_context=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Pages are sent to the workers a few at a time, which halves the cost of passing them back and forth
+        self.chunk_pages = chunk_pages
+        get_backend(backend)  # fail here, rather than in every worker, if the backend is not installed
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context or _default_context(),
+                                             initializer=_init_worker, initargs=(backend, selector_version))
+        # Start the workers now, before the caller starts any threads of its own (e.g. the PageFetcher)
+        list(self._executor.map(_extract_in_worker, [[]]))
+
+    def iter_page_listings(self, pages):
+        """
+        Yield the list of Listings of each page in pages (text or utf-8 bytes), in page order.
+
+        Only a window of workers * 2 chunks of pages is handed out ahead of the page being yielded, so pages are
+        still streamed through and the caller can stop early by closing the generator.
+        """
+        window = self.workers * 2
+        pages = iter(pages)
+        chunks = iter(lambda: list(itertools.islice(pages, self.chunk_pages)), [])
+        pending = collections.deque()
+        try:
+            for chunk in chunks:
+                pending.append(self._executor.submit(_extract_in_worker, chunk))
+                if len(pending) >= window:
+                    break
+            while pending:
+                page_listings = pending.popleft().result()
+                for chunk in chunks:
+                    pending.append(self._executor.submit(_extract_in_worker, chunk))
+                    break
+                for listings in page_listings:
+                    yield listings
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def iter_listings(self, pages):
+        """Yield every Listing from pages (see iter_page_listings), in page order."""
+        for listings in self.iter_page_listings(pages):
+            for listing in listings:
+                yield listing
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
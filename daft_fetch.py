@@ -0,0 +1,198 @@
+################################################################################################################
+# Fetch - concurrent, connection-pooled fetcher for the Daft.ie search result pages
+################################################################################################################
+
+# The original Section 2 loop called requests.get() for each of the ~750 search pages one after the other.
+# Every call opened a brand new connection and waited on it before the next page was requested.
+# The PageFetcher below keeps a bounded number of requests in flight on a thread pool which shares one
+# keep-alive requests.Session, so connections to www.daft.ie are reused rather than re-negotiated per page.
+
+# A few things we want to keep in mind:
+#   * Politeness - we cap the number of requests in flight to any one host and can space out requests to it.
+#   * Retries    - a 429/5xx or a dropped connection is retried with an exponential backoff.
+#   * Ordering   - pages are always handed back in the order of the urls passed in, so the parsing code
+#                  downstream lines up exactly as it did with the serial loop.
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://www.daft.ie/property-for-sale/ireland'
+
+# Status codes which are worth another go (rate limiting and temporary server errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def search_urls(start=0, stop=15000, step=20, base_url=BASE_URL):
+    """Return the paginated search urls ('?pageSize=20&from=N') used by the Section 2 scrape."""
+    return [base_url + '?pageSize=' + str(step) + '&from=' + str(i) for i in range(start, stop, step)]
+
+
+def make_session(pool_size=10, user_agent=None):
+    """Create a requests.Session whose connection pool is large enough for every worker thread."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    return session
+
+
+class FetchStats:
+    """Running totals for a fetch, used to compare the fetcher against the serial loop."""
+
+    def __init__(self):
+        self.pages = 0
+        self.bytes = 0
+        self.retries = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add_page(self, n_bytes):
+        with self._lock:
+            self.pages += 1
+            self.bytes += n_bytes
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return ('FetchStats(pages=%d, bytes=%d, retries=%d, elapsed=%.2fs, pages/sec=%.1f)'
+                % (self.pages, self.bytes, self.retries, self.elapsed, self.pages_per_sec))
+
+
+class _HostLimiter:
+    """Caps the requests in flight to a single host and optionally spaces out their start times."""
+
+    def __init__(self, max_in_flight, min_interval):
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._slots.acquire()
+        if self._min_interval > 0:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._min_interval
+            if start > now:
+                time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+
+class PageFetcher:
+    """
+    Fetch pages concurrently over one pooled session.
+
+    max_workers  - the total number of requests in flight at any one time
+    per_host     - the maximum number of requests in flight to any one host
+    min_interval - the minimum number of seconds between two request starts to the same host
+    retries      - the number of retries after the first attempt (backoff doubles after every attempt)
+    """
+
+    def __init__(self, max_workers=8, per_host=4, min_interval=0.0, retries=3, backoff=0.5, timeout=30,
+                 session=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or make_session(pool_size=max_workers)
+        self.stats = FetchStats()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = _HostLimiter(self.per_host, self.min_interval)
+            return self._hosts[host]
+
+    def _sleep_before_retry(self, attempt, resp=None):
+        self.stats.add_retry()
+        delay = self.backoff * (2 ** attempt)
+        # Respect the server if it tells us how long to wait (only the "seconds" form is handled)
+        if resp is not None and resp.headers.get('Retry-After', '').isdigit():
+            delay = max(delay, float(resp.headers['Retry-After']))
+        time.sleep(delay)
+
+    def fetch(self, url):
+        """Fetch a single url and return its text, retrying connection errors and 429/5xx responses."""
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            try:
+                with self._limiter(url):
+                    resp = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_try:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            if resp.status_code in RETRY_STATUSES and not last_try:
+                self._sleep_before_retry(attempt, resp)
+                continue
+            resp.raise_for_status()
+            self.stats.add_page(len(resp.content))
+            return resp.text
+
+    def iter_pages(self, urls):
+        """
+        Yield the text of each url in the same order as urls.
+
+        Only a window of max_workers * 2 requests is submitted ahead of the page being yielded, so the caller
+        can process (and throw away) pages as they arrive and can stop early by closing the generator.
+        """
+        window = self.max_workers * 2
+        urls = iter(urls)
+        self.stats.started = self.stats.started or time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = collections.deque()
+        try:
+            for url in urls:
+                pending.append(executor.submit(self.fetch, url))
+                if len(pending) >= window:
+                    break
+            while pending:
+                page = pending.popleft().result()
+                for url in urls:
+                    pending.append(executor.submit(self.fetch, url))
+                    break
+                yield page
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.stats.finished = time.perf_counter()
+
+    def fetch_all(self, urls):
+        """Fetch every url and return the list of page texts in the same order as urls."""
+        return list(self.iter_pages(urls))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,310 @@
+################################################################################################################
+# Gazetteer - resolve addresses to a town, county and Dublin postal district in one vectorized pass
+################################################################################################################
+
+# The county used to be the text after the last comma of the address, kept only when it was exactly one of
+# COUNTY_LST. "Co Dublin", "Dublin 6w", "County Cork" or an address ending in its town ("..., Clondalkin") or an
+# Eircode ("..., D01X6P2") were left blank, and the town was never worked out at all.
+# The Gazetteer resolves every address against:
+#   the counties and Dublin postal districts - COUNTY_LST (daft_normalize.py), matched in any of their usual
+#                                              spellings: 'Co. Cork', 'Co Cork', 'County Cork', 'Cork',
+#                                              'Dublin 6W', 'Dublin 6w', 'D6W', 'Dublin 06', and the Dublin Eircode
+#                                              routing keys ('D06 XY12' is Dublin 6)
+#   the towns of gazetteer.csv                - one row per town (or Dublin area) with its county, its Dublin
+#                                              postal district if it has one, and a weight (how often it is seen)
+#                                              used to pick between towns of the same name in different counties
+# Both csv files are package data of daft_data/. gazetteer.csv is built (python daft_gazetteer.py build) from
+# daft_data/towns.csv, the towns and villages of every county (from the lists of towns and villages of Ireland
+# and Northern Ireland on Wikipedia) and the areas of each Dublin postal district, together with the addresses of
+# a scrape (daft_df.csv by default): how often each town is seen gives its weight, and areas and estates seen
+# often enough in one county are added to the towns. Edit towns.csv and re-run the build to add a town.
+
+# The csv is compiled once per process into a hashed index (normalized name -> entries), which a long running
+# daft-scrape daemon keeps. The compiled index can also be cached as a pickle, opt-in with cache_dir (e.g.
+# daft-scrape --gazetteer-cache DIR): it is keyed by the hash of the csv, COMPILE_VERSION and the Python and numpy
+# versions, and is only ever read from and written to that directory. Only point it at a directory you trust, a
+# pickle can run code when it is loaded.
+# Resolving a column of addresses works on the distinct addresses and the distinct comma separated parts only
+# (pd.factorize), each part is normalized and looked up once, then the rightmost county/district part, and the
+# nearest town to the left of it, are picked for every address with array operations.
+#   places = get_gazetteer().resolve(daft_df['address'])   # town, county, district and location columns
+
+import argparse
+import hashlib
+import os
+import pickle
+import platform
+import re
+
+import numpy as np
+import pandas as pd
+
+import daft_data
+from daft_normalize import COUNTY_LST
+
+DATA_DIR = os.path.dirname(os.path.abspath(daft_data.__file__))
+GAZETTEER_FILE = os.path.join(DATA_DIR, 'gazetteer.csv')
+TOWNS_FILE = os.path.join(DATA_DIR, 'towns.csv')
+GAZETTEER_COLUMNS = ['name', 'county', 'district', 'weight']
+
+# Bump when the compiled index changes shape so that older cached indexes are not loaded
+COMPILE_VERSION = 1
+
+RESOLVED_COLUMNS = ['town', 'county', 'district', 'location']
+
+COUNTIES = [c for c in COUNTY_LST if c.startswith('Co. ')]
+DISTRICTS = [c for c in COUNTY_LST if c.startswith('Dublin ')]
+
+# 'dublin 6w', 'dublin 06', 'd6w', 'd 12' (after normalize_keys)
+DISTRICT_RE = re.compile(r'^(?:dublin|d)\s?0?(?P<number>\d{1,2})\s?(?P<west>w?)$')
+# A Dublin Eircode, the routing key (D01 to D24 and D6W) followed by the 4 character unique identifier
+EIRCODE_RE = re.compile(r'^(?:d(?P<number>\d{2})|d(?P<six_w>6w))\s?[0-9a-z]{4}$')
+
+
+def normalize_keys(parts):
+    """The lookup key of each name or address part: lower case, no dots or apostrophes, '-' as a space."""
+    return (parts.str.lower()
+            .str.replace(r"[.'’]", '', regex=True)
+            .str.replace(r'[-\s]+', ' ', regex=True)
+            .str.replace(r'^saint ', 'st ', regex=True)
+            .str.strip())
+
+
+def _district_of(keys):
+    """The Dublin postal district ('Dublin 6W') of each key which is a district or a Dublin Eircode, else None."""
+    district = keys.str.extract(DISTRICT_RE)
+    name = 'Dublin ' + district['number'].str.lstrip('0') + district['west'].str.upper()
+    eircode = keys.str.extract(EIRCODE_RE)
+    from_eircode = ('Dublin ' + eircode['number'].str.lstrip('0')).where(eircode['number'].notna(),
+                                                                         eircode['six_w'].map({'6w': 'Dublin 6W'}))
+    name = name.where(name.isin(DISTRICTS), from_eircode.where(from_eircode.isin(DISTRICTS)))
+    return name.where(name.notna(), None)
+
+
+def compile_gazetteer(towns):
+    """Compile a DataFrame of GAZETTEER_COLUMNS into the lookup tables of a Gazetteer."""
+    county_keys = {}
+    for county in COUNTIES:
+        name = normalize_keys(pd.Series([county[len('Co. '):]]))[0]
+        for key in (name, 'co ' + name, 'county ' + name):
+            county_keys[key] = county
+
+    towns = towns.fillna({'district': '', 'weight': 1}).reset_index(drop=True)
+    keys = normalize_keys(towns['name'].astype(str))
+    # A town name seen in more than one county: the (key, county) pair picks the right one when the address
+    # gives the county, otherwise the most common one (highest weight) is used
+    order = towns['weight'].astype(float).to_numpy().argsort(kind='stable')[::-1]
+    town_default = {}
+    town_in_county = {}
+    for i in order:
+        key = keys[i]
+        town_default.setdefault(key, i)
+        town_in_county.setdefault(key + '|' + towns.at[i, 'county'], i)
+    return {
+        'version': COMPILE_VERSION,
+        'county_keys': county_keys,
+        'town_names': towns['name'].astype(str).to_numpy(dtype=object),
+        'town_counties': towns['county'].astype(str).to_numpy(dtype=object),
+        'town_districts': towns['district'].astype(str).to_numpy(dtype=object),
+        'town_default': town_default,
+        'town_in_county': town_in_county,
+    }
+
+
+def cache_key(data):
+    """The key of the compiled index of the csv data: its hash, and the versions which the pickle depends on."""
+    digest = hashlib.sha256(data)
+    digest.update(('%s numpy %s' % (platform.python_version(), np.__version__)).encode())
+    return digest.hexdigest()[:16]
+
+
+class Gazetteer:
+    """
+    gazetteer = Gazetteer()                       # the bundled gazetteer.csv, compiled
+    gazetteer = Gazetteer(cache_dir='gaz_cache')  # or loaded from (and saved to) the compiled index cache
+    places = gazetteer.resolve(df['address'])
+    """
+
+    def __init__(self, path=GAZETTEER_FILE, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.loaded_from_cache = False
+        with open(path, 'rb') as f:
+            data = f.read()
+        cache_path = os.path.join(cache_dir, 'gazetteer-%d-%s.pickle' % (COMPILE_VERSION, cache_key(data))) \
+            if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                self.index = pickle.load(f)
+            self.loaded_from_cache = True
+        else:
+            self.index = compile_gazetteer(pd.read_csv(path, keep_default_na=False))
+            if cache_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(cache_path + '.tmp', 'wb') as f:
+                    pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(cache_path + '.tmp', cache_path)
+
+    def __len__(self):
+        return len(self.index['town_names'])
+
+    def resolve(self, address):
+        """
+        Resolve a Series of addresses. Returns a DataFrame (same index) with the columns:
+          town     - the town (or Dublin area) of gazetteer.csv named in the address, blank if none is
+          county   - 'Co. Cork' etc., from the address or else from its town (Dublin districts are in 'Co. Dublin')
+          district - the Dublin postal district ('Dublin 6W') from the address or its Eircode, else from its town
+                     when the address names no county at all
+          location - the district named in the address, else the county named in the address, else the district
+                     or county of its town: the 'county' column of a normalized DataFrame (a COUNTY_LST value)
+        """
+        idx = self.index
+        codes, uniques = pd.factorize(address.astype(object).fillna('').to_numpy())
+        n_addresses = len(uniques)
+        parts = pd.Series(uniques, dtype=object).str.split(',').explode()
+        addr = parts.index.to_numpy()
+        # Position of each part counting from the right of its address (0 is the last part)
+        n_parts = np.bincount(addr, minlength=n_addresses)
+        first = np.r_[0, np.cumsum(n_parts)[:-1]]
+        pos = n_parts[addr] - 1 - (np.arange(len(parts)) - first[addr])
+
+        # Every distinct part is normalized and looked up once. Most distinct parts are the house number and street
+        # ('12 Main Street'), a part starting with a digit is never a place so those are not looked up at all
+        part_codes, part_uniques = pd.factorize(parts.fillna('').to_numpy())
+        lookup = np.array([not part.lstrip()[:1].isdigit() for part in part_uniques], dtype=bool)
+        keys = normalize_keys(pd.Series(part_uniques[lookup], dtype=object).str.strip())
+        district_u = np.full(len(part_uniques), None, dtype=object)
+        district_u[lookup] = _district_of(keys).to_numpy(dtype=object)
+        county_u = np.full(len(part_uniques), None, dtype=object)
+        county_u[lookup] = keys.map(idx['county_keys']).to_numpy(dtype=object)
+        town_u = np.full(len(part_uniques), np.nan)
+        town_u[lookup] = keys.map(idx['town_default']).to_numpy(dtype='float64')
+        key_u = np.full(len(part_uniques), '', dtype=object)
+        key_u[lookup] = keys.to_numpy(dtype=object)
+
+        part_district = district_u[part_codes]
+        part_county = np.where(pd.notna(part_district), 'Co. Dublin', county_u[part_codes])
+        is_place = pd.notna(part_county)
+
+        # The rightmost part which is a county or district (parts run left to right so keep the last match)
+        places = pd.DataFrame({'addr': addr[is_place], 'pos': pos[is_place], 'county': part_county[is_place],
+                               'district': part_district[is_place]}).drop_duplicates('addr', keep='last')
+        place_pos = np.full(n_addresses, -1)
+        place_pos[places['addr'].to_numpy()] = places['pos'].to_numpy()
+        county = np.full(n_addresses, None, dtype=object)
+        county[places['addr'].to_numpy()] = places['county'].to_numpy()
+        district = np.full(n_addresses, None, dtype=object)
+        district[places['addr'].to_numpy()] = places['district'].to_numpy()
+        named = pd.notna(county)
+
+        # The nearest town to the left of that part, or the part itself if it is also a town ('..., Galway')
+        part_town = town_u[part_codes]
+        is_town = ~np.isnan(part_town) & (pos >= place_pos[addr])
+        towns = pd.DataFrame({'addr': addr[is_town], 'pos': pos[is_town], 'key': key_u[part_codes[is_town]],
+                              'entry': part_town[is_town]})
+        towns = towns.sort_values(['addr', 'pos'], kind='stable').loc[
+            lambda t: (t['pos'] > place_pos[t['addr'].to_numpy()]) | (~t['addr'].duplicated(keep=False))]
+        towns = towns.drop_duplicates('addr', keep='first')
+        town_addr = towns['addr'].to_numpy()
+        # A town of the same name in the county the address gives wins over the most common one
+        in_county = (towns['key'] + '|' + pd.Series(county[town_addr], index=towns.index).fillna('')).map(
+            idx['town_in_county'])
+        entry = in_county.fillna(towns['entry']).to_numpy().astype('int64')
+        town = np.full(n_addresses, '', dtype=object)
+        town[town_addr] = idx['town_names'][entry]
+
+        # Addresses which name no county or district take them from their town
+        town_county = np.full(n_addresses, None, dtype=object)
+        town_county[town_addr] = idx['town_counties'][entry]
+        town_district = np.full(n_addresses, None, dtype=object)
+        town_district[town_addr] = idx['town_districts'][entry]
+        town_district[town_district == ''] = None
+        county = np.where(named, county, town_county)
+        location = np.where(named, np.where(pd.notna(district), district, county),
+                            np.where(pd.notna(town_district), town_district, town_county))
+        district = np.where(named, district, town_district)
+
+        out = pd.DataFrame({'town': town, 'county': county, 'district': district, 'location': location})
+        out = out.fillna('').take(codes)
+        out.index = address.index
+        return out[RESOLVED_COLUMNS]
+
+
+_gazetteer = None
+
+
+def get_gazetteer(cache_dir=None):
+    """
+    The Gazetteer of the bundled gazetteer.csv, loaded once per process. cache_dir (see Gazetteer) only applies
+    to the first call, which loads it.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer(cache_dir=cache_dir)
+    return _gazetteer
+
+
+def seen_towns(addresses, counties, min_count=2, min_share=0.75):
+    """
+    The towns (GAZETTEER_COLUMNS) in a set of addresses whose county is known: the part before the county of each
+    address, kept when it is seen at least min_count times and at least min_share of the times it is seen is in
+    the one county (Dublin areas are kept with the postal district they are most often in). Parts with a digit
+    (house numbers, Eircodes) are never towns.
+    """
+    parts = addresses.astype(str).str.split(',')
+    df = pd.DataFrame({'name': parts.str[-2].fillna('').str.strip(), 'place': counties.astype(str).str.strip()})
+    df = df.loc[(parts.str.len() >= 2) & df['place'].isin(COUNTY_LST) & (df['name'] != '')
+                & ~df['name'].str.contains(r'\d', regex=True)]
+    df['county'] = df['place'].where(df['place'].isin(COUNTIES), 'Co. Dublin')
+    df['district'] = df['place'].where(df['place'].isin(DISTRICTS), '')
+
+    counts = df.groupby(['name', 'county']).size().rename('weight').reset_index()
+    share = counts['weight'] / counts.groupby('name')['weight'].transform('sum')
+    counts = counts.loc[(counts['weight'] >= min_count) & ((share >= min_share) | (counts['weight'] >= 10))]
+    # The postal district a Dublin area is most often given with ('' if it is mostly given as Co. Dublin)
+    districts = df.groupby(['name', 'county'])['district'].agg(lambda d: d.value_counts().index[0])
+    counts = counts.join(districts, on=['name', 'county'])
+    return counts[GAZETTEER_COLUMNS].reset_index(drop=True)
+
+
+def build_gazetteer(towns, addresses=None, counties=None, min_count=2):
+    """
+    A gazetteer (GAZETTEER_COLUMNS) of towns (a DataFrame with name and county, and optionally district, columns)
+    and of the towns seen in a set of addresses with their counties (see seen_towns), if given. A town of towns
+    has a weight of 1 plus the number of times it is seen, its district is taken from the addresses if towns does
+    not give one.
+    """
+    towns = towns.reindex(columns=['name', 'county', 'district']).fillna({'district': ''})
+    towns['weight'] = 1
+    if addresses is not None:
+        seen = seen_towns(addresses, counties, min_count)
+        towns = towns.merge(seen, on=['name', 'county'], how='outer', suffixes=('', '_seen'))
+        towns['district'] = towns['district'].where(towns['district'].fillna('') != '', towns['district_seen'])
+        towns['weight'] = towns['weight'].fillna(0) + towns['weight_seen'].fillna(0)
+    towns = towns.fillna({'district': ''}).astype({'weight': 'int64'})
+    return towns[GAZETTEER_COLUMNS].sort_values(['county', 'name']).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build gazetteer.csv from towns.csv and the addresses of a scrape')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--towns', default=TOWNS_FILE,
+                        help='a csv of towns with name and county (and optionally district) columns')
+    parser.add_argument('--addresses', default=os.path.join(os.path.dirname(DATA_DIR), 'daft_df.csv'),
+                        help='a csv with address and county columns, e.g. a scrape written with --csv ("" for none)')
+    parser.add_argument('--min-count', type=int, default=2)
+    parser.add_argument('--out', default=GAZETTEER_FILE)
+    args = parser.parse_args(argv)
+
+    towns = pd.read_csv(args.towns, keep_default_na=False)
+    if args.addresses:
+        df = pd.read_csv(args.addresses, keep_default_na=False)
+        gazetteer = build_gazetteer(towns, df['address'], df['county'], args.min_count)
+    else:
+        gazetteer = build_gazetteer(towns)
+    gazetteer.to_csv(args.out, index=False)
+    print('%d towns written to %s' % (len(gazetteer), args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+################################################################################################################
+# Incremental - stable listing IDs, early stopping against the last snapshot and new/changed/delisted deltas
+################################################################################################################
+
+# The README suggests re-scraping every 3 days to track price trends, but a full crawl fetches all ~750 pages.
+# Every ad on Daft.ie has a numeric ID at the end of its link ('/for-sale/17-eglinton-square.../3028614'), which
+# is also in the 'data-testid' of its card ('result-3028614'). We key every property by this ID so that:
+#   * duplicates are removed with a hash lookup on one column rather than a sort over seven text columns
+#   * a new scrape can be compared with the previous snapshot to find new, price changed and delisted properties
+#   * an incremental scrape can stop paginating a shard (see daft_plan.py) as soon as a whole page only holds
+#     properties we already know about at an unchanged price. The search results are ordered newest first so
+#     everything after that page has already been seen. The properties of the searches of the shards which
+#     stopped early are carried forward from the previous snapshot, so delisted properties can only be found in
+#     the shards which were crawled in full.
+
+import re
+
+import pandas as pd
+
+from daft_plan import in_search
+
+# Only the "normal" ads with a '/for-sale' link are kept by the scrape (a development's '/new-homes-for-sale' card
+# is not), the other cards of a page are not looked for in the last snapshot
+KEPT_HREF_PREFIX = '/for-sale'
+
+# The numeric ID at the end of a link or a 'data-testid', e.g. '/for-sale/.../3028614' or 'result-3028614'
+_HREF_ID = re.compile(r'/(\d+)/?(?:\?.*)?$')
+_TESTID_ID = re.compile(r'(\d+)$')
+
+
+def listing_id(href, testid):
+    """The stable ID of one property, see listing_ids."""
+    match = _HREF_ID.search(href or '') or _TESTID_ID.search(testid or '')
+    return match.group(1) if match else testid
+
+
+def listing_ids(href, testid):
+    """The stable ID of each property, from its link if it has one and otherwise from its card's data-testid."""
+    from_href = href.fillna('').str.extract(_HREF_ID)[0]
+    from_testid = testid.fillna('').str.extract(_TESTID_ID)[0]
+    return from_href.fillna(from_testid).fillna(testid).rename('listing_id')
+
+
+def listing_prices(listing):
+    """
+    (id, price text) for a Listing, or for each of the properties of a "special" Listing. Empty for an ad the
+    scrape does not keep.
+    """
+    if not listing.special:
+        if not (listing.href or '').startswith(KEPT_HREF_PREFIX):
+            return []
+        return [(listing_id(listing.href, listing.listing_id), listing.price)]
+    return [(listing_id(unit.href, listing.listing_id), unit.price) for unit in listing.sub_units]
+
+
+class IncrementalCrawl:
+    """
+    Compare a scrape with the previous snapshot.
+
+    crawl = IncrementalCrawl(previous, stop_early=True)
+    for key, pages in shards:
+        listings.extend(ad for page in crawl.pages(iter_page_listings(pages), key) for ad in page)
+    ...
+    daft_df, delta = crawl.finish(daft_df)
+    """
+
+    def __init__(self, previous, stop_early=True):
+        self.previous = previous
+        self.stop_early = stop_early
+        self.known = dict(zip(previous['listing_id'], previous['price'].astype(str).str.strip()))
+        # The shard key (see daft_plan.shard_key) of each shard which stopped early
+        self.stopped_shards = []
+        self.pages_seen = 0
+
+    @property
+    def stopped_early(self):
+        return len(self.stopped_shards) > 0
+
+    def page_is_known(self, listings):
+        prices = [pair for listing in listings for pair in listing_prices(listing)]
+        return len(prices) > 0 and all(self.known.get(key) == price for key, price in prices)
+
+    def pages(self, page_listings, shard):
+        """
+        Pass through the list of Listings of each page of one shard (its shard_key), stopping after the first page
+        which only holds known, unchanged properties. Stopping closes page_listings, which in turn stops the
+        fetcher paginating the shard. A shard whose last page is the known page was read in full, so it is not
+        counted as stopped (its unseen properties are delisted rather than carried forward).
+        """
+        page_listings = iter(page_listings)
+        for listings in page_listings:
+            self.pages_seen += 1
+            yield listings
+            if self.stop_early and self.page_is_known(listings):
+                # The next page (usually already fetched ahead) tells whether any of the shard is left unread
+                if next(page_listings, None) is not None:
+                    self.stopped_shards.append(shard)
+                if hasattr(page_listings, 'close'):
+                    page_listings.close()
+                return
+
+    def finish(self, current):
+        """
+        Return (snapshot, delta) where the snapshot is current plus the previous properties of the shards which
+        stopped early that were not reached, and delta holds one row per 'new', 'price_changed' or 'delisted'
+        property (with the previous price in 'price_old'). Only a property no stopped shard could have held is
+        counted as delisted.
+        """
+        previous = self.previous.drop_duplicates(subset=['listing_id']).set_index('listing_id')
+        is_new = ~current['listing_id'].isin(previous.index)
+        price_old = current['listing_id'].map(previous['price'])
+        changed = ~is_new & (price_old.astype(str).str.strip() != current['price'].str.strip())
+
+        unseen = self.previous.loc[~self.previous['listing_id'].isin(current['listing_id']),
+                                   [c for c in current.columns if c in self.previous.columns]]
+        # The properties of a stopped shard after its stopping point were not fetched, they are assumed unchanged
+        not_reached = pd.Series(False, index=unseen.index)
+        for shard in self.stopped_shards:
+            not_reached |= in_search(unseen, shard)
+        snapshot = pd.concat([current, unseen.loc[not_reached]], ignore_index=True)
+        delisted = unseen.loc[~not_reached]
+        delta = [current.loc[is_new].assign(change='new', price_old=''),
+                 current.loc[changed].assign(change='price_changed', price_old=price_old[changed]),
+                 delisted.assign(change='delisted', price_old=delisted['price'])]
+        delta = pd.concat(delta, ignore_index=True)
+        delta = delta[['listing_id', 'change', 'price_old'] + [c for c in current.columns if c != 'listing_id']]
+        return snapshot, delta
@@ -0,0 +1,291 @@
+################################################################################################################
+# Metrics - per stage timings, counts and an opt-in profile of one stage of a run
+################################################################################################################
+
+# A run of the script goes through a number of stages: planning the crawl, fetching the pages, parsing the ads out
+# of them, building the DataFrames, normalizing, merging/de-duplicating and writing. A RunReport records for each
+# stage the wall clock time, the CPU time, the number of items (pages) and bytes which went through it and the
+# peak memory of the process by the end of it, plus the number of rows dropped by each filter, and writes them out
+# as a JSON run report and optionally in the Prometheus text format (for a node_exporter textfile collector).
+#   report = RunReport(snapshot)
+#   report.start('normalize') ... report.stop()          # or: with report.stage('normalize'): ...
+#   pages = report.timed_iter('fetch', pages, size=page_bytes)  # for stages which are generators
+#   report.drop('for_sale_href', before, after)
+#   report.write_json('Files/run_report.json')
+# Fetching and parsing run interleaved (each page is parsed as soon as it arrives), so the time of a stage only
+# counts while it is the innermost stage running: time spent inside a nested stage (e.g. waiting on the fetch
+# while parsing) is counted against the nested stage and not against both.
+# The CPU time is that of this process (all of its threads), the CPU time of ParsePool worker processes is not
+# included, the parse stage then measures the time spent waiting on the pool.
+#
+# Profiling: RunReport(profile='parse') runs cProfile only while the parse stage is running, the stats can be
+# written out with write_profile() and opened with pstats or snakeviz. For a sampling profiler such as py-spy,
+# which attaches to a running process from outside, the start and end of every stage are printed (with the
+# process id) when verbose=True (--trace-stages on the command line), so the samples of one stage can be picked out
+# by time.
+
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The stages of a scrape (Daft_webscrape_script.py and daft_pipeline.Scraper), any one of which can be profiled
+STAGES = ['plan', 'fetch', 'parse', 'extract', 'normalize', 'merge', 'write', 'index']
+
+
+def peak_memory_bytes():
+    """The peak resident set size of this process so far, or None where it is not available (Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def page_bytes(page):
+    """The size in bytes of a page, as text (utf-8 encoded, '€' is 3 bytes) or as bytes."""
+    return len(page) if isinstance(page, bytes) else len(page.encode('utf-8'))
+
+
+class StageStats:
+    """The running totals of one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.peak_memory = None
+
+    @property
+    def items_per_sec(self):
+        return self.items / self.wall if self.wall > 0 else 0.0
+
+    def to_dict(self):
+        return {'wall_s': round(self.wall, 6), 'cpu_s': round(self.cpu, 6), 'calls': self.calls,
+                'items': self.items, 'bytes': self.bytes, 'items_per_s': round(self.items_per_sec, 3),
+                'peak_memory_bytes': self.peak_memory}
+
+    def __repr__(self):
+        return ('StageStats(%s, wall=%.3fs, cpu=%.3fs, items=%d, bytes=%d)'
+                % (self.name, self.wall, self.cpu, self.items, self.bytes))
+
+
+class RunReport:
+    """
+    report = RunReport('20210301T093000', profile='parse')
+    with report.stage('parse'):
+        ...
+    report.write_json('Files/run_report.json')
+    """
+
+    def __init__(self, run_id=None, profile=None, verbose=False):
+        self.run_id = run_id
+        self.stages = collections.OrderedDict()
+        self.counts = collections.OrderedDict()
+        self.dropped = collections.OrderedDict()
+        self.info = collections.OrderedDict()
+        self.profile = profile
+        self.verbose = verbose
+        self._profiler = cProfile.Profile() if profile else None
+        # [name, wall at (re)start, cpu at (re)start] of each running stage, innermost last
+        self._running = []
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._finished = None
+
+    def _stats(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats(name)
+        return self.stages[name]
+
+    def _pause(self):
+        # Add the time since the innermost stage was (re)started to its totals
+        name, wall, cpu = self._running[-1]
+        stats = self.stages[name]
+        stats.wall += time.perf_counter() - wall
+        stats.cpu += time.process_time() - cpu
+        if name == self.profile:
+            self._profiler.disable()
+
+    def _resume(self):
+        entry = self._running[-1]
+        entry[1] = time.perf_counter()
+        entry[2] = time.process_time()
+        if entry[0] == self.profile:
+            self._profiler.enable()
+
+    def start(self, name):
+        """Start (or carry on) timing the stage name, any stage already running is paused until it stops."""
+        if self._running:
+            self._pause()
+        self._stats(name).calls += 1
+        self._running.append([name, None, None])
+        if self.verbose:
+            print('[pid %d] %.3f start %s' % (os.getpid(), time.time(), name))
+        self._resume()
+
+    def stop(self, name=None):
+        """Stop the innermost stage (which must be name, if given) and carry on with the stage it paused."""
+        if not self._running or (name is not None and self._running[-1][0] != name):
+            raise RuntimeError('stage %r is not the innermost stage running' % name)
+        self._pause()
+        finished = self._running.pop()[0]
+        self.stages[finished].peak_memory = peak_memory_bytes()
+        if self.verbose:
+            print('[pid %d] %.3f stop %s' % (os.getpid(), time.time(), finished))
+        if self._running:
+            self._resume()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield self.stages[name]
+        finally:
+            self.stop(name)
+
+    def timed_iter(self, name, iterable, size=None):
+        """
+        Yield the items of iterable, timing each step of it as the stage name (not the time the caller spends
+        on each item). size, e.g. page_bytes, gives the bytes of each item. Closing the returned generator closes
+        iterable, so stopping early still reaches the producer.
+        """
+        stats = self._stats(name)
+        items = iter(iterable)
+        try:
+            while True:
+                self.start(name)
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    self.stop(name)
+                stats.items += 1
+                if size is not None:
+                    stats.bytes += size(item)
+                yield item
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+
+    def add(self, name, items=0, n_bytes=0):
+        """Add items and bytes to a stage, e.g. those counted by the fetcher."""
+        stats = self._stats(name)
+        stats.items += items
+        stats.bytes += n_bytes
+
+    def count(self, name, n):
+        """Record a count, e.g. the number of ads with no bed/bath/area text."""
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def drop(self, name, before, after):
+        """Record the rows dropped by the filter name, from the number of rows before and after it."""
+        self.dropped[name] = self.dropped.get(name, 0) + int(before) - int(after)
+        return int(before) - int(after)
+
+    def finish(self):
+        """Stop the clock of the whole run (called by to_dict if it has not been already)."""
+        while self._running:
+            self.stop()
+        if self._finished is None:
+            self._finished = (time.perf_counter() - self._started, time.process_time() - self._started_cpu)
+
+    def to_dict(self):
+        self.finish()
+        wall, cpu = self._finished
+        return {
+            'run_id': self.run_id,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'peak_memory_bytes': peak_memory_bytes(),
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+            'counts': dict(self.counts),
+            'dropped': dict(self.dropped),
+            'info': dict(self.info),
+        }
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+    def prometheus_text(self, prefix='daft_scrape'):
+        """The report in the Prometheus text exposition format, one gauge per stage statistic."""
+        report = self.to_dict()
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s gauge' % (prefix, name))
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                      for k, v in labels.items())
+                lines.append('%s_%s{%s} %s' % (prefix, name, label_text, repr(float(value))))
+
+        run = {'run_id': self.run_id or ''}
+        stages = report['stages'].items()
+        metric('run_wall_seconds', 'Wall clock time of the whole run.', [(run, report['wall_s'])])
+        metric('run_cpu_seconds', 'CPU time of the whole run (this process).', [(run, report['cpu_s'])])
+        metric('peak_memory_bytes', 'Peak resident set size of the run.', [(run, report['peak_memory_bytes'])])
+        for key, name, help_text in [('wall_s', 'stage_wall_seconds', 'Wall clock time spent in each stage.'),
+                                     ('cpu_s', 'stage_cpu_seconds', 'CPU time spent in each stage.'),
+                                     ('items', 'stage_items', 'Items (pages) through each stage.'),
+                                     ('bytes', 'stage_bytes', 'Bytes through each stage.'),
+                                     ('items_per_s', 'stage_items_per_second', 'Items (pages) per second.')]:
+            metric(name, help_text, [(dict(run, stage=stage), stats[key]) for stage, stats in stages])
+        metric('rows_dropped', 'Rows dropped by each filter.',
+               [(dict(run, filter=name), n) for name, n in report['dropped'].items()])
+        metric('count', 'Other counts of the run.',
+               [(dict(run, name=name), n) for name, n in report['counts'].items()])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='daft_scrape'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Written to a temporary file and renamed so a textfile collector never reads half a file
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.prometheus_text(prefix))
+        os.replace(path + '.tmp', path)
+        return path
+
+    def write_profile(self, path, top=20):
+        """Dump the cProfile stats of the profiled stage to path, returns the top functions by cumulative time."""
+        if self._profiler is None:
+            raise ValueError('no stage was profiled, pass profile=<stage> to RunReport')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+    def __str__(self):
+        report = self.to_dict()
+        lines = ['%-10s %9s %9s %7s %11s %9s %9s' % ('stage', 'wall s', 'cpu s', 'items', 'bytes', 'items/s',
+                                                      'peak MB')]
+        for name, stats in report['stages'].items():
+            peak = stats['peak_memory_bytes']
+            lines.append('%-10s %9.3f %9.3f %7d %11d %9.1f %9s'
+                         % (name, stats['wall_s'], stats['cpu_s'], stats['items'], stats['bytes'],
+                            stats['items_per_s'], '%.1f' % (peak / 2 ** 20) if peak else '-'))
+        lines.append('%-10s %9.3f %9.3f' % ('total', report['wall_s'], report['cpu_s']))
+        for name, n in report['dropped'].items():
+            lines.append('dropped by %s: %d rows' % (name, n))
+        for name, n in report['counts'].items():
+            lines.append('%s: %d' % (name, n))
+        return '\n'.join(lines)
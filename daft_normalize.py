@@ -0,0 +1,133 @@
+################################################################################################################
+# Normalize - one shared, vectorized clean up of the price, bed, bath, area, property type and county fields
+################################################################################################################
+
+# Sections 2 and 3 of the script each cleaned up their own ads. The price used a seven pattern regex replace
+# (copy and pasted for the "special" ads), and about a dozen str.contains/isin passes over the bed_t, bath_t,
+# area_t and prop_type_t columns were needed just to work out which column held which piece of information.
+
+# Here each '·' separated bed/bath/area token is classified by one compiled regex. The same texts and the same
+# few hundred tokens ('3 Bed', '2 Bath', 'Semi-D' ...) appear over and over, so the text is only split once for
+# each distinct text and the regex only runs once for each distinct token (pd.factorize), the results are then
+# mapped back onto every row with an array lookup. The prices are handled the same way.
+
+# As well as the original text columns we create proper numeric columns:
+#   price_eur - the price in euro as an integer, null for "Price on Application" (previously 0)
+#   bed_n     - the number of bedrooms
+#   bath_n    - the number of bathrooms
+#   area_m2   - the floor/site area in square metres (areas quoted in acres are converted)
+
+import re
+
+import numpy as np
+import pandas as pd
+
+SQ_M_PER_ACRE = 4046.8564224
+
+PROP_LST = ['Apartment', 'Bungalow', 'Detached', 'Duplex', 'End of Terrace', 'House', 'Semi-D', 'Site', 'Studio',
+            'Terrace', 'Townhouse']
+
+COUNTY_LST = ['Co. Antrim', 'Co. Armagh', 'Co. Carlow', 'Co. Cavan', 'Co. Clare', 'Co. Cork',
+              'Co. Derry', 'Co. Donegal', 'Co. Down', 'Co. Dublin', 'Co. Fermanagh', 'Co. Galway',
+              'Co. Kerry', 'Co. Kildare', 'Co. Kilkenny', 'Co. Laois', 'Co. Leitrim', 'Co. Limerick',
+              'Co. Longford', 'Co. Louth', 'Co. Mayo', 'Co. Meath', 'Co. Monaghan', 'Co. Offaly',
+              'Co. Roscommon', 'Co. Sligo', 'Co. Tipperary', 'Co. Tyrone', 'Co. Waterford',
+              'Co. Westmeath', 'Co. Wexford', 'Co. Wicklow', 'Dublin 1', 'Dublin 10', 'Dublin 11',
+              'Dublin 12', 'Dublin 13', 'Dublin 14', 'Dublin 15', 'Dublin 16', 'Dublin 17',
+              'Dublin 18', 'Dublin 2', 'Dublin 20', 'Dublin 22', 'Dublin 24', 'Dublin 3',
+              'Dublin 4', 'Dublin 5', 'Dublin 6', 'Dublin 6W', 'Dublin 7', 'Dublin 8',
+              'Dublin 9']
+
+# One token is one of: '3 Bed', '2 Bath', '145 m²' / '0.5 ac' or a property type, anything else (e.g. the
+# auctioneer in the 'extra' column) does not match
+TOKEN_RE = re.compile(r'^(?:(?P<bed_n>\d+)\s*Beds?'
+                      r'|(?P<bath_n>\d+)\s*Baths?'
+                      r'|(?P<area_v>\d[\d,]*(?:\.\d+)?)\s*(?P<area_unit>m²|m2|sq\.? ?m|ac(?:res?)?)'
+                      r'|(?P<prop_type>' + '|'.join(re.escape(p) for p in PROP_LST) + r'))$')
+
+# The euro amount of a price e.g. '€250,000', 'AMV: €250,000', 'From €300,000' or '£2,000 (€2,300)'
+PRICE_RE = re.compile(r'€\s*(?P<price_eur>\d[\d,]*)')
+
+BBA_COLUMNS = ['bed', 'bath', 'area', 'prop_type', 'bed_n', 'bath_n', 'area_m2']
+
+# The columns of a normalized DataFrame, in the order of the original daft_df.csv followed by the numeric columns
+LISTING_COLUMNS = ['address', 'county', 'bed', 'bath', 'prop_type', 'area', 'price',
+                   'price_eur', 'bed_n', 'bath_n', 'area_m2']
+
+
+def _classify_unique(values, pattern):
+    """factorize values, run pattern over the distinct values only and return (codes, uniques, groups)."""
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    return codes, uniques, uniques.str.extract(pattern)
+
+
+def normalize_price(price):
+    """The euro price of each price text as a nullable integer (Int64), null when no euro amount is quoted."""
+    codes, _, groups = _classify_unique(price.astype(object).fillna('').to_numpy(), PRICE_RE)
+    price_eur = pd.to_numeric(groups['price_eur'].str.replace(',', '', regex=False)).astype('Int64')
+    return pd.Series(price_eur.to_numpy()[codes], index=price.index, dtype='Int64', name='price_eur')
+
+
+def normalize_bba(bba):
+    """
+    Classify the '·' separated tokens of each bed/bath/area text.
+    Returns a DataFrame (same index as bba) with the text columns bed, bath, area, prop_type (blank if not quoted)
+    and the numeric columns bed_n, bath_n (Int64) and area_m2 (float, NaN if not quoted).
+    """
+    # Whole bed/bath/area texts repeat as well, so only the distinct texts are split into tokens
+    bba_codes, bba_uniques = pd.factorize(bba.astype(object).fillna('').to_numpy())
+    bba_uniques = pd.Series(bba_uniques, dtype=object)
+    tokens = bba_uniques.str.split('·').explode().str.strip()
+    rows = np.repeat(np.arange(len(bba_uniques)), bba_uniques.str.count('·').to_numpy() + 1)
+
+    codes, uniques, groups = _classify_unique(tokens.to_numpy(), TOKEN_RE)
+    token_info = pd.DataFrame({
+        'bed': uniques.where(groups['bed_n'].notna()),
+        'bath': uniques.where(groups['bath_n'].notna()),
+        'area': uniques.where(groups['area_v'].notna()),
+        'prop_type': groups['prop_type'],
+        'bed_n': pd.to_numeric(groups['bed_n']),
+        'bath_n': pd.to_numeric(groups['bath_n']),
+        'area_m2': pd.to_numeric(groups['area_v'].str.replace(',', '', regex=False))
+        * np.where(groups['area_unit'].str.startswith('ac', na=False), SQ_M_PER_ACRE, 1.0),
+    })
+
+    # Map the classification back onto every token, keep the first value of each column for each distinct text
+    # and then map the distinct texts back onto every row
+    per_token = token_info.take(codes)
+    per_token.index = rows
+    per_text = per_token.groupby(level=0).first().reindex(np.arange(len(bba_uniques)))
+    out = per_text.take(bba_codes)
+    out.index = bba.index
+    for col in ['bed', 'bath', 'area', 'prop_type']:
+        out[col] = out[col].fillna('').astype(object)
+    out['bed_n'] = out['bed_n'].astype('Int64')
+    out['bath_n'] = out['bath_n'].astype('Int64')
+    out['area_m2'] = out['area_m2'].astype(float)
+    return out[BBA_COLUMNS]
+
+
+def county_from_address(address):
+    """
+    The Dublin postal district or county (a COUNTY_LST value) of each address, blank if it is not known. Resolved
+    by the gazetteer (daft_gazetteer.py), so 'Co Dublin', 'Dublin 6w', an Eircode or a town are understood too.
+    """
+    # Imported here as daft_gazetteer imports COUNTY_LST from this module
+    from daft_gazetteer import get_gazetteer
+
+    return get_gazetteer().resolve(address)['location']
+
+
+def normalize_listings(df):
+    """
+    Take a DataFrame with 'address', 'price' and 'bba' text columns (one row per property) and return the
+    LISTING_COLUMNS (any other columns of df, e.g. the 'join_value', are kept in front of them).
+    """
+    out = normalize_bba(df['bba'])
+    out['address'] = df['address']
+    out['county'] = county_from_address(df['address'])
+    out['price'] = df['price'].str.strip()
+    out['price_eur'] = normalize_price(df['price'])
+    other = [col for col in df.columns if col not in ('address', 'price', 'bba')]
+    return pd.concat([df[other], out[LISTING_COLUMNS]], axis=1)
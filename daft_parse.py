@@ -0,0 +1,196 @@
+################################################################################################################
+# Parse - pluggable html parser backends and the versioned selectors for the Daft.ie listing cards
+################################################################################################################
+
+# Parsing every page with bs(html, 'html.parser') (pure Python) dominated the CPU time of a scrape.
+# The backends below all offer the same handful of operations to daft_extract.py so the extraction code does
+# not care which parser is underneath:
+#   'selectolax'   - the C based Lexbor (or Modest) parser from the selectolax package (fastest)
+#   'lxml'         - BeautifulSoup on top of the lxml parser
+#   'html.parser'  - BeautifulSoup on top of the pure Python parser (the original behaviour, no extra packages)
+# The BeautifulSoup backends use a SoupStrainer so that only the listing cards (li[data-testid]) and their
+# contents are ever turned into Tag objects, the <head>, scripts, navigation etc. are skipped.
+
+# The css classes Daft.ie uses are generated by their build and change from time to time. Rather than having the
+# class names written inline throughout the code they are all kept in SELECTOR_VERSIONS below. When the site
+# changes add a new version with the new selectors rather than editing an old one, so recorded pages from older
+# snapshots can still be parsed with the selectors they were written for.
+
+import re
+
+from bs4 import BeautifulSoup as bs
+from bs4 import SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # selectolax is optional, releases before 0.3 only have the Modest parser
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml  # noqa: F401 - only checking whether BeautifulSoup can use it
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+
+SELECTOR_VERSIONS = {
+    '2021-03': {
+        # Every ad on a search page is an li with a data-testid, e.g. <li data-testid="result-3028614">
+        'card': 'li[data-testid]',
+        # "normal" ads
+        'address': 'p.TitleBlock__Address-sc-1avkvav-7.knPImU',
+        'bed_bath_area': 'div.TitleBlock__CardInfo-sc-1avkvav-9.QvaxK',
+        'btype': 'p.TitleBlock__CardInfoItem-sc-1avkvav-8.bcaKbv',
+        'price': 'span.TitleBlock__StyledSpan-sc-1avkvav-4.gDBFnc',
+        # "special" or "multiple property" ads
+        'address_sp': 'p.TitleBlock__Address-sc-1avkvav-7.eARcqq',
+        'bed_bath_area_sp': 'div.SubUnit__CardInfoItem-sc-10x486s-7.AsGHw',
+        'price_sp': 'span.SubUnit__Title-sc-10x486s-5.keXaVZ, p.SubUnit__Title-sc-10x486s-5.keXaVZ',
+        # each property of a "special" ad is an li nested inside the ad's card
+        'sub_unit': 'li',
+        'link': 'a',
+    },
+}
+DEFAULT_SELECTOR_VERSION = '2021-03'
+
+
+def get_selectors(version=DEFAULT_SELECTOR_VERSION):
+    try:
+        return SELECTOR_VERSIONS[version]
+    except KeyError:
+        raise ValueError('unknown selector version %r, expected one of %s'
+                         % (version, ', '.join(sorted(SELECTOR_VERSIONS))))
+
+
+_SIMPLE_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)((?:\.[\w-]+)*)$')
+
+
+def _simple_selector_args(css):
+    """
+    The (names, attrs) find_all arguments for selectors like 'li' or 'span.A.B, p.A.B' which list tags sharing the
+    same classes, or None if the selector is anything more complicated.
+    """
+    names = []
+    classes = set()
+    for part in css.split(','):
+        match = _SIMPLE_SELECTOR.match(part.strip())
+        if match is None:
+            return None
+        names.append(match.group(1))
+        classes.add(match.group(2)[1:].replace('.', ' '))
+    if len(classes) != 1:
+        return None
+    classes = classes.pop()
+    return names, ({'class': classes} if classes else {})
+
+
+class Bs4Backend:
+    """BeautifulSoup (with the 'lxml' or 'html.parser' features) restricted to the listing cards."""
+
+    def __init__(self, features='lxml'):
+        self.name = features
+        self.features = features
+        self._strainer = SoupStrainer('li', attrs={'data-testid': True})
+        self._find_all_args = {}
+
+    def parse(self, html):
+        return bs(html, self.features, parse_only=self._strainer)
+
+    def cards(self, root):
+        # With the strainer in place the outermost cards are the direct children of the soup
+        return root.find_all('li', attrs={'data-testid': True}, recursive=False)
+
+    def select(self, node, css):
+        if css not in self._find_all_args:
+            self._find_all_args[css] = _simple_selector_args(css)
+        args = self._find_all_args[css]
+        # soupsieve is slow compared to find_all, so simple "tag.class.class" selectors are run through find_all
+        return node.find_all(*args) if args else node.select(css)
+
+    def first(self, node, css):
+        """The first node under node matching css, or None."""
+        if css not in self._find_all_args:
+            self._find_all_args[css] = _simple_selector_args(css)
+        args = self._find_all_args[css]
+        return node.find(*args) if args else node.select_one(css)
+
+    def text(self, node, separator=''):
+        return node.get_text(separator=separator)
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def ancestors(self, node, tag):
+        return node.find_parents(tag)
+
+    def release(self, root):
+        root.decompose()
+
+
+class SelectolaxBackend:
+    """selectolax (C based) parser, builds the whole tree but at a fraction of the cost of html.parser."""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        if HTMLParser is None:
+            raise ImportError('the selectolax backend requires the selectolax package (pip install selectolax)')
+
+    def parse(self, html):
+        return HTMLParser(html)
+
+    def cards(self, root):
+        cards = root.css('li[data-testid]')
+        # Only keep the outermost cards, the sub units of a "special" ad can also carry a data-testid
+        return [card for card in cards
+                if not any('data-testid' in li.attributes for li in self.ancestors(card, 'li'))]
+
+    def select(self, node, css):
+        # Lexbor also matches the node itself, BeautifulSoup (and the rest of the code) only looks at descendants
+        return [match for match in node.css(css) if match != node]
+
+    def first(self, node, css):
+        match = node.css_first(css)
+        if match is not None and match == node:
+            matches = self.select(node, css)
+            return matches[0] if matches else None
+        return match
+
+    def text(self, node, separator=''):
+        return node.text(separator=separator)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+    def ancestors(self, node, tag):
+        found = []
+        node = node.parent
+        while node is not None:
+            if node.tag == tag:
+                found.append(node)
+            node = node.parent
+        return found
+
+    def release(self, root):
+        pass
+
+
+def get_backend(name='auto'):
+    """
+    Return a parser backend by name ('selectolax', 'lxml' or 'html.parser').
+    'auto' picks the fastest one which is installed.
+    """
+    if name == 'auto':
+        if HTMLParser is not None:
+            return SelectolaxBackend()
+        return Bs4Backend('lxml' if HAVE_LXML else 'html.parser')
+    if name == 'selectolax':
+        return SelectolaxBackend()
+    if name in ('lxml', 'html.parser'):
+        if name == 'lxml' and not HAVE_LXML:
+            raise ImportError('the lxml backend requires the lxml package (pip install lxml)')
+        return Bs4Backend(name)
+    raise ValueError("unknown parser backend %r, expected 'auto', 'selectolax', 'lxml' or 'html.parser'" % name)
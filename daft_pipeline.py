@@ -0,0 +1,222 @@
+################################################################################################################
+# Pipeline - the scrape of Sections 2 and 3 as an importable, reusable Scraper
+################################################################################################################
+
+# Daft_webscrape_script.py walks through the scrape step by step at module level, so importing it starts a crawl.
+# The Scraper below runs the same steps (plan, fetch, parse, extract, normalize, merge, write, index) as a method
+# call and nothing happens on import. A Scraper keeps its resources between runs: the PageFetcher's keep-alive
+# session (no new TLS handshakes), the parser backend and ParsePool worker processes, the PriceIndex already
+# loaded from disk and the compiled regexes and lookup tables of the modules it imported. A long-running process
+# (see the daemon command of daft_scrape.py) therefore only pays for those once.
+#   with Scraper() as scraper:
+#       result = scraper.run('incremental')
+#       result.daft_df, result.delta_df, result.report
+
+import collections
+import os
+
+import pandas as pd
+
+from daft_aggregates import DEFAULT_INDEX_DIR, PriceIndex
+from daft_cache import DEFAULT_CACHE_DIR, PageCache, snapshot_name
+from daft_extract import CAN_FORK, ParsePool, iter_page_listings
+from daft_fetch import PageFetcher
+from daft_gazetteer import get_gazetteer
+from daft_incremental import KEPT_HREF_PREFIX, IncrementalCrawl, listing_ids
+from daft_metrics import RunReport, page_bytes
+from daft_normalize import normalize_listings
+from daft_parse import get_backend
+from daft_plan import CrawlPlanner, group_shards
+from daft_store import DEFAULT_STORE_DIR, SnapshotStore
+
+MODES = ['full', 'incremental', 'replay']
+
+LISTING_FRAME_COLUMNS = ['join_value', 'ref', 'address', 'price', 'bba']
+
+# snapshot     - the snapshot name of the run e.g. '20210301T093000'
+# daft_df      - the normalized, de-duplicated properties of the snapshot
+# delta_df     - the new, price changed and delisted properties since the last snapshot (None for the first run)
+# report       - the RunReport of the run (see daft_metrics.py)
+ScrapeResult = collections.namedtuple('ScrapeResult', ['snapshot', 'daft_df', 'delta_df', 'report'])
+
+
+def listing_frames(listings, report=None):
+    """
+    The (ads_df, sp_df) DataFrames of Sections 2 and 3: one row per "normal" ad with a '/for-sale' link, and one
+    row per property (sub unit) of each "special" ad, each keyed by listing_id. The ads dropped and the properties
+    with no bed/bath/area text are counted in report (a RunReport), if given.
+    """
+    ads_df = pd.DataFrame([(ad.listing_id, ad.href, ad.address, ad.price, ad.bba) for ad in listings
+                           if not ad.special], columns=LISTING_FRAME_COLUMNS)
+    sp_df = pd.DataFrame([(ad.listing_id, unit.href, ad.address, unit.price, unit.bba)
+                          for ad in listings if ad.special for unit in ad.sub_units], columns=LISTING_FRAME_COLUMNS)
+    for df in (ads_df, sp_df):
+        df.insert(0, 'listing_id', listing_ids(df['ref'], df['join_value']))
+    # Only the "normal" ads whose link starts with '/for-sale' are the properties we are interested in
+    n_ads = len(ads_df)
+    ads_df = ads_df.loc[ads_df['ref'].fillna('').str.startswith(KEPT_HREF_PREFIX)].reset_index(drop=True)
+    if report is not None:
+        report.drop('for_sale_href', n_ads, len(ads_df))
+        report.count('empty_bba', (ads_df['bba'] == '').sum() + (sp_df['bba'] == '').sum())
+    return ads_df, sp_df
+
+
+def merge_frames(frames, report=None):
+    """
+    The normalized frames (see normalize_listings) of Sections 2 and 3 as one daft_df with one row per listing_id,
+    the 'join_value' and 'ref' columns dropped. The duplicates dropped and the rows with no euro price or no county
+    are counted in report (a RunReport), if given.
+    """
+    daft_df = pd.concat(frames, ignore_index=True).drop(columns=['join_value', 'ref'])
+    n_rows = len(daft_df)
+    daft_df = daft_df.drop_duplicates(subset=['listing_id'])
+    if report is not None:
+        report.drop('duplicate_listing_id', n_rows, len(daft_df))
+        report.count('no_price_eur', daft_df['price_eur'].isna().sum())
+        report.count('no_county', (daft_df['county'].fillna('') == '').sum())
+    return daft_df
+
+
+class Scraper:
+    """
+    scraper = Scraper(cache_dir='page_cache', store_dir='snapshots', index_dir='price_index')
+    result = scraper.run('full')                        # or 'incremental', or 'replay' with snapshot=...
+    scraper.close()
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, store_dir=DEFAULT_STORE_DIR, index_dir=DEFAULT_INDEX_DIR,
+                 parser='auto', workers=1, files_dir='Files', fetcher_options=None, planner_options=None,
+                 gazetteer_cache=None):
+        self.workers = workers or 1
+        self.parser = parser
+        # The ParsePool's workers are forked, so they are started first, before pyarrow (the SnapshotStore) or the
+        # fetcher can have started any threads
+        self._parse_pool = ParsePool(self.workers, parser) if self.workers > 1 and CAN_FORK else None
+        self.cache = PageCache(cache_dir)
+        self.store = SnapshotStore(store_dir)
+        self.index_dir = index_dir
+        self.backend = get_backend(parser)
+        self.files_dir = files_dir
+        self.fetcher_options = dict(max_workers=8, per_host=8, retries=3, backoff=0.5, **(fetcher_options or {}))
+        # e.g. base_url= to crawl a stand-in for the site, see CrawlPlanner
+        self.planner_options = dict(planner_options or {})
+        # The gazetteer which normalize_listings resolves the addresses with, optionally from a compiled index cache
+        self.gazetteer = get_gazetteer(gazetteer_cache)
+        self.runs = 0
+        self._fetcher = None
+        self._index = None
+
+    @property
+    def fetcher(self):
+        """The PageFetcher, created on the first live run and kept open (with its connections) after it."""
+        if self._fetcher is None:
+            self._fetcher = PageFetcher(**self.fetcher_options)
+        return self._fetcher
+
+    @property
+    def parse_pool(self):
+        """The ParsePool (None with one worker or no fork), its worker processes stay up between runs."""
+        return self._parse_pool
+
+    @property
+    def index(self):
+        """The PriceIndex, read from disk once then kept up to date by each run."""
+        if self._index is None:
+            self._index = PriceIndex(self.index_dir)
+        return self._index
+
+    def _shards(self, mode, snapshot, report):
+        if mode == 'replay':
+            return group_shards(self.cache.urls(snapshot), self.cache.replay(snapshot, raw=self.parse_pool is not None))
+        report.start('plan')
+        plan = CrawlPlanner(self.fetcher, self.backend, **self.planner_options).plan()
+        report.stop('plan')
+        report.info.update(planned_properties=plan.planned, planned_pages=plan.pages, probe_requests=plan.probes)
+        return ((shard.key, self.cache.record(snapshot, shard.urls, pages)) for shard, pages in
+                plan.iter_shards(self.fetcher))
+
+    def _listings(self, shards, crawl, report):
+        listings = []
+        for key, pages in shards:
+            pages = report.timed_iter('fetch', pages, size=page_bytes)
+            pool = self.parse_pool
+            page_listings = pool.iter_page_listings(pages) if pool else iter_page_listings(pages, self.backend)
+            page_listings = report.timed_iter('parse', page_listings)
+            if crawl is not None:
+                page_listings = crawl.pages(page_listings, key)
+            listings.extend(ad for page in page_listings for ad in page)
+        return listings
+
+    def run(self, mode='full', snapshot=None, csv=None, profile=None, trace_stages=False):
+        """
+        Run one scrape and return a ScrapeResult.
+          mode     - 'full', 'incremental' (stop paginating at the first page of known properties) or 'replay'
+                     (re-run a snapshot from the page cache, no network, snapshot is required)
+          csv      - also write the snapshot out as a csv file
+          profile  - the name of a stage to run cProfile over (see daft_metrics.py)
+          trace_stages - print the start and stop of every stage, to line up the samples of a py-spy recording
+        The delta and the run report are written to files_dir.
+        """
+        if mode not in MODES:
+            raise ValueError('unknown mode %r, expected one of %s' % (mode, ', '.join(MODES)))
+        if mode == 'replay' and not snapshot:
+            raise ValueError('a replay needs the name of the snapshot to replay')
+        snapshot = snapshot or snapshot_name()
+        report = RunReport(snapshot, profile=profile, verbose=trace_stages)
+        report.info['mode'] = mode
+        fetched = (self.fetcher.stats.pages, self.fetcher.stats.bytes) if self._fetcher is not None else (0, 0)
+
+        previous = self.store.latest(before=snapshot)
+        crawl = IncrementalCrawl(previous, stop_early=mode == 'incremental') if previous is not None else None
+        listings = self._listings(self._shards(mode, snapshot, report), crawl, report)
+        if crawl is not None and crawl.stopped_early:
+            report.info.update(stopped_after_pages=crawl.pages_seen, stopped_shards=len(crawl.stopped_shards))
+        if mode != 'replay':
+            # The fetcher's totals run on across runs, only this run's share is reported
+            report.info.update(pages_downloaded=self.fetcher.stats.pages - fetched[0],
+                               bytes_downloaded=self.fetcher.stats.bytes - fetched[1])
+            self.cache.evict()
+
+        with report.stage('extract'):
+            ads_df, sp_df = listing_frames(listings, report)
+        with report.stage('normalize'):
+            frames = [normalize_listings(ads_df), normalize_listings(sp_df)]
+
+        with report.stage('merge'):
+            daft_df = merge_frames(frames, report)
+            delta_df = None
+            if crawl is not None:
+                daft_df, delta_df = crawl.finish(daft_df)
+                for change, n in delta_df['change'].value_counts().items():
+                    report.count('delta_' + change, n)
+
+        with report.stage('write'):
+            os.makedirs(self.files_dir, exist_ok=True)
+            if delta_df is not None:
+                delta_df.to_csv(os.path.join(self.files_dir, 'daft_delta_' + snapshot + '.csv'), index=False,
+                                header=True)
+            self.store.write(daft_df, snapshot)
+            if csv:
+                daft_df.to_csv(csv, index=False, header=True)
+        report.count('rows_written', len(daft_df))
+        with report.stage('index'):
+            self.index.update(self.store)
+
+        self.runs += 1
+        report.write_json(os.path.join(self.files_dir, 'run_' + snapshot + '.json'))
+        return ScrapeResult(snapshot, daft_df, delta_df, report)
+
+    def close(self):
+        if self._parse_pool is not None:
+            self._parse_pool.close()
+            self._parse_pool = None
+        if self._fetcher is not None:
+            self._fetcher.close()
+            self._fetcher = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
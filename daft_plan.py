@@ -0,0 +1,344 @@
+################################################################################################################
+# Plan - result count aware pagination, sharded by county and price band
+################################################################################################################
+
+# Section 2 used to request a fixed range of offsets (from=0 to from=15000 in steps of 20). When fewer properties
+# are for sale the last pages are empty requests, when more are for sale the properties after offset 15,000 are
+# silently missed, and the whole crawl is one long chain of offsets.
+# Every search page of Daft.ie says how many properties match the search ("13,855 Properties for Sale in
+# Ireland"), so before fetching starts the CrawlPlanner:
+#   1. asks for the first national page with the largest page size the site will honour (PAGE_SIZES is tried
+#      largest first, a size is honoured when the page holds that many listings) and reads the total count
+#   2. reads the count of every county (LOCATIONS). When the site has a search for only the properties with no
+#      price (unpriced_search, UNPRICED_PARAM), counties with more than split_at properties are split further into
+#      price bands (PRICE_BANDS), a band still holding more than split_at properties is split in two again, and
+#      the unpriced properties (e.g. "Price on Application"), which are in none of the bands, are one more shard.
+#      Without such a search the unpriced properties could only be reached by crawling the county's own search
+#      on top of its bands, fetching every priced property twice, so a county is then always one shard (its
+#      offsets are known from its count either way)
+#   3. works out the exact offsets of each shard from its count, so each shard stops as soon as its count is met
+# A warning is given when the shards do not add up to the national count, e.g. properties in none of LOCATIONS.
+# The first page of every shard was already fetched to read its count and is not fetched again. All of the pages
+# of all of the shards are known up front, so the fetcher keeps requests for several shards in flight at once.
+#   plan = CrawlPlanner(fetcher).plan()
+#   for shard, pages in plan.iter_shards(fetcher):
+#       ...
+
+import collections
+import itertools
+import re
+import warnings
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pandas as pd
+
+from daft_parse import get_backend
+
+SEARCH_URL = 'https://www.daft.ie/property-for-sale/'
+NATIONAL = 'ireland'
+
+# Largest first
+PAGE_SIZES = (100, 50, 20)
+
+# The location part of the search url of each county, in the order of COUNTY_LST (daft_normalize.py). The Dublin
+# postal districts are all under 'dublin'.
+LOCATIONS = ['antrim', 'armagh', 'carlow', 'cavan', 'clare', 'cork', 'derry', 'donegal', 'down', 'dublin',
+             'fermanagh', 'galway', 'kerry', 'kildare', 'kilkenny', 'laois', 'leitrim', 'limerick', 'longford',
+             'louth', 'mayo', 'meath', 'monaghan', 'offaly', 'roscommon', 'sligo', 'tipperary', 'tyrone',
+             'waterford', 'westmeath', 'wexford', 'wicklow']
+
+# The search parameter (set to 'true') which restricts a search to the properties with no price. Daft.ie is not
+# known to have one, CrawlPlanner(unpriced_search=True) is for a site which does (e.g. the benchmarks' stand-in)
+UNPRICED_PARAM = 'priceOnApplication'
+
+# The lower bound of each price band in euro, the last band has no upper bound
+PRICE_BANDS = [0, 150000, 200000, 250000, 300000, 350000, 400000, 500000, 650000, 1000000]
+
+# A band holding more than split_at properties is split in two, up to MAX_SPLITS times and no narrower than
+# MIN_BAND_WIDTH euro
+MAX_SPLITS = 6
+MIN_BAND_WIDTH = 10000
+
+# The number of results of a search, from the page's embedded search data or its heading
+RESULT_COUNT_PATTERNS = [re.compile(r'"totalResults"\s*:\s*(\d+)'),
+                         re.compile(r'data-testid="search-h1"[^>]*>\s*([\d,]+)')]
+
+
+def result_count(html):
+    """The number of properties matching the search of a page, or None if the page does not say."""
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    for pattern in RESULT_COUNT_PATTERNS:
+        match = pattern.search(html)
+        if match:
+            return int(match.group(1).replace(',', ''))
+    return None
+
+
+def search_url(location=NATIONAL, page_size=20, offset=0, price_from=None, price_to=None,
+               base_url=SEARCH_URL, unpriced=False):
+    """
+    The url of one search page, e.g. .../property-for-sale/cork?pageSize=50&from=100&salePrice_from=150000, of the
+    properties with no price only if unpriced.
+    """
+    params = [('pageSize', page_size), ('from', offset)]
+    if price_from:
+        params.append(('salePrice_from', price_from))
+    if price_to:
+        params.append(('salePrice_to', price_to))
+    if unpriced:
+        params.append((UNPRICED_PARAM, 'true'))
+    return base_url + location + '?' + urlencode(params)
+
+
+def shard_key(url):
+    """The search of a page url with the offset taken out, every page of a shard has the same key."""
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k != 'from'])
+    return urlunsplit(parts._replace(query=query))
+
+
+def search_of(url):
+    """(location, price_from, price_to) of the search of a page url, e.g. ('cork', 150000, 199999)."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    price_from, price_to = query.get('salePrice_from'), query.get('salePrice_to')
+    return (parts.path.rstrip('/').rsplit('/', 1)[-1], int(price_from) if price_from else None,
+            int(price_to) if price_to else None)
+
+
+def county_locations(county):
+    """The LOCATIONS value of each county column value ('Co. Cork' -> 'cork', 'Dublin 6W' -> 'dublin'), else ''."""
+    location = county.fillna('').astype(str).str.replace('Co. ', '', regex=False).str.lower()
+    location = location.str.replace(r'^dublin.*', 'dublin', regex=True)
+    return location.where(location.isin(LOCATIONS), '')
+
+
+def in_search(df, url):
+    """
+    Whether the search of a page url (any page of a shard, or its shard_key) finds each row of a normalized
+    DataFrame, from its county and price_eur. A row with no known county could be in any search so is counted in.
+    """
+    location, price_from, price_to = search_of(url)
+    found = pd.Series(True, index=df.index)
+    if location != NATIONAL:
+        rows_location = county_locations(df['county'])
+        found &= (rows_location == location) | (rows_location == '')
+    if price_from is not None:
+        found &= df['price_eur'] >= price_from
+    if price_to is not None:
+        found &= df['price_eur'] <= price_to
+    if dict(parse_qsl(urlsplit(url).query)).get(UNPRICED_PARAM) == 'true':
+        found &= df['price_eur'].isna()
+    return found.fillna(False).astype(bool)
+
+
+def split_band(price_from, price_to):
+    """The two halves of a price band (the bounds as in Shard, None for no bound), or None if it is too narrow."""
+    low = price_from or 0
+    if price_to is None:
+        # The top band has no upper bound, it is split at twice its lower bound
+        middle = max(2 * low, PRICE_BANDS[1])
+        return [(price_from, middle - 1), (middle, None)]
+    middle = (low + price_to + 1) // 2 // 1000 * 1000
+    if middle - low < MIN_BAND_WIDTH or price_to + 1 - middle < MIN_BAND_WIDTH:
+        return None
+    return [(price_from, middle - 1), (middle, price_to)]
+
+
+def group_shards(urls, pages):
+    """
+    Yield (shard key, pages) for each run of pages of the same shard, e.g. for a snapshot replayed from the page
+    cache: group_shards(cache.urls(snapshot), cache.replay(snapshot)).
+    """
+    for key, group in itertools.groupby(zip(urls, pages), key=lambda pair: shard_key(pair[0])):
+        yield key, (html for _, html in group)
+
+
+class Shard:
+    """One independent search (a location and optionally a price band) and the urls of all of its pages."""
+
+    def __init__(self, location, count, page_size, price_from=None, price_to=None, first_page=None,
+                 base_url=SEARCH_URL, unpriced=False):
+        self.location = location
+        self.count = count
+        self.price_from = price_from
+        self.price_to = price_to
+        self.unpriced = unpriced
+        self.first_page = first_page
+        # One page per page_size properties, at least one page so that an empty search is still recorded
+        self.urls = [search_url(location, page_size, offset, price_from, price_to, base_url, unpriced)
+                     for offset in range(0, max(count, 1), page_size)]
+
+    @property
+    def key(self):
+        """The shard_key of the shard's pages, as group_shards gives for a replayed snapshot."""
+        return shard_key(self.urls[0])
+
+    @property
+    def name(self):
+        if self.unpriced:
+            return self.location + ' unpriced'
+        if self.price_from is None and self.price_to is None:
+            return self.location
+        return '%s %s-%s' % (self.location, self.price_from or 0, self.price_to or '')
+
+    def __repr__(self):
+        return 'Shard(%s, %d properties, %d pages)' % (self.name, self.count, len(self.urls))
+
+
+class CrawlPlan:
+    """The page size, the national result count and the shards of a crawl, see CrawlPlanner."""
+
+    def __init__(self, page_size, total, shards, probes):
+        self.page_size = page_size
+        self.total = total
+        self.shards = shards
+        self.probes = probes
+
+    @property
+    def planned(self):
+        """The number of properties the shards add up to."""
+        return sum(shard.count for shard in self.shards)
+
+    @property
+    def pages(self):
+        return sum(len(shard.urls) for shard in self.shards)
+
+    def urls(self):
+        """Every page url of every shard, shard by shard."""
+        return [url for shard in self.shards for url in shard.urls]
+
+    def __str__(self):
+        return ('%d properties (%d in the shards) in %d shards of pageSize=%d: %d pages, %d probe requests'
+                % (self.total, self.planned, len(self.shards), self.page_size, self.pages, self.probes))
+
+    def iter_shards(self, fetcher):
+        """
+        Yield (shard, pages) for each shard in order, where pages yields the html of each page of the shard.
+
+        The pages of every shard go through one fetcher.iter_pages call, so the fetcher works ahead into the
+        following shards while one is being read. A shard the caller stops reading part way through (e.g. an
+        incremental crawl reaching known properties) is stopped: none of its remaining pages are requested and any
+        already in flight are thrown away.
+        """
+        submitted = collections.Counter()
+        stopped = set()
+
+        def remaining_urls():
+            for i, shard in enumerate(self.shards):
+                for url in shard.urls[1:]:
+                    if i in stopped:
+                        break
+                    submitted[i] += 1
+                    yield url
+
+        fetched = fetcher.iter_pages(remaining_urls())
+        consumed = collections.Counter()
+
+        def shard_pages(i, shard):
+            yield shard.first_page
+            while consumed[i] < len(shard.urls) - 1:
+                consumed[i] += 1
+                yield next(fetched)
+
+        try:
+            for i, shard in enumerate(self.shards):
+                yield shard, shard_pages(i, shard)
+                # The caller has moved on, skip whatever is left of this shard
+                stopped.add(i)
+                while consumed[i] < submitted[i]:
+                    consumed[i] += 1
+                    next(fetched)
+        finally:
+            fetched.close()
+
+
+class CrawlPlanner:
+    """
+    Plan a crawl from the result counts of the search pages.
+
+    plan = CrawlPlanner(fetcher).plan()
+    print(plan)
+    """
+
+    def __init__(self, fetcher, backend=None, page_sizes=PAGE_SIZES, locations=LOCATIONS, price_bands=PRICE_BANDS,
+                 split_at=1000, base_url=SEARCH_URL, unpriced_search=False):
+        self.fetcher = fetcher
+        self.backend = backend or get_backend()
+        self.page_sizes = page_sizes
+        self.locations = locations
+        self.price_bands = price_bands
+        self.split_at = split_at
+        self.base_url = base_url
+        # Whether the site honours UNPRICED_PARAM, counties are only split into price bands if it does
+        self.unpriced_search = unpriced_search
+        self.probes = 0
+
+    def _fetch(self, urls):
+        pages = list(self.fetcher.iter_pages(urls))
+        self.probes += len(pages)
+        return pages
+
+    def _count(self, html, url):
+        count = result_count(html)
+        if count is None:
+            raise ValueError('could not read the number of results from %s, the RESULT_COUNT_PATTERNS in '
+                             'daft_plan.py may need updating' % url)
+        return count
+
+    def probe_page_size(self):
+        """(page size, national result count): the largest of page_sizes which the site honours."""
+        total = None
+        for page_size in self.page_sizes:
+            url = search_url(NATIONAL, page_size, base_url=self.base_url)
+            html = self._fetch([url])[0]
+            total = self._count(html, url)
+            root = self.backend.parse(html)
+            cards = len(self.backend.cards(root))
+            self.backend.release(root)
+            if cards >= min(page_size, total):
+                return page_size, total
+        return self.page_sizes[-1], total
+
+    def _probe(self, page_size, searches, unpriced=False):
+        """A Shard, with its first page, for each (location, price_from, price_to) of searches."""
+        urls = [search_url(location, page_size, 0, price_from, price_to, self.base_url, unpriced)
+                for location, price_from, price_to in searches]
+        return [Shard(location, self._count(html, url), page_size, price_from, price_to, html, self.base_url,
+                      unpriced)
+                for (location, price_from, price_to), url, html in zip(searches, urls, self._fetch(urls))]
+
+    def _split(self, page_size, location, bands, depth=0):
+        """The Shards of the price bands of a location, a band over split_at is split in two again (split_band)."""
+        shards = []
+        for shard in self._probe(page_size, [(location, low, high) for low, high in bands]):
+            halves = None
+            if shard.count > self.split_at and depth < MAX_SPLITS:
+                halves = split_band(shard.price_from, shard.price_to)
+            shards.extend(self._split(page_size, location, halves, depth + 1) if halves else [shard])
+        return shards
+
+    def plan(self):
+        page_size, total = self.probe_page_size()
+        bands = [(low or None, high - 1 if high else None)
+                 for low, high in zip(self.price_bands, self.price_bands[1:] + [None])]
+
+        shards = []
+        counties = self._probe(page_size, [(location, None, None) for location in self.locations])
+        large = [county.location for county in counties if county.count > self.split_at and self.unpriced_search]
+        # The properties with no price are in none of the bands, they are one more shard of each split county
+        unpriced = dict(zip(large, self._probe(page_size, [(location, None, None) for location in large],
+                                               unpriced=True)))
+        for county in counties:
+            if county.location not in unpriced:
+                shards.append(county)
+                continue
+            shards.extend(self._split(page_size, county.location, bands))
+            if unpriced[county.location].count:
+                shards.append(unpriced[county.location])
+        plan = CrawlPlan(page_size, total, shards, self.probes)
+        if plan.planned != total:
+            warnings.warn('the shards of the crawl add up to %d properties but %d are for sale, some properties may '
+                          'be missed (e.g. in a location not in LOCATIONS)' % (plan.planned, total))
+        return plan
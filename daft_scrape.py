@@ -0,0 +1,245 @@
+################################################################################################################
+# daft-scrape - command line entry point and long-running scheduler
+################################################################################################################
+
+# Run a scrape without going through the step by step walkthrough of Daft_webscrape_script.py:
+#   daft-scrape full                          # (or python daft_scrape.py full) scrape every property
+#   daft-scrape incremental                   # stop at the first page of properties already in the last snapshot
+#   daft-scrape replay 20210301T093000        # re-run a cached snapshot with no network access
+#   daft-scrape status                        # the snapshots in the page cache and the store, and the next run
+#   daft-scrape daemon --every-days 3         # stay resident and scrape every 3 days
+# Only the standard library is imported up front, pandas, numpy, bs4, pyarrow etc. are imported by the commands
+# which need them (daft_pipeline.py), so --help and status start in a fraction of the time of a scrape.
+# The daemon imports everything once and keeps one Scraper (see daft_pipeline.py) for all of its runs: the HTTP
+# session, parser backend, parse worker processes, price index and compiled regexes stay warm between the 3 day
+# refresh runs. It stops cleanly (after the run in progress) on SIGINT or SIGTERM.
+# An incremental run does not see the price changes on the pages after it stopped, nor the delistings in the shards
+# it stopped in, so the daemon makes every --full-every'th run a full one, starting with its first run.
+# After each run the daemon writes <files-dir>/daemon_state.json: the snapshot, mode and outcome of the last run it
+# attempted. The next run is due --every-days after the later of that run and the latest snapshot in the store, or
+# --retry-minutes after a run which failed or found no properties (and so may not have written a snapshot).
+
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from daft_cache import DEFAULT_CACHE_DIR, PageCache, snapshot_name
+from daft_metrics import STAGES
+
+# Kept in step with daft_aggregates.py and daft_store.py, which are not imported here as they import pandas
+DEFAULT_INDEX_DIR = 'price_index'
+DEFAULT_STORE_DIR = 'snapshots'
+
+SNAPSHOT_FORMAT = '%Y%m%dT%H%M%S'
+DAEMON_STATE_FILE = 'daemon_state.json'
+
+
+def store_snapshots(store_dir):
+    """The snapshot names in a SnapshotStore, from its file names (part-<snapshot>-<i>.parquet) alone."""
+    names = set()
+    for _, _, files in os.walk(store_dir):
+        for name in files:
+            if name.startswith('part-') and name.endswith('.parquet'):
+                names.add(name[len('part-'):].rsplit('-', 1)[0])
+    return sorted(names)
+
+
+def read_state(files_dir):
+    """The daemon's record of the last run it attempted (see run_scheduled), or None before its first run."""
+    try:
+        with open(os.path.join(files_dir, DAEMON_STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_state(files_dir, state):
+    os.makedirs(files_dir, exist_ok=True)
+    path = os.path.join(files_dir, DAEMON_STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def next_run(store_dir, every_days, now=None, state=None, retry_minutes=60):
+    """
+    When the next scheduled run is due: retry_minutes after the last run attempted (state) if it failed, otherwise
+    every_days after the later of that run and the latest snapshot in the store (now if there is neither).
+    """
+    now = now or datetime.datetime.now()
+    if state is not None and state['failed']:
+        due = datetime.datetime.fromisoformat(state['finished']) + datetime.timedelta(minutes=retry_minutes)
+        return max(due, now)
+    snapshots = store_snapshots(store_dir) + ([state['snapshot']] if state is not None else [])
+    if not snapshots:
+        return now
+    due = datetime.datetime.strptime(max(snapshots), SNAPSHOT_FORMAT) + datetime.timedelta(days=every_days)
+    return max(due, now)
+
+
+def scheduled_mode(state, mode, full_every):
+    """The mode of the daemon's next run: mode, but full for every full_every'th run (never if 0) and the first."""
+    if mode == 'full' or not full_every:
+        return mode
+    if state is None or state['since_full'] is None:
+        return 'full'
+    return 'full' if state['since_full'] + 1 >= full_every else mode
+
+
+def make_scraper(args):
+    from daft_pipeline import Scraper
+
+    return Scraper(cache_dir=args.cache_dir, store_dir=args.store_dir, index_dir=args.index_dir,
+                   parser=args.parser, workers=args.workers, files_dir=args.files_dir,
+                   gazetteer_cache=args.gazetteer_cache)
+
+
+def print_result(result, args):
+    print('%s: %d properties in snapshot %s' % (result.report.info['mode'], len(result.daft_df), result.snapshot))
+    if result.delta_df is not None:
+        print(result.delta_df['change'].value_counts().to_string())
+    print(result.report)
+    if args.prometheus:
+        result.report.write_prometheus(args.prometheus)
+    if args.profile:
+        path = os.path.join(args.files_dir, 'profile_%s_%s.prof' % (args.profile, result.snapshot))
+        print(result.report.write_profile(path))
+
+
+def cmd_run(args):
+    with make_scraper(args) as scraper:
+        result = scraper.run(args.command, snapshot=getattr(args, 'snapshot', None), csv=args.csv,
+                             profile=args.profile, trace_stages=args.trace_stages)
+        print_result(result, args)
+
+
+def cmd_status(args):
+    cache_dir = args.cache_dir
+    cached = PageCache(cache_dir).snapshots() if os.path.isdir(cache_dir) else []
+    stored = store_snapshots(args.store_dir)
+    print('page cache %s: %d snapshots%s' % (cache_dir, len(cached), ', latest ' + cached[-1] if cached else ''))
+    print('store %s: %d snapshots%s' % (args.store_dir, len(stored), ', latest ' + stored[-1] if stored else ''))
+    state = read_state(args.files_dir)
+    if state is not None:
+        print('last daemon run: %s %s, %s' % (state['mode'], state['snapshot'], 'failed' if state['failed'] else
+                                               '%d properties' % state['rows']))
+    due = next_run(args.store_dir, args.every_days, state=state, retry_minutes=args.retry_minutes)
+    print('next scheduled run (every %g days): %s' % (args.every_days, due.isoformat(' ', 'seconds')))
+
+
+def run_scheduled(scraper, mode, state, args):
+    """Run one scrape of the daemon, print it and record it as the daemon's state, returns the new state."""
+    snapshot = snapshot_name()
+    rows = None
+    try:
+        result = scraper.run(mode, snapshot=snapshot, csv=args.csv, profile=args.profile,
+                             trace_stages=args.trace_stages)
+        print_result(result, args)
+        rows = len(result.daft_df)
+        if not rows:
+            print('no properties found, retrying in %g minutes' % args.retry_minutes)
+    except Exception:
+        # A failed run (e.g. the site is down) does not stop the daemon, it tries again later
+        traceback.print_exc()
+        print('run failed, retrying in %g minutes' % args.retry_minutes)
+    failed = not rows
+    # The number of incremental runs since the last full one (None until a full run has been made)
+    since_full = state['since_full'] if state is not None else None
+    if not failed:
+        since_full = 0 if mode == 'full' else None if since_full is None else since_full + 1
+    state = {'snapshot': snapshot, 'mode': mode, 'finished': datetime.datetime.now().isoformat(' ', 'seconds'),
+             'rows': rows, 'failed': failed, 'since_full': since_full}
+    write_state(args.files_dir, state)
+    return state
+
+
+def cmd_daemon(args):
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print('signal %d received, stopping after the current run' % signum)
+        stop.set()
+
+    handlers = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    started = time.perf_counter()
+    try:
+        with make_scraper(args) as scraper:
+            print('daemon ready in %.2fs (pid %d), %s scrape every %g days (full every %d runs)'
+                  % (time.perf_counter() - started, os.getpid(), args.mode, args.every_days, args.full_every))
+            runs = 0
+            while not stop.is_set() and (args.max_runs is None or runs < args.max_runs):
+                state = read_state(args.files_dir)
+                due = next_run(args.store_dir, args.every_days, state=state, retry_minutes=args.retry_minutes)
+                wait = (due - datetime.datetime.now()).total_seconds()
+                if wait > 0:
+                    print('next run at %s' % due.isoformat(' ', 'seconds'))
+                    if stop.wait(wait):
+                        break
+                run_scheduled(scraper, scheduled_mode(state, args.mode, args.full_every), state, args)
+                runs += 1
+                sys.stdout.flush()
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='directory of the page cache')
+    common.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='directory of the Parquet snapshot store')
+    common.add_argument('--index-dir', default=DEFAULT_INDEX_DIR, help='directory of the price index aggregates')
+    common.add_argument('--files-dir', default='Files', help='directory the delta csv and run reports go to')
+    common.add_argument('--gazetteer-cache', metavar='DIR',
+                        help='cache the compiled gazetteer in DIR (a trusted directory, see daft_gazetteer.py)')
+    common.add_argument('--parser', default='auto', choices=['auto', 'selectolax', 'lxml', 'html.parser'],
+                        help='html parser backend used to extract the ads (see daft_parse.py)')
+    common.add_argument('--workers', type=int, default=1,
+                        help='number of processes the pages are parsed in (1 parses them in this process)')
+    common.add_argument('--csv', metavar='PATH', help='also write each snapshot out as a csv file')
+    common.add_argument('--prometheus', metavar='PATH', help='also write the run report in the Prometheus format')
+    common.add_argument('--profile', metavar='STAGE', choices=STAGES,
+                        help='run cProfile over one stage of the run e.g. parse')
+    common.add_argument('--trace-stages', action='store_true',
+                        help='print the start and stop of every stage (with the pid) to line up py-spy samples')
+
+    parser = argparse.ArgumentParser(prog='daft-scrape', description='Scrape property price information from Daft.ie')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    commands.add_parser('full', parents=[common], help='scrape every property').set_defaults(func=cmd_run)
+    commands.add_parser('incremental', parents=[common],
+                        help='stop paginating at the first page of properties from the last snapshot'
+                        ).set_defaults(func=cmd_run)
+    replay = commands.add_parser('replay', parents=[common], help='re-run a cached snapshot with no network access')
+    replay.add_argument('snapshot', help='the snapshot name e.g. 20210301T093000')
+    replay.set_defaults(func=cmd_run)
+
+    schedule = argparse.ArgumentParser(add_help=False)
+    schedule.add_argument('--every-days', type=float, default=3, help='days between scheduled runs')
+    schedule.add_argument('--retry-minutes', type=float, default=60,
+                          help='wait before retrying a run which failed or found no properties')
+    commands.add_parser('status', parents=[common, schedule],
+                        help='list the cached and stored snapshots and when the next run is due'
+                        ).set_defaults(func=cmd_status)
+    daemon = commands.add_parser('daemon', parents=[common, schedule],
+                                 help='stay resident and scrape on a schedule')
+    daemon.add_argument('--mode', default='incremental', choices=['full', 'incremental'])
+    daemon.add_argument('--full-every', type=int, default=10, metavar='N',
+                        help='make every Nth run a full one with --mode incremental (0: never)')
+    daemon.add_argument('--max-runs', type=int, help='exit after this many runs')
+    daemon.set_defaults(func=cmd_daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
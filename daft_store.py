@@ -0,0 +1,170 @@
+################################################################################################################
+# Store - append-only, partitioned Parquet store of every scrape (snapshot) for trend analysis
+################################################################################################################
+
+# The script used to write daft_df.csv over the top of the previous run, with every column stored as text.
+# To look at price trends we need to keep every snapshot, so each run is now appended to a Parquet dataset
+# partitioned by the scrape date and the county (a run only ever replaces the files of its own snapshot):
+#   snapshots/scrape_date=2021-03-01/county=Dublin%206/part-20210301T093000-0.parquet
+# The county, property type, bed and bath text are stored as categoricals (dictionary encoded) and the price,
+# bed, bath and area as numbers, which makes the store a fraction of the size of the equivalent csv files.
+
+# Reading only the history of one county only opens the files under its county= partitions, and a date range
+# only opens the scrape_date= partitions in that range, e.g. "Dublin 6, 3 Bed, last 90 days":
+#   store.read(counties=['Dublin 6'], beds=[3], days=90, columns=['scrape_date', 'price_eur'])
+
+import datetime
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is only needed once the store is used
+    pa = None
+    ds = None
+
+DEFAULT_STORE_DIR = 'snapshots'
+
+# Properties with no county are stored under this partition (an empty partition value is read back as null)
+UNKNOWN_COUNTY = 'Unknown'
+
+CATEGORY_COLUMNS = ['bed', 'bath', 'prop_type']
+NUMERIC_DTYPES = {'price_eur': 'Int64', 'bed_n': 'Int16', 'bath_n': 'Int16', 'area_m2': 'float64'}
+
+
+def snapshot_date(snapshot):
+    """The scrape date ('YYYY-MM-DD') of a snapshot name such as '20210301T093000'."""
+    return datetime.datetime.strptime(snapshot, '%Y%m%dT%H%M%S').strftime('%Y-%m-%d')
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('the snapshot store requires the pyarrow package (pip install pyarrow)')
+
+
+class SnapshotStore:
+    """
+    store = SnapshotStore('snapshots')
+    store.write(daft_df, snapshot='20210301T093000')
+    previous = store.latest()
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        _require_pyarrow()
+        self.root = root
+        self._partitioning = ds.partitioning(
+            pa.schema([('scrape_date', pa.string()), ('county', pa.string())]),
+            flavor='hive')
+
+    def _dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=self._partitioning)
+
+    def write(self, df, snapshot, scrape_date=None):
+        """
+        Append one snapshot (the normalized, de-duplicated daft_df of a run).
+        snapshot is the run's timestamp (e.g. '20210301T093000'), scrape_date defaults to the date of snapshot.
+        Writing a snapshot which is already in the store (e.g. a --replay after a fix to the parser) replaces it.
+        """
+        scrape_date = scrape_date or snapshot_date(snapshot)
+        out = df.copy()
+        out['snapshot'] = snapshot
+        out['scrape_date'] = scrape_date
+        out['county'] = out['county'].astype(object).fillna('').astype(str).replace('', UNKNOWN_COUNTY)
+        for col in CATEGORY_COLUMNS:
+            out[col] = out[col].astype('category')
+        for col, dtype in NUMERIC_DTYPES.items():
+            out[col] = pd.to_numeric(out[col], errors='coerce').astype(dtype)
+        table = pa.Table.from_pandas(out, preserve_index=False)
+
+        # A new file name for each snapshot so no other snapshot is ever touched. The files of an earlier write of
+        # this snapshot are removed first, a part file left in a partition the new write does not reach would
+        # otherwise be read back alongside the new rows
+        self.delete(snapshot)
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(table, self.root, format='parquet', partitioning=self._partitioning,
+                         file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+                         basename_template='part-' + snapshot + '-{i}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+
+    def delete(self, snapshot):
+        """Remove the files of one snapshot (and any partition directories left empty), returns how many."""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        prefix = 'part-' + snapshot + '-'
+        for dir_path, _, files in os.walk(self.root, topdown=False):
+            for name in files:
+                if name.startswith(prefix) and name.endswith('.parquet'):
+                    os.remove(os.path.join(dir_path, name))
+                    removed += 1
+            if dir_path != self.root and not os.listdir(dir_path):
+                os.rmdir(dir_path)
+        return removed
+
+    def modified_times(self):
+        """{snapshot: the time (as os.path.getmtime) it was last written} of every snapshot, from one walk."""
+        times = {}
+        for dir_path, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    snapshot = name[len('part-'):].rsplit('-', 1)[0]
+                    times[snapshot] = max(times.get(snapshot, 0), os.path.getmtime(os.path.join(dir_path, name)))
+        return times
+
+    def snapshots(self):
+        """The snapshot names in the store, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        # Taken from the file names (part-<snapshot>-<i>.parquet) so that no data has to be read
+        names = (os.path.basename(path) for path in self._dataset().files)
+        return sorted({name[len('part-'):].rsplit('-', 1)[0] for name in names if name.startswith('part-')})
+
+    def read(self, columns=None, counties=None, beds=None, prop_types=None, since=None, until=None, days=None,
+             snapshots=None):
+        """
+        Read the rows which match every filter given (None means no filter) as a DataFrame.
+
+        columns          - the columns to read (all by default)
+        counties         - e.g. ['Dublin 6', 'Co. Cork']
+        beds             - numbers of bedrooms e.g. [3]
+        prop_types       - e.g. ['Semi-D', 'Detached']
+        since, until     - scrape dates ('YYYY-MM-DD' or datetime.date), inclusive
+        days             - the last n days, shorthand for since=today - days
+        snapshots        - snapshot names
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns or [])
+        if days is not None:
+            since = datetime.date.today() - datetime.timedelta(days=days)
+
+        conditions = []
+        if counties is not None:
+            conditions.append(ds.field('county').isin([c or UNKNOWN_COUNTY for c in counties]))
+        if beds is not None:
+            conditions.append(ds.field('bed_n').isin(list(beds)))
+        if prop_types is not None:
+            conditions.append(ds.field('prop_type').isin(list(prop_types)))
+        if since is not None:
+            conditions.append(ds.field('scrape_date') >= str(since))
+        if until is not None:
+            conditions.append(ds.field('scrape_date') <= str(until))
+        if snapshots is not None:
+            conditions.append(ds.field('snapshot').isin(list(snapshots)))
+
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+        df = self._dataset().to_table(columns=columns, filter=condition).to_pandas()
+        # The county only exists in the partition paths, it is read back as text
+        if 'county' in df.columns:
+            df['county'] = df['county'].replace(UNKNOWN_COUNTY, '').astype('category')
+        return df
+
+    def latest(self, columns=None, before=None):
+        """The most recent snapshot (older than the snapshot before, if given) as a DataFrame, or None."""
+        snapshots = [s for s in self.snapshots() if before is None or s < before]
+        if not snapshots:
+            return None
+        return self.read(columns=columns, snapshots=[snapshots[-1]], since=snapshot_date(snapshots[-1]))
@@ -0,0 +1,186 @@
+################################################################################################################
+# Valuation - fair price estimates for a book of properties from their nearest comparable listings (KNN)
+################################################################################################################
+
+# The README suggests using KNN to look at the 3-5 nearest properties with the same features as a property in the
+# bank's mortgage book, build a fair price from them and flag the properties which may need to be re-valued.
+# Comparing every property in the book with every listing (tens of thousands x 15,000) is far more work than
+# needed, as a comparable always has to be in the same county (or Dublin postal district). The listings of a
+# snapshot are therefore split into one block per county when the ValuationIndex is built, and each property of
+# the book is only ever compared with the listings of its own county block. Within a block the distances from a
+# whole chunk of book properties to every listing are worked out in one numpy operation.
+
+# The distance between two properties in the same county is made up of:
+#   bed_n, bath_n - the difference in the number of bedrooms and bathrooms, one bedroom/bathroom counts as 1
+#   area_m2       - the difference of the log of the areas, a 25% larger/smaller area counts as about 1
+#   prop_type     - PROP_TYPE_PENALTY when the property types differ, so a Semi-D is only compared with an
+#                   Apartment when there are not enough Semi-Ds in the county
+# A feature missing from either property (e.g. the area of a "special" ad) counts as MISSING_PENALTY.
+#   index = ValuationIndex(daft_df)                   # built once per snapshot
+#   estimates, comparables = index.value(book)        # book has county, prop_type, bed_n, bath_n, area_m2 columns
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 5
+
+# The size of a difference which counts as a distance of 1 for each numeric feature
+FEATURE_SCALES = {'bed_n': 1.0, 'bath_n': 1.0, 'log_area': 0.25}
+MISSING_PENALTY = 1.0
+PROP_TYPE_PENALTY = 2.0
+
+# The columns a book of properties needs
+BOOK_COLUMNS = ['county', 'prop_type', 'bed_n', 'bath_n', 'area_m2']
+
+# The columns of a listing returned with each comparable
+COMPARABLE_COLUMNS = ['listing_id', 'address', 'county', 'prop_type', 'bed_n', 'bath_n', 'area_m2', 'price_eur']
+
+# Book properties compared with a block at a time, keeps the distance matrix to a few MB
+CHUNK_CELLS = 2000000
+
+
+def _features(df):
+    """The scaled (n, 3) feature matrix of df, NaN where a feature is missing (float32 is plenty for ranking)."""
+    area = pd.to_numeric(df['area_m2'], errors='coerce').astype('float64').to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_area = np.where(area > 0, np.log(area), np.nan)
+    return np.column_stack([
+        pd.to_numeric(df['bed_n'], errors='coerce').astype('float64').to_numpy() / FEATURE_SCALES['bed_n'],
+        pd.to_numeric(df['bath_n'], errors='coerce').astype('float64').to_numpy() / FEATURE_SCALES['bath_n'],
+        log_area / FEATURE_SCALES['log_area'],
+    ]).astype('float32')
+
+
+def _text(series):
+    return series.astype(object).fillna('').astype(str).to_numpy()
+
+
+def distances(book_features, book_types, block_features, block_types):
+    """The (m, n) squared distances from m book properties to the n listings of one block."""
+    d2 = np.where(book_types[:, None] != block_types[None, :], np.float32(PROP_TYPE_PENALTY ** 2), np.float32(0))
+    # One (m, n) difference per feature, rather than one (m, n, 3) array, keeps the working memory small
+    for f in range(book_features.shape[1]):
+        diff = np.subtract.outer(book_features[:, f], block_features[:, f])
+        np.square(diff, out=diff)
+        diff[np.isnan(diff)] = MISSING_PENALTY ** 2
+        d2 += diff
+    return d2
+
+
+def _k_nearest(d2, k):
+    """
+    The column positions of the k smallest distances of each row of d2, nearest first. Equally near listings are
+    always picked in listing order (as a stable sort would) so the comparables do not depend on how the listings
+    are blocked, but without sorting each whole row.
+    """
+    kth = np.partition(d2, k - 1, axis=1)[:, k - 1:k]
+    closer = d2 < kth
+    tied = d2 == kth
+    # All of the listings nearer than the k-th distance plus the first of those tied with it to make up k
+    wanted = k - closer.sum(axis=1, keepdims=True)
+    chosen = closer | (tied & (np.cumsum(tied, axis=1) <= wanted))
+    found = np.nonzero(chosen)[1].reshape(len(d2), k)
+    order = np.argsort(np.take_along_axis(d2, found, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(found, order, axis=1)
+
+
+class ValuationIndex:
+    """
+    index = ValuationIndex(daft_df, k=5)
+    estimates, comparables = index.value(book)
+    """
+
+    def __init__(self, listings, k=DEFAULT_K):
+        self.k = k
+        # Only listings with a euro price can be used as comparables
+        listings = listings.loc[listings['price_eur'].notna()]
+        self.listings = listings[[c for c in COMPARABLE_COLUMNS if c in listings.columns]].reset_index(drop=True)
+        counties = _text(self.listings['county'])
+        features = _features(self.listings)
+        # The property types are compared as integer codes rather than as text
+        prop_types, uniques = pd.factorize(_text(self.listings['prop_type']))
+        self.prop_types = pd.Index(uniques)
+
+        # county -> (positions in self.listings, features, property type codes). Listings with no county are not
+        # put in a block, there is no telling which properties they are comparable with.
+        self.blocks = {}
+        for county, positions in pd.Series(counties).groupby(counties, sort=True).indices.items():
+            if county:
+                self.blocks[county] = (positions, features[positions], prop_types[positions])
+
+    @classmethod
+    def from_store(cls, store, snapshot=None, k=DEFAULT_K):
+        """Build the index from a snapshot of a SnapshotStore (the latest by default)."""
+        columns = COMPARABLE_COLUMNS
+        df = store.read(columns=columns, snapshots=[snapshot]) if snapshot else store.latest(columns=columns)
+        if df is None:
+            raise ValueError('the snapshot store %r is empty' % store.root)
+        return cls(df, k)
+
+    def value(self, book, k=None):
+        """
+        Value every property of book (a DataFrame with the BOOK_COLUMNS) in one call. Returns (estimates,
+        comparables):
+          estimates   - one row per book property (same index as book): 'estimate' (the median price of its
+                        comparables), 'mean', 'low', 'high', 'comparables' (how many were found) and 'distance'
+                        (the mean distance to them). Properties in a county with no listings are left null.
+          comparables - one row per book property and comparable: 'property' (the book index), 'rank' (1 is the
+                        nearest), 'distance' and the COMPARABLE_COLUMNS of the listing
+        """
+        k = k or self.k
+        n_book = len(book)
+        counties = _text(book['county'])
+        features = _features(book)
+        prop_types = self.prop_types.get_indexer(_text(book['prop_type']))
+
+        # The positions (into self.listings) and distances of the k nearest listings of each book property,
+        # -1 where there are fewer than k
+        nearest = np.full((n_book, k), -1, dtype=np.int64)
+        nearest_d2 = np.full((n_book, k), np.nan)
+        for county, rows in pd.Series(counties).groupby(counties, sort=False).indices.items():
+            if county not in self.blocks:
+                continue
+            positions, block_features, block_types = self.blocks[county]
+            kk = min(k, len(positions))
+            chunk = max(1, CHUNK_CELLS // len(positions))
+            for start in range(0, len(rows), chunk):
+                part = rows[start:start + chunk]
+                d2 = distances(features[part], prop_types[part], block_features, block_types)
+                found = _k_nearest(d2, kk)
+                nearest[part, :kk] = positions[found]
+                nearest_d2[part, :kk] = np.take_along_axis(d2, found, axis=1)
+
+        valid = nearest >= 0
+        prices = np.where(valid, self.listings['price_eur'].astype('float64').to_numpy()[nearest], np.nan)
+        with warnings.catch_warnings():
+            # Properties with no comparables are all-NaN rows, they are left null
+            warnings.simplefilter('ignore', RuntimeWarning)
+            estimates = pd.DataFrame({
+                'estimate': np.nanmedian(prices, axis=1),
+                'mean': np.nanmean(prices, axis=1),
+                'low': np.nanmin(prices, axis=1),
+                'high': np.nanmax(prices, axis=1),
+                'comparables': valid.sum(axis=1),
+                'distance': np.nanmean(np.sqrt(nearest_d2), axis=1),
+            }, index=book.index)
+
+        book_rows, ranks = np.nonzero(valid)
+        comparables = self.listings.take(nearest[book_rows, ranks]).reset_index(drop=True)
+        comparables.insert(0, 'property', book.index.to_numpy()[book_rows])
+        comparables.insert(1, 'rank', ranks + 1)
+        comparables.insert(2, 'distance', np.sqrt(nearest_d2[book_rows, ranks]))
+        return estimates, comparables
+
+
+def flag_revaluations(book_value, estimates, tolerance=0.2):
+    """
+    Compare the bank's value of each property with its estimate. Returns a DataFrame (same index) with the
+    'book_value', 'estimate', 'difference' (as a fraction of the estimate) and 'revalue', True where the two
+    differ by more than tolerance (20% by default).
+    """
+    out = pd.DataFrame({'book_value': book_value, 'estimate': estimates['estimate']})
+    out['difference'] = out['book_value'] / out['estimate'] - 1
+    out['revalue'] = out['difference'].abs() > tolerance
+    return out
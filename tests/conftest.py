@@ -0,0 +1,23 @@
+################################################################################################################
+# Tests - shared setup
+################################################################################################################
+
+# The modules are flat files at the top of the repo and the synthetic site and pages live in benchmarks/, both are
+# put on the path. Every test runs in its own temporary directory so that nothing (snapshots, caches) is written
+# into the checkout.
+#   python -m pytest -q
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,80 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from daft_aggregates import PriceIndex
+from daft_store import SnapshotStore
+from test_store import daft_df
+
+
+def prices(county, bed, prices, prop_type='Semi-D'):
+    return [(str(i), county, bed, prop_type, price) for i, price in enumerate(prices)]
+
+
+def test_ingest_summarises_each_cell():
+    index = PriceIndex('price_index')
+    cork = [200000, 250000, 300000, 350000, 1000000]
+    df = daft_df(prices('Co. Cork', 3, cork) + prices('Dublin 6', 2, [400000, 500000]) +
+                 prices('Dublin 6', 2, [None]))
+    assert index.ingest(df, '20210301T093000') == 2
+
+    summary = index.summary(by=['county', 'bed_n'])
+    assert summary.loc[('Co. Cork', 3), 'count'] == 5
+    assert summary.loc[('Co. Cork', 3), 'mean'] == pytest.approx(np.mean(cork))
+    assert summary.loc[('Co. Cork', 3), 'std'] == pytest.approx(np.std(cork, ddof=1))
+    assert summary.loc[('Co. Cork', 3), 'median'] == pytest.approx(300000, rel=index.alpha)
+    # The unpriced property is in no cell
+    assert summary.loc[('Dublin 6', 2), 'count'] == 2
+    assert index.pivot(stat='count').loc['Dublin 6', 2] == 2
+
+
+def test_reingesting_a_snapshot_replaces_it_and_the_index_is_reloaded():
+    index = PriceIndex('price_index')
+    index.ingest(daft_df(prices('Co. Cork', 3, [200000, 300000])), '20210301T093000')
+    index.ingest(daft_df(prices('Co. Cork', 3, [400000])), '20210301T093000')
+    assert index.summary()['count'].tolist() == [1]
+
+    reloaded = PriceIndex('price_index')
+    assert reloaded.snapshots() == ['20210301T093000']
+    assert reloaded.summary()['mean'].tolist() == [400000]
+
+
+def test_trend():
+    index = PriceIndex('price_index')
+    index.ingest(daft_df(prices('Dublin 6', 3, [500000, 500000])), '20210101T090000')
+    index.ingest(daft_df(prices('Dublin 6', 3, [550000, 550000])), '20210201T090000')
+    index.ingest(daft_df(prices('Dublin 6', 3, [600000]) + prices('Dublin 6', 2, [100000])), '20210301T090000')
+    index.ingest(daft_df(prices('Dublin 6', 3, [1])), '20200101T090000')
+
+    trend = index.trend('Dublin 6', bed=3, months=3)
+    assert trend.index.tolist() == ['20210101T090000', '20210201T090000', '20210301T090000']
+    assert trend['count'].tolist() == [2, 2, 1]
+    assert trend['mean_change'].tolist() == pytest.approx([0, 0.1, 0.2])
+    assert trend['median_change'].iloc[-1] == pytest.approx(0.2, abs=2 * index.alpha)
+
+
+def test_trend_and_pivot_of_an_empty_index():
+    index = PriceIndex('price_index')
+    assert len(index.trend('Dublin 6', bed=3)) == 0
+    assert index.pivot().empty
+
+
+def test_update_ingests_new_and_rewritten_snapshots():
+    store = SnapshotStore('snapshots')
+    index = PriceIndex('price_index')
+    store.write(daft_df(prices('Co. Cork', 3, [200000])), '20210301T093000')
+    store.write(daft_df(prices('Co. Cork', 3, [300000])), '20210308T093000')
+    assert index.update(store) == ['20210301T093000', '20210308T093000']
+    assert index.update(store) == []
+    assert PriceIndex('price_index').update(store) == []
+
+    # A --replay writes the snapshot to the store again, the index has to follow it
+    cells = index._path('cells', '20210301T093000')
+    os.utime(cells, (time.time() - 60, time.time() - 60))
+    store.write(daft_df(prices('Co. Cork', 3, [210000, 230000])), '20210301T093000')
+    assert index.update(store) == ['20210301T093000']
+    summary = index.summary()
+    assert summary.loc['20210301T093000', 'count'] == 2
+    assert summary.loc['20210301T093000', 'mean'] == 220000
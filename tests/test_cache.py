@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+from daft_cache import PageCache
+
+URLS = ['https://www.daft.ie/property-for-sale/ireland?pageSize=20&from=%d' % i for i in range(0, 60, 20)]
+PAGES = ['<html>page %d · €%d</html>' % (i, i * 1000) for i in range(3)]
+
+
+def objects(cache):
+    return sorted(name for _, _, files in os.walk(os.path.join(cache.cache_dir, 'objects')) for name in files)
+
+
+def record(cache, snapshot, urls=URLS, pages=PAGES):
+    return list(cache.record(snapshot, urls, iter(pages)))
+
+
+def test_record_passes_pages_through_and_replays_them_in_order():
+    cache = PageCache('page_cache')
+    assert record(cache, '20210301T090000') == PAGES
+    assert cache.snapshots() == ['20210301T090000'] == [cache.latest_snapshot()]
+    assert cache.urls('20210301T090000') == URLS
+    assert list(cache.replay('20210301T090000')) == PAGES
+    assert list(cache.replay('20210301T090000', raw=True)) == [page.encode('utf-8') for page in PAGES]
+    assert cache.get('20210301T090000', URLS[1]) == PAGES[1]
+    assert cache.get('20210301T090000', 'https://www.daft.ie/other') is None
+
+    # The manifest has one line per page, in the order the pages were fetched
+    with open(os.path.join('page_cache', 'snapshots', '20210301T090000.jsonl'), encoding='utf-8') as f:
+        manifest = [json.loads(line) for line in f]
+    assert [entry['url'] for entry in manifest] == URLS
+    assert [entry['sha256'] for entry in manifest] == [hashlib.sha256(page.encode('utf-8')).hexdigest()
+                                                       for page in PAGES]
+    assert all(entry['fetched'] <= time.time() for entry in manifest)
+
+
+def test_pages_are_content_addressed():
+    cache = PageCache('page_cache')
+    record(cache, '20210301T090000')
+    # The second snapshot has one page changed, only that page is stored again
+    record(cache, '20210304T090000', pages=PAGES[:2] + ['<html>changed</html>'])
+    digests = [hashlib.sha256(page.encode('utf-8')).hexdigest() for page in PAGES + ['<html>changed</html>']]
+    assert objects(cache) == sorted(digest + '.html.gz' for digest in digests)
+    assert list(cache.replay('20210301T090000')) == PAGES
+
+
+def test_replaying_a_missing_snapshot():
+    cache = PageCache('page_cache')
+    with pytest.raises(KeyError):
+        list(cache.replay('20210301T090000'))
+    with pytest.raises(KeyError):
+        cache.get('20210301T090000', URLS[0])
+    assert cache.latest_snapshot() is None
+
+
+def test_snapshots_older_than_the_ttl_are_evicted():
+    cache = PageCache('page_cache', ttl_days=30)
+    record(cache, '20210101T090000', pages=['<html>old %d</html>' % i for i in range(3)])
+    record(cache, '20210301T090000')
+    old_manifest = os.path.join('page_cache', 'snapshots', '20210101T090000.jsonl')
+    os.utime(old_manifest, (time.time() - 40 * 86400,) * 2)
+
+    assert cache.evict() == ['20210101T090000']
+    assert cache.snapshots() == ['20210301T090000']
+    # The old snapshot's pages were only referenced by it, they are deleted
+    assert len(objects(cache)) == 3
+    assert list(cache.replay('20210301T090000')) == PAGES
+
+
+def test_the_oldest_snapshots_are_evicted_to_fit_the_size_cap():
+    cache = PageCache('page_cache', max_bytes=10 ** 9)
+    for n, snapshot in enumerate(['20210301T090000', '20210304T090000', '20210307T090000']):
+        record(cache, snapshot, pages=[os.urandom(2000).hex() + str(n) for _ in URLS])
+    one_snapshot = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk('page_cache/objects')
+                       for f in files) // 3
+    cache.max_bytes = int(one_snapshot * 1.5)
+
+    assert cache.evict() == ['20210301T090000', '20210304T090000']
+    assert cache.snapshots() == ['20210307T090000'] and len(objects(cache)) == 3
+
+
+def test_the_latest_snapshot_is_never_evicted_for_size():
+    cache = PageCache('page_cache', max_bytes=1)
+    record(cache, '20210301T090000')
+    record(cache, '20210304T090000', pages=['<html>new %d</html>' % i for i in range(3)])
+    assert cache.evict() == ['20210301T090000']
+    assert list(cache.replay('20210304T090000')) == ['<html>new %d</html>' % i for i in range(3)]
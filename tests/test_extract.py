@@ -0,0 +1,51 @@
+import pytest
+
+from daft_extract import extract_page
+from daft_parse import get_backend
+from synthetic_corpus import SyntheticCorpus
+
+CARDS = ('<html><body><ul data-testid="results">'
+         '<li data-testid="result-3028614"><a href="/for-sale/1-main-street-cork/3028614">'
+         '<span class="TitleBlock__StyledSpan-sc-1avkvav-4 gDBFnc"> €250,000 </span>'
+         '<p class="TitleBlock__Address-sc-1avkvav-7 knPImU">1 Main Street, Co. Cork</p>'
+         '<div class="TitleBlock__CardInfo-sc-1avkvav-9 QvaxK">'
+         '<p class="TitleBlock__CardInfoItem-sc-1avkvav-8 bcaKbv">3 Bed</p>'
+         '<p class="TitleBlock__CardInfoItem-sc-1avkvav-8 bcaKbv">Semi-D</p></div></a></li>'
+         '<li data-testid="result-77"><a href="/new-homes-for-sale/the-grove/77">'
+         '<p class="TitleBlock__Address-sc-1avkvav-7 eARcqq">The Grove, Naas, Co. Kildare</p></a><ul>'
+         '<li data-testid="sub-unit-0"><a href="/for-sale/unit-0/7700">'
+         '<p class="SubUnit__Title-sc-10x486s-5 keXaVZ">€300,000</p>'
+         '<div class="SubUnit__CardInfoItem-sc-10x486s-7 AsGHw">3 Bed · 2 Bath</div></a></li>'
+         '<li data-testid="sub-unit-1"><a href="/for-sale/unit-1/7701">'
+         '<p class="SubUnit__Title-sc-10x486s-5 keXaVZ">€350,000</p>'
+         '<div class="SubUnit__CardInfoItem-sc-10x486s-7 AsGHw">4 Bed</div></a></li></ul></li>'
+         '<li data-testid="advert"><div>Mortgage advice</div></li>'
+         '</ul></body></html>')
+
+BACKENDS = ['html.parser', 'lxml', 'selectolax']
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_extract_page_reads_normal_and_special_ads(backend):
+    normal, special = extract_page(CARDS, get_backend(backend))
+
+    assert normal.listing_id == 'result-3028614'
+    assert normal.href == '/for-sale/1-main-street-cork/3028614'
+    assert normal.address == '1 Main Street, Co. Cork'
+    assert normal.price == '€250,000'
+    assert normal.bba.split('·') == ['3 Bed', 'Semi-D']
+    assert not normal.special
+
+    assert special.special
+    assert special.address == 'The Grove, Naas, Co. Kildare'
+    assert [(u.href, u.price, u.bba) for u in special.sub_units] == [
+        ('/for-sale/unit-0/7700', '€300,000', '3 Bed · 2 Bath'), ('/for-sale/unit-1/7701', '€350,000', '4 Bed')]
+
+
+def test_backends_agree_on_synthetic_pages():
+    corpus = SyntheticCorpus(60, special_share=0.2)
+    for html in corpus.iter_pages():
+        results = [extract_page(html, get_backend(name)) for name in BACKENDS]
+        assert len(results[0]) == corpus.page_size
+        assert results[1] == results[0]
+        assert results[2] == results[0]
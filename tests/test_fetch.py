@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+from daft_fetch import PageFetcher, search_urls
+from standin_server import StandinServer
+
+PAGES = ['<html><body>page %d · €%d</body></html>' % (i, i * 1000) for i in range(12)]
+
+
+def test_pages_come_back_in_the_order_of_the_urls():
+    with StandinServer(PAGES, latency=0.01) as server:
+        fetcher = PageFetcher(max_workers=6, per_host=6)
+        urls = search_urls(0, 20 * len(PAGES), 20, base_url=server.base_url)
+        assert fetcher.fetch_all(urls[::-1]) == PAGES[::-1]
+    assert fetcher.stats.pages == len(PAGES)
+    assert fetcher.stats.bytes == sum(len(page.encode('utf-8')) for page in PAGES)
+
+
+def test_requests_in_flight_are_capped_per_host():
+    with StandinServer(PAGES, latency=0.05) as server:
+        fetcher = PageFetcher(max_workers=8, per_host=2)
+        fetcher.fetch_all(search_urls(0, 20 * len(PAGES), 20, base_url=server.base_url))
+        assert server.max_in_flight == 2
+
+    with StandinServer(PAGES, latency=0.05) as server:
+        PageFetcher(max_workers=8, per_host=8).fetch_all(search_urls(0, 20 * 8, 20, base_url=server.base_url))
+        assert server.max_in_flight > 2
+
+
+def test_server_errors_are_retried_with_backoff():
+    with StandinServer(PAGES, errors={1: [503, 500]}) as server:
+        fetcher = PageFetcher(retries=3, backoff=0.05)
+        urls = search_urls(0, 60, 20, base_url=server.base_url)
+        assert fetcher.fetch_all(urls) == PAGES[:3]
+        assert server.requests == 5
+    assert fetcher.stats.retries == 2
+    # The backoff doubles after every attempt: 0.05s then 0.1s
+    assert fetcher.stats.elapsed >= 0.15
+
+
+def test_a_server_error_which_outlasts_the_retries_is_raised():
+    with StandinServer(PAGES, errors={0: [502] * 5}) as server:
+        fetcher = PageFetcher(retries=2, backoff=0.01)
+        with pytest.raises(requests.HTTPError):
+            fetcher.fetch(search_urls(0, 20, 20, base_url=server.base_url)[0])
+        assert server.requests == 3
+
+
+def test_a_client_error_is_raised_without_retrying():
+    with StandinServer(PAGES, errors={0: [404]}) as server:
+        fetcher = PageFetcher(retries=3, backoff=0.01)
+        with pytest.raises(requests.HTTPError) as error:
+            fetcher.fetch_all(search_urls(0, 40, 20, base_url=server.base_url))
+        assert error.value.response.status_code == 404
+        assert fetcher.stats.retries == 0
+
+
+def test_closing_the_stream_stops_requesting_pages():
+    with StandinServer(PAGES, latency=0.01) as server:
+        fetcher = PageFetcher(max_workers=2, per_host=2)
+        pages = fetcher.iter_pages(search_urls(0, 20 * 100, 20, base_url=server.base_url))
+        assert next(pages) == PAGES[0]
+        pages.close()
+        # Only the window of max_workers * 2 requests (and the one submitted as the first came back) went out
+        assert server.requests <= 2 * 2 + 1
@@ -0,0 +1,95 @@
+import os
+
+import pandas as pd
+import pytest
+
+from daft_gazetteer import GAZETTEER_FILE, TOWNS_FILE, Gazetteer, build_gazetteer, get_gazetteer
+from daft_normalize import COUNTY_LST
+
+TOWNS = pd.DataFrame([('Newbridge', 'Co. Kildare', '', 55), ('Newbridge', 'Co. Galway', '', 1),
+                      ('Rathmines', 'Co. Dublin', 'Dublin 6', 26), ('Swords', 'Co. Dublin', '', 68),
+                      ('Kinsale', 'Co. Cork', '', 61), ("St. Margaret's", 'Co. Dublin', '', 1)],
+                     columns=['name', 'county', 'district', 'weight'])
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    TOWNS.to_csv(tmp_path / 'gazetteer.csv', index=False)
+    return Gazetteer(str(tmp_path / 'gazetteer.csv'), cache_dir=str(tmp_path / 'cache'))
+
+
+def resolved(gazetteer, address):
+    return [tuple(row) for row in gazetteer.resolve(pd.Series([address])).to_numpy()]
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('1 Main Street, Kinsale, Co. Cork', ('Kinsale', 'Co. Cork', '', 'Co. Cork')),
+    ('1 Main Street, Kinsale, County Cork', ('Kinsale', 'Co. Cork', '', 'Co. Cork')),
+    ('1 Main Street, Kinsale', ('Kinsale', 'Co. Cork', '', 'Co. Cork')),
+    ('Apt 4, Rathmines, Dublin 6', ('Rathmines', 'Co. Dublin', 'Dublin 6', 'Dublin 6')),
+    ('Apt 4, Rathmines', ('Rathmines', 'Co. Dublin', 'Dublin 6', 'Dublin 6')),
+    ('Apt 4, Rathmines, Co Dublin', ('Rathmines', 'Co. Dublin', '', 'Co. Dublin')),
+    ('12 Some Road, dublin 6w', ('', 'Co. Dublin', 'Dublin 6W', 'Dublin 6W')),
+    ('12 Some Road, D06 X2Y1', ('', 'Co. Dublin', 'Dublin 6', 'Dublin 6')),
+    ('12 Some Road, Saint Margarets', ("St. Margaret's", 'Co. Dublin', '', 'Co. Dublin')),
+    ('1 Main Street, Newbridge', ('Newbridge', 'Co. Kildare', '', 'Co. Kildare')),
+    ('1 Main Street, Newbridge, Co. Galway', ('Newbridge', 'Co. Galway', '', 'Co. Galway')),
+    ('1 Main Street, Newbridge Road, Co. Cork', ('', 'Co. Cork', '', 'Co. Cork')),
+    ('Somewhere Unheard Of', ('', '', '', '')),
+    ('', ('', '', '', '')),
+])
+def test_resolve(gazetteer, address, expected):
+    assert resolved(gazetteer, address) == [expected]
+
+
+def test_resolve_keeps_the_index_and_repeats(gazetteer):
+    address = pd.Series(['1 Main Street, Kinsale', None, '1 Main Street, Kinsale'], index=[5, 7, 9])
+    out = gazetteer.resolve(address)
+    assert list(out.index) == [5, 7, 9]
+    assert out['location'].tolist() == ['Co. Cork', '', 'Co. Cork']
+
+
+def test_the_compiled_index_is_cached(tmp_path, gazetteer):
+    assert not gazetteer.loaded_from_cache
+    again = Gazetteer(gazetteer.path, cache_dir=gazetteer.cache_dir)
+    assert again.loaded_from_cache and len(again) == len(TOWNS)
+    # A changed csv is compiled again
+    TOWNS.iloc[:2].to_csv(gazetteer.path, index=False)
+    changed = Gazetteer(gazetteer.path, cache_dir=gazetteer.cache_dir)
+    assert not changed.loaded_from_cache and len(changed) == 2
+
+
+def test_no_cache_is_read_or_written_by_default(tmp_path):
+    TOWNS.to_csv(tmp_path / 'gazetteer.csv', index=False)
+    before = sorted(os.listdir(tmp_path))
+    first, second = Gazetteer(str(tmp_path / 'gazetteer.csv')), Gazetteer(str(tmp_path / 'gazetteer.csv'))
+    assert not first.loaded_from_cache and not second.loaded_from_cache
+    assert sorted(os.listdir(tmp_path)) == before
+
+
+def test_build_merges_the_towns_with_the_addresses_seen():
+    towns = pd.DataFrame({'name': ['Kinsale', 'Rathmines'], 'county': ['Co. Cork', 'Co. Dublin'],
+                          'district': ['', '']})
+    address = pd.Series(['1 Main St, Kinsale, Co. Cork'] * 3 + ['2 Oak Rd, Rathmines, Dublin 6'] * 2
+                        + ['3 The Glen, Ballinlough, Co. Cork'] * 2 + ['4 Elm Rd, Once Only, Co. Cork'])
+    county = address.str.rsplit(',').str[-1].str.strip()
+    gazetteer = build_gazetteer(towns, address, county).set_index('name')
+
+    assert gazetteer.loc['Kinsale', 'weight'] == 4
+    assert gazetteer.loc['Rathmines', ['county', 'district', 'weight']].tolist() == ['Co. Dublin', 'Dublin 6', 3]
+    # An area seen often enough is added, one seen once is not
+    assert gazetteer.loc['Ballinlough', ['county', 'weight']].tolist() == ['Co. Cork', 2]
+    assert 'Once Only' not in gazetteer.index
+
+
+def test_the_bundled_gazetteer():
+    towns = pd.read_csv(TOWNS_FILE, keep_default_na=False)
+    bundled = pd.read_csv(GAZETTEER_FILE, keep_default_na=False)
+    assert set(towns['county']) == {c for c in COUNTY_LST if c.startswith('Co. ')}
+    assert set(bundled['district']) - {''} <= {c for c in COUNTY_LST if c.startswith('Dublin ')}
+    # Every town of the source list is in the gazetteer
+    assert len(towns.merge(bundled, on=['name', 'county'])) == len(towns)
+
+    places = get_gazetteer().resolve(pd.Series(['Main Street, Ballydehob', 'The Square, Kinvara',
+                                                'Church Road, Tallaght', 'Main Street, Carndonagh']))
+    assert places['location'].tolist() == ['Co. Cork', 'Co. Galway', 'Dublin 24', 'Co. Donegal']
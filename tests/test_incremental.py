@@ -0,0 +1,113 @@
+import pandas as pd
+
+from daft_extract import Listing, SubUnit
+from daft_incremental import IncrementalCrawl, listing_ids
+from daft_plan import search_url, shard_key
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['listing_id', 'address', 'county', 'price', 'price_eur'])
+
+
+PREVIOUS = frame([('1', '1 Main Street, Co. Cork', 'Co. Cork', '€200,000', 200000),
+                  ('2', '2 Main Street, Co. Cork', 'Co. Cork', '€300,000', 300000),
+                  ('3', '3 High Street, Dublin 6', 'Dublin 6', '€500,000', 500000),
+                  ('4', '4 High Street, Dublin 6', 'Dublin 6', '€600,000', 600000)])
+
+
+def ad(listing_id, price, href=None):
+    return Listing('result-' + listing_id, href or '/for-sale/property/' + listing_id, '', price, '', False, ())
+
+
+def test_listing_ids_prefer_the_link():
+    href = pd.Series(['/for-sale/1-main-street/3028614', '/for-sale/x/55?ref=search', None, ''])
+    testid = pd.Series(['result-3028614', 'result-1', 'result-42', 'advert'])
+    assert listing_ids(href, testid).tolist() == ['3028614', '55', '42', 'advert']
+
+
+def test_finish_finds_new_changed_and_delisted():
+    current = frame([('1', '1 Main Street, Co. Cork', 'Co. Cork', '€200,000', 200000),
+                     ('2', '2 Main Street, Co. Cork', 'Co. Cork', '€290,000', 290000),
+                     ('5', '5 New Road, Co. Cork', 'Co. Cork', '€250,000', 250000)])
+    crawl = IncrementalCrawl(PREVIOUS)
+    snapshot, delta = crawl.finish(current)
+
+    assert dict(zip(delta['listing_id'], delta['change'])) == {'2': 'price_changed', '5': 'new', '3': 'delisted',
+                                                              '4': 'delisted'}
+    assert delta.set_index('listing_id').loc['2', 'price_old'] == '€300,000'
+    assert sorted(snapshot['listing_id']) == ['1', '2', '5']
+
+
+def test_a_shard_stops_at_its_first_known_page():
+    crawl = IncrementalCrawl(PREVIOUS)
+    pages = [[ad('5', '€250,000')], [ad('1', '€200,000'), ad('2', '€300,000')], [ad('9', '€1')]]
+    seen = list(crawl.pages(iter(pages), shard_key(search_url('cork'))))
+
+    assert seen == pages[:2]
+    assert crawl.stopped_early and crawl.pages_seen == 2
+
+
+def test_a_changed_price_does_not_stop_the_shard():
+    crawl = IncrementalCrawl(PREVIOUS)
+    pages = [[ad('1', '€200,000'), ad('2', '€290,000')], [ad('9', '€1')]]
+    assert list(crawl.pages(iter(pages), 'cork')) == pages
+    assert not crawl.stopped_early
+
+
+def test_new_homes_cards_are_not_looked_up():
+    # A development's card is not a property of the snapshot, it must not stop (or keep going) a shard
+    crawl = IncrementalCrawl(PREVIOUS)
+    development = ad('77', 'From €300,000', href='/new-homes-for-sale/the-grove/77')
+    assert crawl.page_is_known([ad('1', '€200,000'), development])
+    assert not crawl.page_is_known([development])
+
+    special = Listing('result-78', '/new-homes-for-sale/the-park/78', '', '', '', True,
+                      (SubUnit('/for-sale/unit-0/1', '€200,000', ''),))
+    assert crawl.page_is_known([special])
+
+
+def test_only_the_stopped_shards_properties_are_carried_forward():
+    crawl = IncrementalCrawl(PREVIOUS)
+    cork = [[ad('1', '€200,000')], [ad('2', '€300,000')]]
+    dublin = [[ad('3', '€500,000'), ad('9', '€1')]]
+    list(crawl.pages(iter(cork), shard_key(search_url('cork'))))
+    list(crawl.pages(iter(dublin), shard_key(search_url('dublin'))))
+
+    current = frame([('1', '1 Main Street, Co. Cork', 'Co. Cork', '€200,000', 200000),
+                     ('3', '3 High Street, Dublin 6', 'Dublin 6', '€500,000', 500000)])
+    snapshot, delta = crawl.finish(current)
+
+    # 2 was in the part of the Cork shard which was not fetched, 4 was not found by the Dublin shard, which ran
+    # to its end
+    assert sorted(snapshot['listing_id']) == ['1', '2', '3']
+    assert delta.loc[delta['change'] == 'delisted', 'listing_id'].tolist() == ['4']
+
+
+def test_a_price_band_shard_only_carries_forward_its_band():
+    crawl = IncrementalCrawl(PREVIOUS)
+    band = shard_key(search_url('dublin', price_from=550000, price_to=649999))
+    assert list(crawl.pages(iter([[ad('4', '€600,000')], [ad('9', '€1')]]), band)) == [[ad('4', '€600,000')]]
+
+    snapshot, delta = crawl.finish(frame([]))
+    assert crawl.stopped_shards == [band]
+    assert sorted(snapshot['listing_id']) == ['4']
+    assert sorted(delta.loc[delta['change'] == 'delisted', 'listing_id']) == ['1', '2', '3']
+
+
+def test_a_shard_whose_only_page_is_known_was_read_in_full():
+    crawl = IncrementalCrawl(PREVIOUS)
+    cork = shard_key(search_url('cork'))
+    assert list(crawl.pages(iter([[ad('1', '€200,000')]]), cork)) == [[ad('1', '€200,000')]]
+    assert not crawl.stopped_early
+
+    # 2 is no longer on the site, Cork was read to its end so it is delisted rather than carried forward
+    snapshot, delta = crawl.finish(frame([('1', '1 Main Street, Co. Cork', 'Co. Cork', '€200,000', 200000)]))
+    assert sorted(snapshot['listing_id']) == ['1']
+    assert sorted(delta.loc[delta['change'] == 'delisted', 'listing_id']) == ['2', '3', '4']
+
+
+def test_a_shard_whose_last_page_is_known_was_read_in_full():
+    crawl = IncrementalCrawl(PREVIOUS)
+    pages = [[ad('5', '€250,000')], [ad('1', '€200,000')]]
+    assert list(crawl.pages(iter(pages), shard_key(search_url('cork')))) == pages
+    assert not crawl.stopped_early and crawl.pages_seen == 2
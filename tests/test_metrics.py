@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import time
+
+import pytest
+
+from daft_metrics import RunReport, page_bytes
+
+
+def busy(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def test_a_nested_stage_is_not_counted_in_the_stage_it_pauses():
+    report = RunReport('run')
+    with report.stage('parse'):
+        busy(0.05)
+        with report.stage('fetch'):
+            time.sleep(0.1)
+        busy(0.05)
+    with report.stage('parse'):
+        busy(0.05)
+
+    parse, fetch = report.stages['parse'], report.stages['fetch']
+    assert parse.calls == 2 and fetch.calls == 1
+    assert 0.15 <= parse.wall < 0.25
+    assert parse.cpu >= 0.14
+    assert 0.1 <= fetch.wall < 0.15 and fetch.cpu < 0.05
+    assert parse.peak_memory > 0
+    assert report.to_dict()['wall_s'] >= parse.wall + fetch.wall
+
+
+def test_stop_must_be_the_innermost_stage():
+    report = RunReport()
+    report.start('parse')
+    report.start('fetch')
+    with pytest.raises(RuntimeError):
+        report.stop('parse')
+    report.stop('fetch')
+    report.stop('parse')
+    with pytest.raises(RuntimeError):
+        report.stop()
+
+
+def test_timed_iter_counts_items_and_bytes():
+    report = RunReport()
+    pages = ['<p>€250,000 · 3 Bed</p>', b'<p>caf\xc3\xa9</p>']
+    assert list(report.timed_iter('fetch', iter(pages), size=page_bytes)) == pages
+    assert report.stages['fetch'].items == 2
+    assert report.stages['fetch'].bytes == len(pages[0].encode('utf-8')) + len(pages[1])
+    assert page_bytes('€') == 3
+
+    # Closing the timed generator closes the one it wraps
+    def source():
+        try:
+            yield 1
+            yield 2
+        finally:
+            closed.append(True)
+    closed = []
+    timed = report.timed_iter('parse', source())
+    next(timed)
+    timed.close()
+    assert closed == [True] and report._running == []
+
+
+def test_counts_drops_and_the_json_report(in_tmp_path):
+    report = RunReport('20210301T093000')
+    report.count('empty_bba', 3)
+    report.count('empty_bba', 2)
+    assert report.drop('for_sale_href', 100, 90) == 10
+    report.drop('for_sale_href', 50, 45)
+    report.add('fetch', items=4, n_bytes=1000)
+    report.info['mode'] = 'full'
+
+    path = report.write_json(os.path.join('Files', 'run.json'))
+    with open(path) as f:
+        written = json.load(f)
+    assert written['run_id'] == '20210301T093000'
+    assert written['counts'] == {'empty_bba': 5}
+    assert written['dropped'] == {'for_sale_href': 15}
+    assert written['stages']['fetch']['items'] == 4 and written['stages']['fetch']['bytes'] == 1000
+    assert written['info'] == {'mode': 'full'}
+    assert 'dropped by for_sale_href: 15 rows' in str(report)
+
+
+def test_write_prometheus():
+    report = RunReport('run "1"')
+    with report.stage('parse'):
+        pass
+    report.add('parse', items=3, n_bytes=300)
+    report.drop('duplicate_listing_id', 10, 7)
+    report.count('no_county', 2)
+    path = report.write_prometheus(os.path.join('Files', 'daft.prom'))
+    assert not os.path.exists(path + '.tmp')
+    with open(path) as f:
+        text = f.read()
+
+    lines = text.splitlines()
+    assert '# TYPE daft_scrape_stage_items gauge' in lines
+    assert 'daft_scrape_stage_items{run_id="run \\"1\\"",stage="parse"} 3.0' in lines
+    assert 'daft_scrape_stage_bytes{run_id="run \\"1\\"",stage="parse"} 300.0' in lines
+    assert 'daft_scrape_rows_dropped{run_id="run \\"1\\"",filter="duplicate_listing_id"} 3.0' in lines
+    assert 'daft_scrape_count{run_id="run \\"1\\"",name="no_county"} 2.0' in lines
+    sample = re.compile(r'^daft_scrape_[a-z_]+\{[^}]*\} -?\d+(\.\d+)?(e[-+]\d+)?$')
+    assert all(line.startswith('# ') or sample.match(line) for line in lines)
+
+
+def test_write_profile_only_covers_the_profiled_stage():
+    def profiled_work():
+        return sum(i * i for i in range(20000))
+
+    def other_work():
+        return sorted(range(20000), reverse=True)
+
+    report = RunReport(profile='parse')
+    with report.stage('parse'):
+        profiled_work()
+    with report.stage('normalize'):
+        other_work()
+    top = report.write_profile(os.path.join('Files', 'parse.prof'))
+    assert os.path.getsize(os.path.join('Files', 'parse.prof')) > 0
+    assert 'profiled_work' in top and 'other_work' not in top
+
+    with pytest.raises(ValueError):
+        RunReport().write_profile('unused.prof')
+
+
+def test_trace_stages_prints_each_start_and_stop(capsys):
+    report = RunReport(verbose=True)
+    with report.stage('parse'):
+        pass
+    out = capsys.readouterr().out.splitlines()
+    assert re.match(r'^\[pid %d\] \d+\.\d{3} start parse$' % os.getpid(), out[0])
+    assert re.match(r'^\[pid %d\] \d+\.\d{3} stop parse$' % os.getpid(), out[1])
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from daft_normalize import LISTING_COLUMNS, SQ_M_PER_ACRE, normalize_bba, normalize_listings, normalize_price
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('€250,000', 250000),
+    ('AMV: €1,250,000', 1250000),
+    ('From € 300,000', 300000),
+    ('£2,000 (€2,300)', 2300),
+    ('Price on Application', None),
+    ('', None),
+])
+def test_normalize_price(text, expected):
+    price_eur = normalize_price(pd.Series([text]))
+    assert str(price_eur.dtype) == 'Int64'
+    if expected is None:
+        assert pd.isna(price_eur[0])
+    else:
+        assert price_eur[0] == expected
+
+
+def test_normalize_bba_classifies_each_token():
+    bba = pd.Series(['3 Bed·2 Bath·110 m²·Semi-D·Sherry FitzGerald', '1 Bed · Apartment', '0.5 ac·Site', '',
+                     '3 Bed·2 Bath·110 m²·Semi-D·Sherry FitzGerald'], index=[10, 11, 12, 13, 14])
+    out = normalize_bba(bba)
+
+    assert list(out.index) == [10, 11, 12, 13, 14]
+    assert out.loc[10, ['bed', 'bath', 'area', 'prop_type']].tolist() == ['3 Bed', '2 Bath', '110 m²', 'Semi-D']
+    assert (out.loc[10, 'bed_n'], out.loc[10, 'bath_n'], out.loc[10, 'area_m2']) == (3, 2, 110.0)
+    assert out.loc[11, 'prop_type'] == 'Apartment' and out.loc[11, 'bed_n'] == 1
+    assert pd.isna(out.loc[11, 'bath_n']) and out.loc[11, 'bath'] == ''
+    assert out.loc[12, 'area_m2'] == pytest.approx(0.5 * SQ_M_PER_ACRE)
+    assert out.loc[13, ['bed', 'bath', 'area', 'prop_type']].tolist() == ['', '', '', '']
+    assert pd.isna(out.loc[13, 'area_m2'])
+    assert out.loc[14].equals(out.loc[10].rename(14))
+
+
+def test_normalize_listings():
+    df = pd.DataFrame({'join_value': ['result-1', 'result-2', 'result-3'],
+                       'address': ['1 Main Street, Kinsale, Co. Cork', 'Apt 4, Rathmines, Dublin 6',
+                                   'Somewhere Unheard Of'],
+                       'price': [' €350,000 ', 'Price on Application', '€95,000'],
+                       'bba': ['4 Bed·3 Bath·Detached', '2 Bed·Apartment', '']})
+    out = normalize_listings(df)
+
+    assert list(out.columns) == ['join_value'] + LISTING_COLUMNS
+    assert out['county'].tolist() == ['Co. Cork', 'Dublin 6', '']
+    assert out['price'].tolist() == ['€350,000', 'Price on Application', '€95,000']
+    assert out['price_eur'].tolist()[0] == 350000 and pd.isna(out['price_eur'][1])
+    assert out['bed_n'].tolist()[:2] == [4, 2]
+    assert out['prop_type'].tolist() == ['Detached', 'Apartment', '']
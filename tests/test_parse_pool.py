@@ -0,0 +1,44 @@
+import multiprocessing
+
+import pytest
+
+from daft_extract import CAN_FORK, ParsePool, iter_page_listings
+from daft_parse import get_backend
+from synthetic_corpus import SyntheticCorpus
+
+CONTEXTS = (['fork'] if CAN_FORK else []) + ['spawn']
+
+
+@pytest.mark.parametrize('context', CONTEXTS)
+def test_pool_gives_the_in_process_listings_in_page_order(context):
+    pages = SyntheticCorpus(200, special_share=0.1).pages()
+    expected = list(iter_page_listings(pages, get_backend('html.parser')))
+    with ParsePool(workers=2, backend='html.parser', chunk_pages=3,
+                   mp_context=multiprocessing.get_context(context)) as pool:
+        assert list(pool.iter_page_listings(pages)) == expected
+        assert list(pool.iter_listings(page.encode('utf-8') for page in pages)) == [ad for page in expected
+                                                                                  for ad in page]
+
+
+def test_stopping_early_only_reads_a_window_of_pages():
+    corpus = SyntheticCorpus(400)
+    taken = []
+
+    def pages():
+        for page in corpus.iter_pages():
+            taken.append(page)
+            yield page
+
+    with ParsePool(workers=1, chunk_pages=2) as pool:
+        listings = pool.iter_page_listings(pages())
+        first = next(listings)
+        listings.close()
+    assert len(first) == corpus.page_size
+    # The window of workers * 2 chunks, and the one chunk handed out as the first came back, not the whole corpus
+    assert len(taken) <= 2 * 3
+    assert len(taken) < corpus.n_pages
+
+
+def test_an_unknown_backend_fails_in_the_caller():
+    with pytest.raises(ValueError):
+        ParsePool(workers=1, backend='no-such-parser')
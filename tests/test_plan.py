@@ -0,0 +1,121 @@
+import warnings
+
+import pytest
+
+from bench_plan import SyntheticSite
+from daft_extract import extract_page
+from daft_fetch import PageFetcher
+from daft_parse import get_backend
+from daft_plan import (LOCATIONS, CrawlPlanner, in_search, result_count, search_of, search_url, shard_key,
+                       split_band)
+from standin_server import StandinServer
+from test_store import daft_df
+
+
+@pytest.fixture(scope='module')
+def site():
+    return SyntheticSite(3000, max_page_size=50)
+
+
+@pytest.fixture
+def server(site):
+    site.requests = 0
+    site.fetched.clear()
+    with StandinServer(site=site) as server:
+        yield server
+
+
+def crawl(plan, fetcher):
+    """The card IDs found on each page of the plan, in crawl order."""
+    backend = get_backend()
+    return [[listing.listing_id for listing in extract_page(html, backend)]
+            for shard, pages in plan.iter_shards(fetcher) for html in pages]
+
+
+@pytest.mark.parametrize('unpriced_search', [False, True])
+def test_the_planned_crawl_finds_every_property_once(site, server, unpriced_search):
+    fetcher = PageFetcher(max_workers=4)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        plan = CrawlPlanner(fetcher, split_at=300, base_url=server.search_url,
+                            unpriced_search=unpriced_search).plan()
+    assert plan.page_size == 50
+    assert plan.total == len(site.listings) and plan.planned == plan.total
+
+    pages = crawl(plan, fetcher)
+    found = [listing_id for page in pages for listing_id in page]
+    assert sorted(found) == sorted('result-%d' % i for i in site.listings['id'])
+    # No page is fetched twice, and no property is on two pages
+    assert max(site.fetched.values()) == 1
+    assert len(found) == len(set(found))
+    assert server.requests == site.requests == plan.probes + plan.pages - len(plan.shards)
+
+
+def test_counties_are_one_shard_without_an_unpriced_search(site, server):
+    plan = CrawlPlanner(PageFetcher(), split_at=300, base_url=server.search_url).plan()
+    assert [shard.location for shard in plan.shards] == LOCATIONS
+    assert all(shard.price_from is None and shard.price_to is None for shard in plan.shards)
+
+
+def test_large_counties_are_split_into_bands_with_an_unpriced_search(site, server):
+    plan = CrawlPlanner(PageFetcher(), split_at=300, base_url=server.search_url, unpriced_search=True).plan()
+    # Every band was split until it is under split_at, or could not be split any further
+    for shard in plan.shards:
+        assert shard.count <= 300 or split_band(shard.price_from, shard.price_to) is None
+    # Dublin has properties with no price, which are in none of its bands: they are a shard of their own
+    dublin = [shard for shard in plan.shards if shard.location == 'dublin']
+    unpriced = ((site.listings['location'] == 'dublin') & site.listings['price_eur'].isna()).sum()
+    assert len(dublin) > 2 and unpriced > 0
+    assert dublin[-1].unpriced and dublin[-1].count == unpriced
+    assert not any(shard.unpriced for shard in dublin[:-1])
+
+
+def test_a_plan_which_misses_properties_warns(site, server):
+    planner = CrawlPlanner(PageFetcher(), locations=['cork', 'kerry'], base_url=server.search_url)
+    with pytest.warns(UserWarning, match='add up to'):
+        plan = planner.plan()
+    assert plan.planned < plan.total
+
+
+def test_a_stopped_shard_fetches_no_more_pages(site, server):
+    fetcher = PageFetcher(max_workers=1)
+    planner = CrawlPlanner(fetcher, locations=['dublin', 'cork'], split_at=10000, base_url=server.search_url)
+    with pytest.warns(UserWarning):
+        plan = planner.plan()
+    assert [shard.location for shard in plan.shards] == ['dublin', 'cork'] and len(plan.shards[0].urls) > 4
+
+    site.requests = 0
+    read = []
+    for shard, pages in plan.iter_shards(fetcher):
+        # Only the first page of Dublin is read, every page of Cork
+        read.append(sum(1 for _ in (pages if shard.location == 'cork' else [next(pages)])))
+    assert read == [1, len(plan.shards[1].urls)]
+    # Dublin's first page came with the plan, only the pages the fetcher had already asked for are thrown away
+    assert site.requests <= 2 * fetcher.max_workers + len(plan.shards[1].urls)
+
+
+def test_search_urls_and_rows():
+    url = search_url('cork', 50, 100, 150000, 199999, base_url='http://127.0.0.1:8000/property-for-sale/')
+    assert url == ('http://127.0.0.1:8000/property-for-sale/cork?pageSize=50&from=100'
+                   '&salePrice_from=150000&salePrice_to=199999')
+    assert search_of(url) == ('cork', 150000, 199999)
+    assert shard_key(url) == shard_key(url.replace('from=100', 'from=0'))
+
+    df = daft_df([('1', 'Co. Cork', 3, 'Semi-D', 160000), ('2', 'Co. Cork', 3, 'Semi-D', 260000),
+                  ('3', 'Dublin 6', 3, 'Semi-D', 160000), ('4', '', 3, 'Semi-D', 160000),
+                  ('5', 'Co. Cork', 3, 'Semi-D', None)])
+    assert in_search(df, url).tolist() == [True, False, False, True, False]
+    assert in_search(df, search_url('dublin')).tolist() == [False, False, True, True, False]
+    assert in_search(df, search_url('cork', unpriced=True)).tolist() == [False, False, False, False, True]
+
+
+def test_split_band():
+    assert split_band(None, 149999) == [(None, 74999), (75000, 149999)]
+    assert split_band(1000000, None) == [(1000000, 1999999), (2000000, None)]
+    assert split_band(150000, 154999) is None
+
+
+def test_result_count():
+    assert result_count('<script>{"paging":{"totalResults":12345}}</script>') == 12345
+    assert result_count('<h1 data-testid="search-h1">12,345 Properties for Sale</h1>') == 12345
+    assert result_count('<html></html>') is None
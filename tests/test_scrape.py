@@ -0,0 +1,161 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import daft_scrape
+from bench_plan import SyntheticSite
+from conftest import REPO_DIR
+from daft_cache import PageCache
+from daft_pipeline import Scraper
+from daft_plan import CrawlPlanner
+from daft_scrape import main, next_run, read_state, scheduled_mode, store_snapshots
+from standin_server import StandinServer
+
+FIRST, SECOND = '20210301T090000', '20210304T090000'
+
+
+@pytest.fixture(scope='module')
+def site():
+    return SyntheticSite(600, max_page_size=20)
+
+
+@pytest.fixture
+def server(site):
+    with StandinServer(site=site) as server:
+        yield server
+
+
+def make_scraper(server):
+    return Scraper(parser='html.parser', planner_options={'base_url': server.search_url})
+
+
+def site_ids(site):
+    return sorted(str(i) for i in site.listings['id'])
+
+
+def test_store_snapshots_from_the_file_names():
+    for path in ['scrape_date=2021-03-01/county=Cork/part-20210301T090000-0.parquet',
+                 'scrape_date=2021-03-01/county=Kerry/part-20210301T090000-1.parquet',
+                 'scrape_date=2021-03-04/county=Cork/part-20210304T090000-0.parquet',
+                 'scrape_date=2021-03-04/county=Cork/notes.txt']:
+        os.makedirs(os.path.dirname(os.path.join('snapshots', path)), exist_ok=True)
+        open(os.path.join('snapshots', path), 'w').close()
+    assert store_snapshots('snapshots') == [FIRST, SECOND]
+    assert store_snapshots('missing') == []
+
+
+def test_next_run():
+    now = datetime.datetime(2021, 3, 2, 12)
+    assert next_run('snapshots', 3, now) == now
+    os.makedirs('snapshots')
+    open(os.path.join('snapshots', 'part-%s-0.parquet' % FIRST), 'w').close()
+    assert next_run('snapshots', 3, now) == datetime.datetime(2021, 3, 4, 9)
+    assert next_run('snapshots', 1, now) == now
+
+    # A run which wrote no snapshot still counts, unless it failed: then it is retried
+    state = {'snapshot': SECOND, 'finished': '2021-03-04 09:30:00', 'failed': False}
+    assert next_run('snapshots', 3, now, state) == datetime.datetime(2021, 3, 7, 9)
+    state['failed'] = True
+    assert next_run('snapshots', 3, datetime.datetime(2021, 3, 4, 10), state, retry_minutes=60) == \
+        datetime.datetime(2021, 3, 4, 10, 30)
+
+
+def test_scheduled_mode():
+    assert scheduled_mode(None, 'incremental', 3) == 'full'
+    assert scheduled_mode({'since_full': None}, 'incremental', 3) == 'full'
+    assert [scheduled_mode({'since_full': n}, 'incremental', 3) for n in range(3)] == \
+        ['incremental', 'incremental', 'full']
+    assert scheduled_mode(None, 'incremental', 0) == 'incremental'
+    assert scheduled_mode({'since_full': 5}, 'full', 10) == 'full'
+
+
+def test_replay_of_a_cached_snapshot(site):
+    # The snapshot is recorded straight from the synthetic site, the Scraper never makes a request
+    cache = PageCache()
+    plan = CrawlPlanner(site).plan()
+    for shard, pages in plan.iter_shards(site):
+        list(cache.record(FIRST, shard.urls, pages))
+
+    with Scraper(parser='html.parser') as scraper:
+        result = scraper.run('replay', snapshot=FIRST)
+        assert scraper._fetcher is None and scraper.runs == 1
+    assert sorted(result.daft_df['listing_id']) == site_ids(site)
+    assert result.delta_df is None and result.report.info['mode'] == 'replay'
+    assert store_snapshots('snapshots') == [FIRST]
+    assert os.path.exists(os.path.join('Files', 'run_%s.json' % FIRST))
+
+    with pytest.raises(ValueError):
+        Scraper().run('replay')
+    with pytest.raises(ValueError):
+        Scraper().run('weekly')
+
+
+def test_a_full_then_an_incremental_run(site, server):
+    dublin = site.listings.index[site.listings['location'] == 'dublin']
+    assert len(dublin) > 60  # four pages or more, so the incremental run stops with pages left unread
+    with make_scraper(server) as scraper:
+        full = scraper.run('full', snapshot=FIRST)
+        assert sorted(full.daft_df['listing_id']) == site_ids(site)
+
+        changed = dublin[0]
+        price = site.listings.loc[changed, 'price']
+        site.listings.loc[changed, 'price'] = '€1,234,567'
+        try:
+            incremental = scraper.run('incremental', snapshot=SECOND)
+        finally:
+            site.listings.loc[changed, 'price'] = price
+        assert scraper.runs == 2
+
+    info = incremental.report.info
+    assert info['stopped_shards'] >= 1
+    # Pages read; the fetcher may have downloaded a few more ahead of the stop
+    assert incremental.report.stages['fetch'].items < full.report.stages['fetch'].items
+    assert info['pages_downloaded'] <= full.report.info['pages_downloaded']
+    # The properties on the pages which were not read are carried over from the full run
+    assert sorted(incremental.daft_df['listing_id']) == site_ids(site)
+    delta = incremental.delta_df.set_index('listing_id')['change']
+    assert delta.to_dict() == {str(site.listings.loc[changed, 'id']): 'price_changed'}
+    assert store_snapshots('snapshots') == [FIRST, SECOND]
+
+
+def test_the_daemon_makes_every_nth_run_a_full_one(server, monkeypatch):
+    monkeypatch.setattr(daft_scrape, 'make_scraper', lambda args: make_scraper(server))
+    # Each run is due a second after the last, so that no two runs have the same snapshot name
+    main(['daemon', '--max-runs', '3', '--full-every', '2', '--every-days', str(1.0 / 86400)])
+
+    modes = []
+    for name in sorted(os.listdir('Files')):
+        if name.startswith('run_'):
+            with open(os.path.join('Files', name)) as f:
+                modes.append(json.load(f)['info']['mode'])
+    assert modes == ['full', 'incremental', 'full']
+    state = read_state('Files')
+    assert state['mode'] == 'full' and not state['failed'] and state['since_full'] == 0
+    assert state['snapshot'] == store_snapshots('snapshots')[-1]
+
+
+def test_a_daemon_run_with_no_properties_is_retried(monkeypatch):
+    empty = SyntheticSite(0)
+    with StandinServer(site=empty) as server:
+        monkeypatch.setattr(daft_scrape, 'make_scraper', lambda args: make_scraper(server))
+        main(['daemon', '--max-runs', '1', '--retry-minutes', '30'])
+
+    state = read_state('Files')
+    assert state['failed'] and state['since_full'] is None
+    finished = datetime.datetime.fromisoformat(state['finished'])
+    assert next_run('snapshots', 3, finished, state, retry_minutes=30) == finished + datetime.timedelta(minutes=30)
+    # The run which failed was the full first run, the next one is still full
+    assert scheduled_mode(state, 'incremental', 10) == 'full'
+
+
+def test_status_imports_no_pandas():
+    code = ('import sys, daft_scrape; daft_scrape.main(["status"]); '
+            'print(sorted({"pandas", "numpy", "pyarrow", "bs4"} & set(sys.modules)))')
+    out = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                         capture_output=True, text=True, check=True).stdout
+    assert 'store snapshots: 0 snapshots' in out
+    assert out.splitlines()[-1] == '[]'
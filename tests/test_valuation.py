@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import daft_valuation
+from daft_store import SnapshotStore
+from daft_valuation import ValuationIndex, flag_revaluations
+from test_store import daft_df
+
+COUNTIES = ['Co. Cork', 'Co. Kerry', 'Dublin 6']
+PROP_TYPES = ['Semi-D', 'Detached', 'Apartment']
+
+
+def random_listings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'listing_id': [str(i) for i in range(n)],
+        'address': 'an address',
+        'county': rng.choice(COUNTIES, n),
+        'prop_type': rng.choice(PROP_TYPES, n),
+        'bed_n': rng.integers(1, 6, n),
+        'bath_n': np.where(rng.random(n) < 0.2, np.nan, rng.integers(1, 4, n)),
+        'area_m2': np.where(rng.random(n) < 0.3, np.nan, rng.uniform(40, 300, n).round()),
+        'price_eur': rng.integers(100, 1000, n) * 1000,
+    })
+
+
+def test_comparables_are_the_nearest_in_the_county():
+    listings = random_listings(400)
+    book = random_listings(60, seed=1).drop(columns=['listing_id', 'address', 'price_eur'])
+    estimates, comparables = ValuationIndex(listings, k=3).value(book)
+
+    assert (comparables.groupby('property').size() == 3).all()
+    for i, row in book.iterrows():
+        same_county = listings.loc[listings['county'] == row['county']]
+        d2 = daft_valuation.distances(daft_valuation._features(book.loc[[i]]), np.array([row['prop_type']]),
+                                      daft_valuation._features(same_county), same_county['prop_type'].to_numpy())[0]
+        nearest = same_county.iloc[np.argsort(d2, kind='stable')[:3]]
+        found = comparables.loc[comparables['property'] == i].sort_values('rank')
+        assert found['listing_id'].tolist() == nearest['listing_id'].tolist()
+        assert found['distance'].to_numpy() == pytest.approx(np.sqrt(np.sort(d2)[:3]), rel=1e-5)
+        assert estimates.loc[i, 'estimate'] == np.median(nearest['price_eur'])
+
+
+def test_chunked_blocks_give_the_same_comparables(monkeypatch):
+    listings = random_listings(300)
+    book = random_listings(50, seed=2)
+    _, expected = ValuationIndex(listings).value(book)
+    monkeypatch.setattr(daft_valuation, 'CHUNK_CELLS', 500)
+    _, chunked = ValuationIndex(listings).value(book)
+    pd.testing.assert_frame_equal(chunked, expected)
+
+
+def test_a_county_with_few_or_no_listings():
+    listings = random_listings(200)
+    listings = listings.loc[listings['county'] != 'Co. Kerry']
+    listings.loc[listings.index[0], ['county', 'price_eur']] = ['Co. Clare', 250000]
+    listings.loc[listings.index[1], 'price_eur'] = np.nan
+    book = pd.DataFrame({'county': ['Co. Kerry', 'Co. Clare'], 'prop_type': 'Semi-D', 'bed_n': 3, 'bath_n': 2,
+                         'area_m2': 100.0})
+    estimates, comparables = ValuationIndex(listings).value(book)
+
+    assert estimates['comparables'].tolist() == [0, 1]
+    assert pd.isna(estimates.loc[0, 'estimate']) and estimates.loc[1, 'estimate'] == 250000
+    assert comparables['property'].tolist() == [1]
+
+
+def test_from_store_and_flag_revaluations():
+    store = SnapshotStore('snapshots')
+    with pytest.raises(ValueError):
+        ValuationIndex.from_store(store)
+    store.write(daft_df([('1', 'Co. Cork', 3, 'Semi-D', 300000), ('2', 'Co. Cork', 3, 'Semi-D', 320000)]),
+                snapshot='20210301T093000')
+    index = ValuationIndex.from_store(store, k=2)
+    book = pd.DataFrame({'county': ['Co. Cork'] * 2, 'prop_type': 'Semi-D', 'bed_n': 3, 'bath_n': 1,
+                         'area_m2': np.nan})
+    estimates, _ = index.value(book)
+
+    flags = flag_revaluations(pd.Series([310000, 450000]), estimates)
+    assert flags['estimate'].tolist() == [310000, 310000]
+    assert flags['revalue'].tolist() == [False, True]